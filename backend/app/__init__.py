@@ -18,6 +18,13 @@ def create_app():
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key')
     app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 50000000))
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', './uploads')
+    app.config['OCR_WORKERS'] = int(os.getenv('OCR_WORKERS', 2))
+    app.config['BATCH_UPLOAD_WORKERS'] = int(os.getenv('BATCH_UPLOAD_WORKERS', 2))
+    app.config['BATCH_MAX_ITEMS'] = int(os.getenv('BATCH_MAX_ITEMS', 50))
+    app.config['BATCH_MAX_UNCOMPRESSED_SIZE'] = int(os.getenv('BATCH_MAX_UNCOMPRESSED_SIZE', 500000000))
+    # Finished OCR jobs and batch uploads stay pollable this long, and at most this many are kept
+    app.config['JOB_RETENTION_SECONDS'] = int(os.getenv('JOB_RETENTION_SECONDS', 3600))
+    app.config['JOB_RETENTION_MAX'] = int(os.getenv('JOB_RETENTION_MAX', 1000))
     
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -28,6 +35,16 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     
+    from app.services.ocr_queue import ocr_queue
+    ocr_queue.init_app(app)
+    
+    from app.services.batch_upload import batch_upload_queue
+    batch_upload_queue.init_app(app)
+    
+    # Keep the dashboard rollup in step with invoice writes
+    from app.services.dashboard_stats import DashboardStatsService
+    DashboardStatsService.register(db.session)
+    
     # JWT error handlers
     @jwt.invalid_token_loader
     def invalid_token_callback(error_string):
@@ -51,7 +68,7 @@ def create_app():
     
     # Create tables
     with app.app_context():
-        from app.models import user, invoice, brand, country, business_unit, supplier, lpo_tracker
+        from app.models import user, invoice, brand, country, business_unit, supplier, company, lpo_tracker, ocr_result, master_data_version, dashboard_stats, supplier_template
         db.create_all()
     
     # Register blueprints
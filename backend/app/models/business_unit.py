@@ -2,6 +2,12 @@ from app import db
 
 class BusinessUnit(db.Model):
     __tablename__ = 'business_units'
+    __table_args__ = (
+        # Natural key used by import_master_data.py upserts
+        db.UniqueConstraint('bu_code', 'country_id', name='uq_business_units_code_country'),
+        # Dropdown lookups by country and brand
+        db.Index('ix_business_units_country_brand', 'country_id', 'brand_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     bu_code = db.Column(db.String(50), nullable=False)
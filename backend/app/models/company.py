@@ -2,6 +2,12 @@ from app import db
 
 class Company(db.Model):
     __tablename__ = 'companies'
+    __table_args__ = (
+        # Natural key used by import_master_data.py upserts
+        db.UniqueConstraint('company_code', name='uq_companies_code'),
+        # Company derivation on upload
+        db.Index('ix_companies_brand_country', 'brand_id', 'country_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     company_name = db.Column(db.String(100), nullable=False)
@@ -0,0 +1,26 @@
+from app import db
+from datetime import datetime
+
+class InvoiceDailyStats(db.Model):
+    """Invoice counts and amounts per day, country and brand (see DashboardStatsService)"""
+    __tablename__ = 'invoice_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    country_id = db.Column(db.Integer, db.ForeignKey('countries.id'), primary_key=True)
+    brand_id = db.Column(db.Integer, db.ForeignKey('brands.id'), primary_key=True)
+    
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'country_id': self.country_id,
+            'brand_id': self.brand_id,
+            'invoice_count': self.invoice_count,
+            'pending_count': self.pending_count,
+            'total_amount': self.total_amount
+        }
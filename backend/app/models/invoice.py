@@ -3,6 +3,14 @@ from datetime import datetime
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        # Dashboard counts and recency; the INCLUDE columns let analytics range scans skip the heap
+        db.Index('ix_invoices_status', 'status'),
+        db.Index(
+            'ix_invoices_created_at', 'created_at',
+            postgresql_include=['country_id', 'brand_id', 'bu_id', 'supplier_id', 'total_amount']
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -38,8 +46,8 @@ class Invoice(db.Model):
     supplier = db.relationship('Supplier', backref='invoices', lazy=True)
     company = db.relationship('Company', backref='invoices', lazy=True)
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_items=True):
+        data = {
             'id': self.id,
             'invoice_number': self.invoice_number,
             'invoice_date': self.invoice_date,
@@ -57,12 +65,55 @@ class Invoice(db.Model):
             'total_amount': self.total_amount,
             
             'status': self.status,
-            'created_at': self.created_at.isoformat(),
-            'items': [item.to_dict() for item in self.items]
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+        if include_items:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+    
+    def to_summary_dict(self, item_count=0, total_quantity=0):
+        """
+        Header-only projection for listings
+        
+        Item count and quantity come from SQL (see InvoiceService.list_invoice_summaries);
+        related records are reduced to id, code and name.
+        """
+        supplier = self.supplier
+        business_unit = self.business_unit
+        return {
+            'id': self.id,
+            'invoice_number': self.invoice_number,
+            'invoice_date': self.invoice_date,
+            'country_id': self.country_id,
+            'country_name': self.country.country_name if self.country else None,
+            'brand_id': self.brand_id,
+            'brand_name': self.brand.brand_name if self.brand else None,
+            'bu_id': self.bu_id,
+            'business_unit': {
+                'id': business_unit.id,
+                'code': business_unit.bu_code,
+                'name': business_unit.store_name
+            } if business_unit else None,
+            'supplier_id': self.supplier_id,
+            'supplier': {
+                'id': supplier.id,
+                'code': supplier.supplier_code,
+                'name': supplier.supplier_name
+            } if supplier else None,
+            'currency': self.currency,
+            'total_amount': self.total_amount,
+            'item_count': item_count or 0,
+            'total_quantity': total_quantity or 0,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 class InvoiceItem(db.Model):
     __tablename__ = 'invoice_line_items'
+    __table_args__ = (
+        # Detail, export and per-invoice count/quantity subqueries
+        db.Index('ix_invoice_line_items_invoice_id', 'invoice_id', postgresql_include=['quantity']),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
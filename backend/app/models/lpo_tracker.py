@@ -3,6 +3,20 @@ from datetime import datetime
 
 class LPOTracker(db.Model):
     __tablename__ = 'lpo_trackers'
+    __table_args__ = (
+        # Listing filters + keyset pagination (see TrackerService.get_trackers_page)
+        db.Index('ix_lpo_trackers_country_bu_serial', 'country_id', 'bu_id', 'serial_number'),
+        db.Index('ix_lpo_trackers_created_at_id', 'created_at', 'id'),
+        db.Index('ix_lpo_trackers_shipment_status', 'shipment_status'),
+        # Dashboard shipment status distribution over a created_at range
+        db.Index(
+            'ix_lpo_trackers_created_at_status', 'created_at',
+            postgresql_include=['shipment_status', 'country_id', 'bu_id']
+        ),
+        # Prefix search; varchar_pattern_ops lets LIKE 'x%' use the index under any collation
+        db.Index('ix_lpo_trackers_ticket_no', 'ticket_no', postgresql_ops={'ticket_no': 'varchar_pattern_ops'}),
+        db.Index('ix_lpo_trackers_shipment_no', 'shipment_no', postgresql_ops={'shipment_no': 'varchar_pattern_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False, unique=True)
@@ -32,11 +46,20 @@ class LPOTracker(db.Model):
     country = db.relationship('Country', backref='lpo_trackers', lazy=True)
     business_unit = db.relationship('BusinessUnit', backref='lpo_trackers', lazy=True)
     
-    def to_dict(self):
-        from app.models.invoice import Invoice
+    def to_dict(self, total_quantity=None):
+        """
+        Serialize the tracker with its invoice details
         
-        invoice = Invoice.query.get(self.invoice_id)
-        items = invoice.items if invoice else []
+        Listing endpoints pass total_quantity computed in SQL (see
+        TrackerService.get_trackers_page) so no items are loaded.
+        """
+        invoice = self.invoice
+        
+        if total_quantity is None:
+            from app.models.invoice import InvoiceItem
+            total_quantity = db.session.query(
+                db.func.coalesce(db.func.sum(InvoiceItem.quantity), 0)
+            ).filter(InvoiceItem.invoice_id == self.invoice_id).scalar()
         
         return {
             'id': self.id,
@@ -54,8 +77,8 @@ class LPOTracker(db.Model):
             'invoice_file_path': invoice.invoice_file_path if invoice else None,
             'supporting_file_path': invoice.supporting_file_path if invoice else None,
             
-            # Calculate total quantity from items
-            'total_quantity_received': sum(item.quantity for item in items) if items else 0,
+            # Total quantity across the invoice's items
+            'total_quantity_received': total_quantity or 0,
             
             # Tracker fields
             'date_of_request': self.date_of_request,
@@ -69,3 +92,11 @@ class LPOTracker(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+class LPOSerialCounter(db.Model):
+    """Last serial number issued per BU prefix and year (see TrackerService.generate_serial_number)"""
+    __tablename__ = 'lpo_serial_counters'
+    
+    prefix = db.Column(db.String(10), primary_key=True)  # First 3 letters of bu_code
+    year = db.Column(db.String(2), primary_key=True)     # YY
+    last_value = db.Column(db.Integer, nullable=False, default=0)
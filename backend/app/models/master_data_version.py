@@ -0,0 +1,10 @@
+from app import db
+from datetime import datetime
+
+class MasterDataVersion(db.Model):
+    """Single-row stamp bumped whenever master data is imported (see MasterDataCache)"""
+    __tablename__ = 'master_data_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,67 @@
+from app import db
+from datetime import datetime
+import json
+import zlib
+
+class InvoiceOCRResult(db.Model):
+    """Raw OCR output kept per invoice so fields can be re-extracted without re-running OCR"""
+    __tablename__ = 'invoice_ocr_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False, unique=True)
+
+    # zlib-compressed UTF-8 text / JSON
+    raw_text_z = db.Column(db.LargeBinary)
+    # Region OCR mode: text of the label regions the fields were read from (raw_text is the whole page)
+    region_text_z = db.Column(db.LargeBinary)
+    word_confidences_z = db.Column(db.LargeBinary)
+
+    # {field: {'pattern', 'match', 'confidence'}}
+    field_matches = db.Column(db.JSON)
+
+    # [{'page', 'source'}] - 'text_layer' or 'ocr' for each page
+    page_sources = db.Column(db.JSON)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    invoice = db.relationship(
+        'Invoice',
+        backref=db.backref('ocr_result', uselist=False, lazy=True, cascade='all, delete-orphan')
+    )
+
+    @property
+    def raw_text(self):
+        return zlib.decompress(self.raw_text_z).decode('utf-8') if self.raw_text_z else ''
+
+    @raw_text.setter
+    def raw_text(self, value):
+        self.raw_text_z = zlib.compress((value or '').encode('utf-8'))
+
+    @property
+    def region_text(self):
+        return zlib.decompress(self.region_text_z).decode('utf-8') if self.region_text_z else None
+
+    @region_text.setter
+    def region_text(self, value):
+        self.region_text_z = zlib.compress(value.encode('utf-8')) if value else None
+
+    @property
+    def word_confidences(self):
+        return json.loads(zlib.decompress(self.word_confidences_z)) if self.word_confidences_z else []
+
+    @word_confidences.setter
+    def word_confidences(self, value):
+        self.word_confidences_z = zlib.compress(json.dumps(value or []).encode('utf-8'))
+
+    def to_dict(self):
+        return {
+            'invoice_id': self.invoice_id,
+            'raw_text': self.raw_text,
+            'region_text': self.region_text,
+            'word_confidences': self.word_confidences,
+            'field_matches': self.field_matches or {},
+            'page_sources': self.page_sources or [],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
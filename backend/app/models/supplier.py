@@ -2,6 +2,12 @@ from app import db
 
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
+    __table_args__ = (
+        # Natural key used by import_master_data.py upserts
+        db.UniqueConstraint('supplier_code', 'country_id', name='uq_suppliers_code_country'),
+        # Dropdown / upload lookups by country and brand
+        db.Index('ix_suppliers_country_brand', 'country_id', 'brand_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     supplier_name = db.Column(db.String(100), nullable=False)
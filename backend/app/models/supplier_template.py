@@ -0,0 +1,35 @@
+from app import db
+from datetime import datetime
+
+class SupplierTemplate(db.Model):
+    """Per-supplier OCR layout learned from earlier invoices"""
+    __tablename__ = 'supplier_templates'
+
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), primary_key=True)
+
+    # [{'field', 'page': 'first'|'last', 'box': [x0, y0, x1, y1]}] - boxes as fractions of the page
+    regions = db.Column(db.JSON)
+    # Invoices whose header fields were read from the template regions alone
+    region_hits = db.Column(db.Integer, default=0, nullable=False)
+
+    # {field: {'anchor', 'position', ...}} learned from PATCH corrections - see utils/supplier_rules.py
+    field_rules = db.Column(db.JSON)
+    # Corrections the field rules were learned from
+    corrections = db.Column(db.Integer, default=0, nullable=False)
+    # {field: {'rules': [rule, ...], 'count'}} - rules seen in corrections, not yet agreed on enough to apply
+    rule_candidates = db.Column(db.JSON)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    supplier = db.relationship('Supplier', backref=db.backref('template', uselist=False, lazy=True))
+
+    def to_dict(self):
+        return {
+            'supplier_id': self.supplier_id,
+            'regions': self.regions or [],
+            'region_hits': self.region_hits,
+            'field_rules': self.field_rules or {},
+            'corrections': self.corrections,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
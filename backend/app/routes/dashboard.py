@@ -1,46 +1,106 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from app.models.invoice import Invoice
 from app.models.user import User
+from app.services.dashboard_stats import DashboardStatsService
+from app.services.analytics_service import AnalyticsService
+from app.utils.ttl_cache import TTLCache
 from app import db
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import os
 
 bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
 
+# Analytics results per (range, grouping, filters); short TTL keeps them close to live
+analytics_cache = TTLCache(ttl=int(os.getenv('DASHBOARD_CACHE_TTL', 60)))
+
+def _date_range(default_days=30):
+    """Read from/to (YYYY-MM-DD) query parameters, defaulting to the last default_days days"""
+    try:
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') \
+            else date_to - timedelta(days=default_days - 1)
+    except ValueError:
+        raise ValueError("from and to must be dates in YYYY-MM-DD format")
+    return date_from, date_to
+
 @bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
-        # Total invoices processed
-        total_invoices = Invoice.query.count()
-        
-        # Invoices this month
+        # Counts and amounts come from the per-day rollup, not the invoices table
         today = datetime.utcnow().date()
         first_day_of_month = today.replace(day=1)
-        invoices_this_month = Invoice.query.filter(
-            db.func.DATE(Invoice.created_at) >= first_day_of_month
-        ).count()
-        
-        # Invoices pending
-        invoices_pending = Invoice.query.filter_by(status='pending').count()
-        
-        # Last processed invoice date
-        last_invoice = Invoice.query.order_by(Invoice.created_at.desc()).first()
-        last_processed_date = last_invoice.created_at.isoformat() if last_invoice else None
+        stats = DashboardStatsService.get_stats(first_day_of_month)
         
-        # Total amount processed this month
-        total_amount_month = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-            db.func.DATE(Invoice.created_at) >= first_day_of_month
-        ).scalar() or 0
+        # Last processed invoice date (max over the created_at index)
+        last_created_at = db.session.query(db.func.max(Invoice.created_at)).scalar()
+        last_processed_date = last_created_at.isoformat() if last_created_at else None
         
         return jsonify({
-            'total_invoices': total_invoices,
-            'invoices_this_month': invoices_this_month,
-            'invoices_pending': invoices_pending,
+            'total_invoices': stats['total_invoices'],
+            'invoices_this_month': stats['invoices_this_month'],
+            'invoices_pending': stats['invoices_pending'],
             'last_processed_date': last_processed_date,
-            'total_amount_month': float(total_amount_month)
+            'total_amount_month': stats['total_amount_month']
         }), 200
     
     except Exception as e:
         return jsonify({'message': f'Error fetching stats: {str(e)}'}), 500
+
+@bp.route('/timeseries', methods=['GET'])
+@jwt_required()
+def get_timeseries():
+    """Invoice volume, amount and quantity per day/week/month, optionally broken down"""
+    try:
+        date_from, date_to = _date_range()
+        interval = request.args.get('interval', 'day')
+        group_by = request.args.get('group_by') or None
+        country_id = request.args.get('country_id', type=int)
+        brand_id = request.args.get('brand_id', type=int)
+        
+        key = ('timeseries', date_from, date_to, interval, group_by, country_id, brand_id)
+        series, cached = analytics_cache.get_or_compute(key, lambda: AnalyticsService.invoice_timeseries(
+            date_from, date_to, interval=interval, group_by=group_by, country_id=country_id, brand_id=brand_id
+        ))
+        
+        return jsonify({
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'interval': interval,
+            'group_by': group_by,
+            'series': series,
+            'cached': cached
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching timeseries: {str(e)}'}), 500
+
+@bp.route('/tracker-status', methods=['GET'])
+@jwt_required()
+def get_tracker_status_distribution():
+    """Tracker counts per shipment status"""
+    try:
+        date_from, date_to = _date_range(default_days=365)
+        country_id = request.args.get('country_id', type=int)
+        bu_id = request.args.get('bu_id', type=int)
+        
+        key = ('tracker_status', date_from, date_to, country_id, bu_id)
+        distribution, cached = analytics_cache.get_or_compute(key, lambda: AnalyticsService.tracker_status_distribution(
+            date_from, date_to, country_id=country_id, bu_id=bu_id
+        ))
+        
+        return jsonify({
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'distribution': distribution,
+            'cached': cached
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching tracker status: {str(e)}'}), 500
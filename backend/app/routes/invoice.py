@@ -3,16 +3,22 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.invoice import Invoice, InvoiceItem
 from app.models.user import User
-from app.models.supplier import Supplier
-from app.models.brand import Brand
-from app.models.company import Company
-from app.services.ocr_service import OCRService
+from app.services.ocr_queue import ocr_queue
+from app.services.batch_upload import batch_upload_queue
 from app.services.excel_service import ExcelService
-from app.utils.file_handlers import save_uploaded_file, get_file_extension
+from app.services.invoice_service import InvoiceService
+from app.services.supplier_template_service import SupplierTemplateService
+from app.utils.file_handlers import (
+    save_uploaded_file, save_batch_file, pair_archive_files, get_file_extension,
+    INVOICE_EXTENSIONS, SUPPORTING_EXTENSIONS
+)
+from app.utils import export_cache
 from app.utils.ocr_helpers import generate_itemcode
 import os
-import io
 import json
+import time
+import zipfile
+from datetime import datetime
 
 bp = Blueprint('invoice', __name__, url_prefix='/api/invoices')
 
@@ -58,159 +64,33 @@ def upload_invoice():
         if not invoice_path or not supporting_path:
             return jsonify({'message': 'File upload failed'}), 400
         
-        # Extract invoice data via OCR (if Tesseract is available)
-        ocr_data = {
-            'invoice_number': None,
-            'invoice_date': None,
-            'total_amount': None,
-        }
-        try:
-            ocr_data = OCRService.extract_invoice_data(invoice_path)
-        except Exception as ocr_err:
-            # OCR failed, but we can still process the invoice
-            print(f"OCR warning: {str(ocr_err)}")
-            # Use defaults or let user enter manually later
-        
-        # Get supplier details for Itemcode generation
-        supplier = Supplier.query.get(int(supplier_id))
-        if not supplier:
-             return jsonify({'message': 'Supplier not found'}), 400
-             
-        supplier_code = supplier.supplier_code if supplier.supplier_code else '0000'
-        
-        # Get brand details for IM fields
-        brand = Brand.query.get(int(brand_id))
-        brand_code = brand.brand_code if brand else ''
-        
-        # Get invoice items from either supporting file or decathlon_data
-        excel_data = []
-        try:
-            excel_data = ExcelService.read_supporting_excel(supporting_path)
-        except:
-            # If Excel reading fails, use decathlon_data from form
-            if decathlon_data:
-                try:
-                    excel_data = json.loads(decathlon_data)
-                except:
-                    excel_data = []
-        
-        # If still no data, use decathlon_data from form
-        if not excel_data and decathlon_data:
-            try:
-                excel_data = json.loads(decathlon_data)
-            except:
-                excel_data = []
-        
-        # Create invoice record
-        invoice = Invoice(
-            user_id=user_id,
-            invoice_number=ocr_data.get('invoice_number'),
-            invoice_date=ocr_data.get('invoice_date'),
-            total_amount=ocr_data.get('total_amount'),
-            # currency will be set based on country or extraction
-            currency=ocr_data.get('currency', 'QAR'), # Use currency from country later if needed
-            country_id=country_id,
-            brand_id=brand_id,
-            bu_id=business_unit_id, # Map form field to model field
-            supplier_id=supplier_id,
-            invoice_file_path=invoice_path,
-            supporting_file_path=supporting_path,
-            status='processing'
+        invoice, item_count, timings = InvoiceService.create_invoice(
+            user_id, invoice_path, supporting_path,
+            country_id, brand_id, business_unit_id, supplier_id, decathlon_data
         )
         
-        # Derive Company
-        company = Company.query.filter_by(brand_id=brand_id, country_id=country_id).first()
-        if company:
-            invoice.company_id = company.id
-            
-        db.session.add(invoice)
-        
-        # Parse manual data to get Barcodes
-        manual_list = []
-        if decathlon_data:
-            try:
-                manual_list = json.loads(decathlon_data)
-                print(f"[DEBUG] Manual items: {len(manual_list)}")
-            except:
-                print("[DEBUG] Failed to parse manual data")
-                pass
-
-        # Process ALL items from Excel and merge with Manual Barcodes
-        all_items = []
-        
-        print(f"[DEBUG] ===== PROCESSING EXCEL DATA & MERGING BARCODES =====")
-        print(f"[DEBUG] Excel items: {len(excel_data)}")
-        
-        # Process each Excel row directly
-        for idx, excel_item in enumerate(excel_data):
-            decathlon_sku = str(excel_item.get('decathlon_sku', '')).strip()
-            
-            if not decathlon_sku:
-                print(f"[DEBUG] Row {idx+1}: Skipping - no Decathlon SKU")
-                continue
-            
-            # Get Barcode and Model from matching Manual Item (by index)
-            manual_barcode = ''
-            manual_model = ''
-            if idx < len(manual_list):
-                 manual_barcode = str(manual_list[idx].get('barcode', '')).strip()
-                 # Remove .0 if present
-                 if manual_barcode.endswith('.0'): manual_barcode = manual_barcode[:-2]
-                 manual_model = str(manual_list[idx].get('model', '')).strip()
-                 # Remove .0 if present
-                 if manual_model.endswith('.0'): manual_model = manual_model[:-2]
-            
-            if idx < 3:
-                model_val = excel_item.get('model', '')
-                desc_val = excel_item.get('item_description', '')
-                print(f"[DEBUG] Row {idx+1}: SKU='{decathlon_sku}' + ExcelModel='{model_val}' + ManualModel='{manual_model}' + Desc='{desc_val}' + Barcode='{manual_barcode}'")
-            
-            all_items.append({
-                'sku': decathlon_sku,
-                'model': manual_model or excel_item.get('model', ''),  # Prefer manual entry, fallback to Excel
-                'item_description': excel_item.get('item_description', ''),  # From Excel
-                'barcode': manual_barcode,  # From Manual Input (UI)
-                'quantity': excel_item.get('quantity', 0),
-                'unit_cost': excel_item.get('unit_cost', 0.0),
-                'unit_retail': excel_item.get('unit_retail', 0.0),
-                'color_size': f"000|{decathlon_sku}"
-            })
-        
-        print(f"[DEBUG] Processed {len(all_items)} merged items")
-
-        # Add invoice items
-        for item in all_items:
-            invoice_item = InvoiceItem(
-                barcode=item.get('barcode', ''),
-                quantity=item.get('quantity', 0),
-                unit_cost=item.get('unit_cost', 0.0),
-                unit_retail=item.get('unit_retail', 0.0),
-                color_size=item.get('color_size', ''),
-                season='000',
-                # IM fields - set initial values
-                item_description=item.get('item_description', ''),  # From Excel
-                mancode=item.get('model', ''),  # User's manually entered model from Decathlon products
-                alternate_code=item.get('sku', ''),  # Decathlon SKU is the alternate code
-                brand_code=brand_code,
-                supplier_code=supplier_code
-            )
-            
-            # Correct Itemcode Formula: Season(000) + SupplierCode + SKU
-            itemcode = f"000{supplier_code}{item.get('sku')}"
-            invoice_item.itemcode = itemcode
-            
-            invoice.items.append(invoice_item)
-        
         # Commit invoice (with or without items)
-        db.session.add(invoice)
+        stage_start = time.perf_counter()
         db.session.commit()
+        timings['insert_ms'] = round(timings['insert_ms'] + (time.perf_counter() - stage_start) * 1000, 1)
+        print(f"[DEBUG] Upload timings: {timings}")
+        
+        # Run OCR in the background so the request returns immediately
+        job = ocr_queue.enqueue(invoice.id, invoice_path)
         
         return jsonify({
-            'message': 'Invoice processed successfully',
+            'message': 'Invoice accepted for processing',
             'invoice_id': invoice.id,
-            'invoice': invoice.to_dict()
-        }), 201
-        
+            'status_url': f'/api/invoices/{invoice.id}/status',
+            'job': job,
+            'item_count': item_count,
+            'timings': timings,
+            'invoice': invoice.to_dict(include_items=False)
+        }), 202
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         print(f"[ERROR] upload_invoice failed: {str(e)}")
@@ -220,6 +100,153 @@ def upload_invoice():
             'message': f'Invoice processing failed: {str(e)}'
         }), 500
 
+BATCH_ID_FIELDS = ('country_id', 'brand_id', 'business_unit_id', 'supplier_id')
+
+def _batch_overrides():
+    """Per-item overrides from the optional `items` JSON list, keyed by name and by index"""
+    raw = request.form.get('items')
+    if not raw:
+        return {}, {}
+    try:
+        entries = json.loads(raw)
+    except ValueError:
+        raise ValueError('items must be a JSON list')
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError('items must be a JSON list of objects')
+    by_name = {e['name']: e for e in entries if e.get('name')}
+    by_index = {i: e for i, e in enumerate(entries) if not e.get('name')}
+    return by_name, by_index
+
+def _batch_item(name, index, invoice_path, supporting_path, defaults, by_name, by_index):
+    """Merge the shared defaults with an item's overrides and check its ids are complete"""
+    override = by_name.get(name) or by_index.get(index) or {}
+    item = {'name': name, 'invoice_path': invoice_path, 'supporting_path': supporting_path}
+    for field in BATCH_ID_FIELDS:
+        value = override.get(field) or defaults.get(field)
+        if not value:
+            raise ValueError(f'Missing {field} for {name}')
+        try:
+            item[field] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {field} for {name}')
+    decathlon_data = override.get('decathlon_data', defaults.get('decathlon_data'))
+    if decathlon_data is not None and not isinstance(decathlon_data, str):
+        decathlon_data = json.dumps(decathlon_data)
+    item['decathlon_data'] = decathlon_data
+    return item
+
+def _stem(filename):
+    return os.path.splitext(os.path.basename(filename or ''))[0]
+
+@bp.route('/batch', methods=['POST'])
+@jwt_required()
+def upload_invoice_batch():
+    """Upload many invoice/supporting pairs, from a zip archive or paired file lists"""
+    user_id = int(get_jwt_identity())
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    max_items = current_app.config['BATCH_MAX_ITEMS']
+    
+    defaults = {field: request.form.get(field) for field in BATCH_ID_FIELDS}
+    defaults['decathlon_data'] = request.form.get('decathlon_data')
+    
+    try:
+        by_name, by_index = _batch_overrides()
+        items = []
+        skipped = []
+        
+        if 'archive' in request.files:
+            archive_file = request.files['archive']
+            if get_file_extension(archive_file.filename or '') != 'zip':
+                return jsonify({'message': 'archive must be a .zip file'}), 400
+            try:
+                archive = zipfile.ZipFile(archive_file.stream)
+            except zipfile.BadZipFile:
+                return jsonify({'message': 'archive is not a valid zip file'}), 400
+            
+            with archive:
+                pairs, skipped = pair_archive_files(archive)
+                if len(pairs) > max_items:
+                    return jsonify({'message': f'Batch has {len(pairs)} pairs, the limit is {max_items}'}), 400
+                # Declared sizes guard against archives that expand far beyond the upload limit
+                uncompressed = sum(p['invoice'].file_size + p['supporting'].file_size for p in pairs)
+                if uncompressed > current_app.config['BATCH_MAX_UNCOMPRESSED_SIZE']:
+                    return jsonify({'message': 'archive is too large once extracted'}), 400
+                
+                # Validate every pair before writing any file
+                for index, pair in enumerate(pairs):
+                    items.append(_batch_item(pair['name'], index, None, None, defaults, by_name, by_index))
+                for item, pair in zip(items, pairs):
+                    with archive.open(pair['invoice']) as member:
+                        item['invoice_path'] = save_batch_file(member, pair['invoice'].filename, upload_folder)
+                    with archive.open(pair['supporting']) as member:
+                        item['supporting_path'] = save_batch_file(member, pair['supporting'].filename, upload_folder)
+        else:
+            invoice_files = request.files.getlist('invoice_files')
+            supporting_files = request.files.getlist('supporting_files')
+            if not invoice_files or len(invoice_files) != len(supporting_files):
+                return jsonify({'message': 'Provide an archive, or invoice_files and supporting_files lists of the same length'}), 400
+            if len(invoice_files) > max_items:
+                return jsonify({'message': f'Batch has {len(invoice_files)} pairs, the limit is {max_items}'}), 400
+            
+            for index, (invoice_file, supporting_file) in enumerate(zip(invoice_files, supporting_files)):
+                name = _stem(invoice_file.filename) or f'item-{index + 1}'
+                if get_file_extension(invoice_file.filename or '') not in INVOICE_EXTENSIONS:
+                    raise ValueError(f'Unsupported invoice file for {name}')
+                if get_file_extension(supporting_file.filename or '') not in SUPPORTING_EXTENSIONS:
+                    raise ValueError(f'Unsupported supporting file for {name}')
+                items.append(_batch_item(name, index, None, None, defaults, by_name, by_index))
+            for item, invoice_file, supporting_file in zip(items, invoice_files, supporting_files):
+                item['invoice_path'] = save_batch_file(invoice_file, invoice_file.filename, upload_folder)
+                item['supporting_path'] = save_batch_file(supporting_file, supporting_file.filename, upload_folder)
+        
+        if not items:
+            return jsonify({'message': 'No invoice/supporting pairs found', 'skipped': skipped}), 400
+        if not all(item['invoice_path'] and item['supporting_path'] for item in items):
+            return jsonify({'message': 'File upload failed'}), 400
+        
+        batch = batch_upload_queue.submit(user_id, items, skipped)
+        print(f"[DEBUG] Batch {batch['batch_id']}: {len(items)} pairs queued, {len(skipped)} files skipped")
+        
+        return jsonify({
+            'message': 'Batch accepted for processing',
+            'batch_id': batch['batch_id'],
+            'status_url': f"/api/invoices/batch/{batch['batch_id']}",
+            'batch': _batch_progress(batch)
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] upload_invoice_batch failed: {str(e)}")
+        return jsonify({'message': f'Batch upload failed: {str(e)}'}), 500
+
+def _batch_progress(batch):
+    """Add per-state counts and each created invoice's OCR job state to a batch record"""
+    batch.pop('user_id', None)
+    counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+    for item in batch['items']:
+        counts[item['state']] += 1
+        job = ocr_queue.get_job(item['invoice_id']) if item['invoice_id'] else None
+        item['ocr_state'] = job['state'] if job else None
+    batch['total'] = len(batch['items'])
+    batch['counts'] = counts
+    return batch
+
+@bp.route('/batch/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_batch_status(batch_id):
+    """Per-item progress and results of a batch upload"""
+    user_id = int(get_jwt_identity())
+    batch = batch_upload_queue.get_batch(batch_id)
+    
+    if not batch:
+        return jsonify({'message': 'Batch not found'}), 404
+    
+    if batch['user_id'] != user_id:
+        return jsonify({'message': 'Unauthorized'}), 403
+    
+    return jsonify(_batch_progress(batch)), 200
+
 @bp.route('/<int:invoice_id>', methods=['PATCH'])
 @jwt_required()
 def update_invoice(invoice_id):
@@ -235,13 +262,17 @@ def update_invoice(invoice_id):
         
     data = request.json
     try:
-        # Update main invoice fields
-        if 'invoice_number' in data:
-            invoice.invoice_number = data['invoice_number']
-        if 'invoice_date' in data:
-            invoice.invoice_date = data['invoice_date']
-        if 'total_amount' in data:
-            invoice.total_amount = data['total_amount']
+        # Header fields the user changed - corrections to learn the supplier's layout from
+        corrected = {
+            field: data[field] for field in ('invoice_number', 'invoice_date', 'total_amount')
+            if field in data and data[field] not in (None, '') and data[field] != getattr(invoice, field)
+        }
+        
+        # Update main invoice fields. Empty values for the fields OCR fills in are ignored,
+        # so a client saving a copy loaded before OCR finished can't wipe its results
+        for field in ('invoice_number', 'invoice_date', 'total_amount'):
+            if data.get(field) not in (None, ''):
+                setattr(invoice, field, data[field])
         if 'currency' in data:
             invoice.currency = data['currency']
         
@@ -303,7 +334,22 @@ def update_invoice(invoice_id):
                 if item_id not in request_ids:
                     db.session.delete(item_obj)
 
+        # Bump the version even for item-only edits so cached exports are not reused
+        invoice.updated_at = datetime.utcnow()
         db.session.commit()
+        export_cache.invalidate(invoice.id)
+        
+        if corrected and invoice.supplier_id and invoice.ocr_result:
+            # Best effort: a failure here must not fail the user's edit
+            try:
+                learned = SupplierTemplateService.learn_from_correction(
+                    invoice.supplier_id, invoice.ocr_result.region_text or invoice.ocr_result.raw_text, corrected
+                )
+                print(f"[DEBUG] Supplier {invoice.supplier_id} rules learned for: {learned}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARN] Could not learn supplier rules from invoice {invoice.id}: {str(e)}")
+        
         return jsonify(invoice.to_dict()), 200
         
     except Exception as e:
@@ -322,7 +368,56 @@ def get_invoice(invoice_id):
     if not invoice:
         return jsonify({'message': 'Invoice not found'}), 404
     
-    return jsonify(invoice.to_dict()), 200
+    # include=items (default) or include= to skip line items; fields=a,b limits the top-level keys
+    include = request.args.get('include', 'items')
+    include = {part.strip() for part in include.split(',') if part.strip()}
+    
+    data = invoice.to_dict(include_items='items' in include)
+    if 'ocr' in include:
+        data['ocr'] = invoice.ocr_result.to_dict() if invoice.ocr_result else None
+    
+    fields = request.args.get('fields')
+    if fields:
+        wanted = {part.strip() for part in fields.split(',') if part.strip()}
+        data = {key: value for key, value in data.items() if key in wanted or key == 'id'}
+    
+    return jsonify(data), 200
+
+@bp.route('/<int:invoice_id>/status', methods=['GET'])
+@jwt_required()
+def get_invoice_status(invoice_id):
+    """Get OCR processing status for an invoice"""
+    get_jwt_identity()  # Just verify token is valid
+    
+    invoice = Invoice.query.get(invoice_id)
+    
+    if not invoice:
+        return jsonify({'message': 'Invoice not found'}), 404
+    
+    return jsonify({
+        'invoice_id': invoice.id,
+        'status': invoice.status,
+        'job': ocr_queue.get_job(invoice.id),
+        'invoice_number': invoice.invoice_number,
+        'invoice_date': invoice.invoice_date,
+        'total_amount': invoice.total_amount
+    }), 200
+
+@bp.route('/<int:invoice_id>/ocr', methods=['GET'])
+@jwt_required()
+def get_invoice_ocr(invoice_id):
+    """Get stored raw OCR text, word confidences and field matches"""
+    get_jwt_identity()  # Just verify token is valid
+    
+    invoice = Invoice.query.get(invoice_id)
+    
+    if not invoice:
+        return jsonify({'message': 'Invoice not found'}), 404
+    
+    if not invoice.ocr_result:
+        return jsonify({'message': 'No OCR result stored for this invoice'}), 404
+    
+    return jsonify(invoice.ocr_result.to_dict()), 200
 
 @bp.route('/<int:invoice_id>/download', methods=['GET'])
 @jwt_required()
@@ -336,36 +431,51 @@ def download_invoice_excel(invoice_id):
     if not invoice:
         return jsonify({'message': 'Invoice not found'}), 404
     
+    # Client already has this version of the workbook
+    etag = export_cache.etag_for(invoice)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
     try:
-        # Generate Excel
-        items_data = [item.to_dict() for item in invoice.items]
-        
-        invoice_data = {
-            'invoice_number': invoice.invoice_number,
-            'invoice_date': invoice.invoice_date,
-            'currency': invoice.currency,
-            'total_amount': invoice.total_amount
-        }
-        
-        business_unit = invoice.business_unit
-        workbook = ExcelService.generate_erp_excel(
-            invoice_data,
-            items_data,
-            invoice.supplier.supplier_name,
-            f"    {business_unit.bu_code}"  # 4 spaces prefix
-        )
+        def generate(output_path):
+            # Generate Excel - plain row mappings, no ORM objects per line item
+            items_data = db.session.execute(
+                db.select(InvoiceItem.__table__)
+                .where(InvoiceItem.invoice_id == invoice.id)
+                .order_by(InvoiceItem.id)
+            ).mappings().all()
+            
+            invoice_data = {
+                'invoice_number': invoice.invoice_number,
+                'invoice_date': invoice.invoice_date,
+                'currency': invoice.currency,
+                'total_amount': invoice.total_amount
+            }
+            
+            business_unit = invoice.business_unit
+            workbook = ExcelService.generate_erp_excel(
+                invoice_data,
+                items_data,
+                invoice.supplier.supplier_name,
+                f"    {business_unit.bu_code}"  # 4 spaces prefix
+            )
+            workbook.save(output_path)
         
-        # Save to BytesIO
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
+        # Repeat downloads of an unchanged invoice are served from the cached file
+        output_path = export_cache.get_or_create(invoice, generate)
         
-        return send_file(
-            output,
+        response = send_file(
+            output_path,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             as_attachment=True,
-            download_name=f'Invoice_{invoice.invoice_number}_{invoice.invoice_date}.xlsx'
+            download_name=f'Invoice_{invoice.invoice_number}_{invoice.invoice_date}.xlsx',
+            etag=etag,
+            conditional=True
         )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         return jsonify({'message': f'Download failed: {str(e)}'}), 500
@@ -380,16 +490,17 @@ def list_user_invoices():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    # Return all invoices to any authenticated user
-    invoices = Invoice.query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Return all invoices to any authenticated user - headers only, items come from the detail endpoint
+    invoices = InvoiceService.list_invoice_summaries(page=page, per_page=per_page)
     
     return jsonify({
         'total': invoices.total,
         'pages': invoices.pages,
         'current_page': page,
-        'invoices': [inv.to_dict() for inv in invoices.items]
+        'invoices': [
+            inv.to_summary_dict(item_count=item_count, total_quantity=total_quantity)
+            for inv, item_count, total_quantity in invoices.items
+        ]
     }), 200
 
 @bp.route('/<int:invoice_id>', methods=['DELETE'])
@@ -421,6 +532,7 @@ def delete_invoice(invoice_id):
 
         db.session.delete(invoice)
         db.session.commit()
+        export_cache.invalidate(invoice_id)
         
         return jsonify({'message': 'Invoice deleted successfully'}), 200
         
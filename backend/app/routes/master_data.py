@@ -1,45 +1,54 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required
-from app.models.country import Country
-from app.models.brand import Brand
-from app.models.business_unit import BusinessUnit
-from app.models.supplier import Supplier
+from app.services.master_data_cache import master_data_cache
 
 bp = Blueprint('master_data', __name__, url_prefix='/api/master')
 
+def _cached_response(build):
+    """Serve build() with the master data version as ETag, or 304 if the client has it"""
+    etag = f"master-{master_data_cache.version}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Private: responses sit behind the login; no-cache: revalidate every time, a 304 costs no body
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @bp.route('/countries', methods=['GET'])
+@jwt_required()
 def get_countries():
     """Get list of countries"""
     try:
-        countries = Country.query.all()
-        return jsonify([c.to_dict() for c in countries]), 200
+        return _cached_response(master_data_cache.countries)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @bp.route('/brands/<int:country_id>', methods=['GET'])
+@jwt_required()
 def get_brands_by_country(country_id):
     """Get brands (Global list, country_id ignored)"""
     try:
         # Brands are now global in new schema
-        brands = Brand.query.all()
-        return jsonify([b.to_dict() for b in brands]), 200
+        return _cached_response(master_data_cache.brands)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @bp.route('/business-units/<int:country_id>/<int:brand_id>', methods=['GET'])
+@jwt_required()
 def get_business_units(country_id, brand_id):
     """Get business units for a specific country and brand"""
     try:
-        units = BusinessUnit.query.filter_by(country_id=country_id, brand_id=brand_id).all()
-        return jsonify([u.to_dict() for u in units]), 200
+        return _cached_response(lambda: master_data_cache.business_units(country_id, brand_id))
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 @bp.route('/suppliers/<int:country_id>/<int:brand_id>', methods=['GET'])
+@jwt_required()
 def get_suppliers(country_id, brand_id):
     """Get suppliers for country and brand"""
     try:
-        suppliers = Supplier.query.filter_by(country_id=country_id, brand_id=brand_id).all()
-        return jsonify([s.to_dict() for s in suppliers]), 200
+        return _cached_response(lambda: master_data_cache.suppliers(country_id, brand_id))
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
@@ -7,6 +7,25 @@ from app.services.tracker_service import TrackerService
 
 bp = Blueprint('tracker', __name__, url_prefix='/api/tracker')
 
+def _listing_args():
+    """Read filter, sort and pagination query parameters shared by the listing endpoints"""
+    statuses = [s for s in request.args.getlist('shipment_status') for s in s.split(',') if s]
+    filters = {
+        'bu_id': request.args.get('bu_id', type=int),
+        'shipment_status': statuses,
+        'date_from': request.args.get('date_from'),
+        'date_to': request.args.get('date_to'),
+        'ticket_no': request.args.get('ticket_no'),
+        'shipment_no': request.args.get('shipment_no')
+    }
+    return {
+        'filters': filters,
+        'sort': request.args.get('sort', 'serial_number'),
+        'direction': request.args.get('direction', 'asc'),
+        'limit': request.args.get('limit', type=int),
+        'cursor': request.args.get('cursor')
+    }
+
 @bp.route('/add', methods=['POST'])
 @jwt_required()
 def add_to_tracker():
@@ -68,25 +87,30 @@ def get_trackers_by_country(country_id):
     try:
         user_id = int(get_jwt_identity())
         
-        # Get all trackers for this country
-        trackers = TrackerService.get_trackers_by_country_and_bu(country_id)
+        # Get the (filtered, optionally paginated) trackers for this country in one query
+        args = _listing_args()
+        args['filters']['country_id'] = country_id
+        trackers, next_cursor = TrackerService.get_trackers_page(**args)
         
         # Group by BU
         bu_groups = {}
-        for tracker in trackers:
+        for tracker, total_quantity in trackers:
             bu_id = tracker.bu_id
             if bu_id not in bu_groups:
                 bu_groups[bu_id] = {
                     'bu': tracker.business_unit.to_dict() if tracker.business_unit else None,
                     'trackers': []
                 }
-            bu_groups[bu_id]['trackers'].append(tracker.to_dict())
+            bu_groups[bu_id]['trackers'].append(tracker.to_dict(total_quantity=total_quantity))
         
         return jsonify({
             'country_id': country_id,
-            'business_units': list(bu_groups.values())
+            'business_units': list(bu_groups.values()),
+            'next_cursor': next_cursor
         }), 200
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"[ERROR] Failed to get trackers by country: {str(e)}")
         return jsonify({'message': f'Error: {str(e)}'}), 500
@@ -98,7 +122,10 @@ def get_all_trackers():
     try:
         user_id = int(get_jwt_identity())
         
-        countries_data = TrackerService.get_all_countries_with_trackers()
+        args = _listing_args()
+        args['filters']['country_id'] = request.args.get('country_id', type=int)
+        rows, next_cursor = TrackerService.get_trackers_page(**args)
+        countries_data = TrackerService.get_all_countries_with_trackers(rows)
         
         # Format response
         result = []
@@ -112,7 +139,7 @@ def get_all_trackers():
                 
                 bus_list.append({
                     'bu': bu.to_dict() if bu else None,
-                    'trackers': [t.to_dict() for t in trackers]
+                    'trackers': [t.to_dict(total_quantity=qty) for t, qty in trackers]
                 })
             
             result.append({
@@ -120,8 +147,10 @@ def get_all_trackers():
                 'business_units': bus_list
             })
         
-        return jsonify({'data': result}), 200
+        return jsonify({'data': result, 'next_cursor': next_cursor}), 200
     
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"[ERROR] Failed to get all trackers: {str(e)}")
         return jsonify({'message': f'Error: {str(e)}'}), 500
@@ -0,0 +1,159 @@
+from app import db
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.lpo_tracker import LPOTracker
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from datetime import date, datetime, time, timedelta
+
+class AnalyticsService:
+    """Time-series and breakdown aggregations for the dashboard"""
+
+    INTERVALS = ('day', 'week', 'month')
+
+    # group_by value -> (invoice column, model, name column)
+    GROUPINGS = {
+        'country': ('country_id', Country, 'country_name'),
+        'brand': ('brand_id', Brand, 'brand_name'),
+        'bu': ('bu_id', BusinessUnit, 'store_name'),
+        'supplier': ('supplier_id', Supplier, 'supplier_name')
+    }
+
+    @staticmethod
+    def _period(column, interval):
+        """Truncate a timestamp column to the start of its day, week (Monday) or month"""
+        if db.engine.dialect.name == 'postgresql':
+            return db.func.date_trunc(interval, column)
+        # SQLite
+        if interval == 'day':
+            return db.func.date(column)
+        if interval == 'week':
+            return db.func.date(column, 'weekday 0', '-6 days')
+        return db.func.strftime('%Y-%m-01', column)
+
+    @staticmethod
+    def _period_label(value):
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        return str(value)[:10]
+
+    @staticmethod
+    def _range_filter(column, date_from, date_to):
+        """created_at range covering whole days from date_from to date_to inclusive"""
+        start = datetime.combine(date_from, time.min)
+        end = datetime.combine(date_to, time.min) + timedelta(days=1)
+        return (column >= start) & (column < end)
+
+    @staticmethod
+    def invoice_timeseries(date_from, date_to, interval='day', group_by=None, country_id=None, brand_id=None):
+        """
+        Invoice count, total amount and line item quantity per period
+
+        Invoices are selected by a created_at range (ix_invoices_created_at) and
+        each invoice's quantity is summed from its items through
+        ix_invoice_line_items_invoice_id, then grouped by period and key.
+
+        Args:
+            date_from, date_to: Inclusive date range
+            interval: One of INTERVALS
+            group_by: None or a key of GROUPINGS
+            country_id, brand_id: Optional filters
+
+        Returns:
+            List of series dicts: {'key', 'name', 'points': [{'period', 'invoice_count', 'total_amount', 'total_quantity'}]}
+        """
+        if interval not in AnalyticsService.INTERVALS:
+            raise ValueError(f"Invalid interval: {interval}")
+        if group_by and group_by not in AnalyticsService.GROUPINGS:
+            raise ValueError(f"Invalid group_by: {group_by}")
+        if date_from > date_to:
+            raise ValueError("from must not be after to")
+
+        invoices = Invoice.__table__
+        items = InvoiceItem.__table__
+
+        quantity = db.select(
+            db.func.coalesce(db.func.sum(items.c.quantity), 0)
+        ).where(
+            items.c.invoice_id == invoices.c.id
+        ).correlate(invoices).scalar_subquery()
+
+        key_column = invoices.c[AnalyticsService.GROUPINGS[group_by][0]] if group_by else db.literal(None)
+
+        per_invoice = db.select(
+            AnalyticsService._period(invoices.c.created_at, interval).label('period'),
+            key_column.label('key'),
+            invoices.c.total_amount.label('total_amount'),
+            quantity.label('quantity')
+        ).where(
+            AnalyticsService._range_filter(invoices.c.created_at, date_from, date_to)
+        )
+        if country_id:
+            per_invoice = per_invoice.where(invoices.c.country_id == country_id)
+        if brand_id:
+            per_invoice = per_invoice.where(invoices.c.brand_id == brand_id)
+        per_invoice = per_invoice.subquery()
+
+        rows = db.session.execute(
+            db.select(
+                per_invoice.c.period,
+                per_invoice.c.key,
+                db.func.count(),
+                db.func.coalesce(db.func.sum(per_invoice.c.total_amount), 0),
+                db.func.coalesce(db.func.sum(per_invoice.c.quantity), 0)
+            ).group_by(
+                per_invoice.c.period, per_invoice.c.key
+            ).order_by(
+                per_invoice.c.key, per_invoice.c.period
+            )
+        ).all()
+
+        # Names for the keys that appear, by primary key
+        names = {}
+        if group_by:
+            _, model, name_column = AnalyticsService.GROUPINGS[group_by]
+            keys = {row[1] for row in rows if row[1] is not None}
+            if keys:
+                names = dict(db.session.query(model.id, getattr(model, name_column)).filter(model.id.in_(keys)).all())
+
+        series = {}
+        for period, key, invoice_count, total_amount, total_quantity in rows:
+            entry = series.setdefault(key, {
+                'key': key,
+                'name': names.get(key) if group_by else 'All invoices',
+                'points': []
+            })
+            entry['points'].append({
+                'period': AnalyticsService._period_label(period),
+                'invoice_count': invoice_count,
+                'total_amount': float(total_amount),
+                'total_quantity': float(total_quantity)
+            })
+        return list(series.values())
+
+    @staticmethod
+    def tracker_status_distribution(date_from, date_to, country_id=None, bu_id=None):
+        """
+        Tracker counts per shipment_status for trackers created in the range
+
+        Returns:
+            List of {'shipment_status', 'count'} sorted by count, descending
+        """
+        if date_from > date_to:
+            raise ValueError("from must not be after to")
+
+        query = db.session.query(
+            LPOTracker.shipment_status, db.func.count(LPOTracker.id)
+        ).filter(
+            AnalyticsService._range_filter(LPOTracker.created_at, date_from, date_to)
+        )
+        if country_id:
+            query = query.filter(LPOTracker.country_id == country_id)
+        if bu_id:
+            query = query.filter(LPOTracker.bu_id == bu_id)
+
+        rows = query.group_by(LPOTracker.shipment_status).order_by(db.func.count(LPOTracker.id).desc()).all()
+        return [{'shipment_status': status, 'count': count} for status, count in rows]
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import copy
+import threading
+import uuid
+from app.utils.job_registry import JobRegistry
+
+class BatchUploadQueue:
+    """In-process worker pool that creates the invoices of a batch upload"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self.batches = JobRegistry(ttl=3600, max_entries=1000)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the worker pool; size comes from BATCH_UPLOAD_WORKERS"""
+        self.app = app
+        workers = int(app.config.get('BATCH_UPLOAD_WORKERS', 2))
+        self.batches = JobRegistry(
+            ttl=int(app.config.get('JOB_RETENTION_SECONDS', 3600)),
+            max_entries=int(app.config.get('JOB_RETENTION_MAX', 1000))
+        )
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-worker')
+        app.extensions['batch_upload_queue'] = self
+
+    def submit(self, user_id, items, skipped=None):
+        """
+        Schedule invoice creation for each item and return the batch record
+
+        Args:
+            user_id: Uploading user
+            items: Dicts with name, invoice_path, supporting_path, country_id,
+                brand_id, business_unit_id, supplier_id and decathlon_data
+            skipped: Names of uploaded files that could not be paired
+        """
+        batch_id = uuid.uuid4().hex
+        batch = {
+            'batch_id': batch_id,
+            'user_id': user_id,
+            'state': 'queued',
+            'created_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'skipped': list(skipped or []),
+            'items': [
+                {
+                    'index': index,
+                    'name': item['name'],
+                    'state': 'queued',
+                    'invoice_id': None,
+                    'item_count': None,
+                    'error': None,
+                    'started_at': None,
+                    'finished_at': None
+                }
+                for index, item in enumerate(items)
+            ]
+        }
+        with self.lock:
+            self.batches.add(batch_id, batch)
+            snapshot = copy.deepcopy(batch)
+        for index, item in enumerate(items):
+            self.executor.submit(self._run, batch_id, index, user_id, item)
+        return snapshot
+
+    def get_batch(self, batch_id):
+        """Return a copy of the batch record, or None"""
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            return copy.deepcopy(batch) if batch else None
+
+    def _update_item(self, batch_id, index, **fields):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            batch['items'][index].update(fields)
+            states = [item['state'] for item in batch['items']]
+            if all(state in ('done', 'failed') for state in states):
+                batch['state'] = 'done'
+                batch['finished_at'] = datetime.utcnow().isoformat()
+                self.batches.finish(batch_id)
+            elif any(state != 'queued' for state in states):
+                batch['state'] = 'running'
+
+    def _run(self, batch_id, index, user_id, item):
+        """Worker body: create one invoice with its items, then queue its OCR"""
+        from app import db
+        from app.services.invoice_service import InvoiceService
+        from app.services.ocr_queue import ocr_queue
+
+        self._update_item(batch_id, index, state='running', started_at=datetime.utcnow().isoformat())
+
+        with self.app.app_context():
+            try:
+                invoice, item_count, _ = InvoiceService.create_invoice(
+                    user_id,
+                    item['invoice_path'],
+                    item['supporting_path'],
+                    item['country_id'],
+                    item['brand_id'],
+                    item['business_unit_id'],
+                    item['supplier_id'],
+                    item.get('decathlon_data')
+                )
+                db.session.commit()
+                invoice_id = invoice.id
+            except Exception as e:
+                db.session.rollback()
+                print(f"[ERROR] Batch {batch_id} item {index} ({item['name']}) failed: {str(e)}")
+                self._update_item(
+                    batch_id, index, state='failed', error=str(e),
+                    finished_at=datetime.utcnow().isoformat()
+                )
+                return
+            finally:
+                db.session.remove()
+
+        ocr_queue.enqueue(invoice_id, item['invoice_path'])
+        self._update_item(
+            batch_id, index, state='done', invoice_id=invoice_id, item_count=item_count,
+            finished_at=datetime.utcnow().isoformat()
+        )
+
+batch_upload_queue = BatchUploadQueue()
@@ -0,0 +1,190 @@
+from app import db
+from app.models.invoice import Invoice
+from app.models.dashboard_stats import InvoiceDailyStats
+from sqlalchemy import event, inspect
+from datetime import date, datetime
+
+# Invoice attributes that decide an invoice's bucket or its contribution to it
+TRACKED_FIELDS = ('created_at', 'country_id', 'brand_id', 'status', 'total_amount')
+
+class DashboardStatsService:
+    """
+    Keeps invoice_daily_stats in step with the invoices table
+
+    Session flush hooks read what each inserted, updated or deleted invoice
+    contributes to its (day, country, brand) bucket before and after the
+    flush, and add the difference to the rollup rows in the same
+    transaction. Rows are changed by increments, never overwritten with a
+    recount, so concurrent transactions touching one bucket don't lose each
+    other's counts; the before-values are read under a row lock, so two
+    transactions changing one invoice don't both take out the same values.
+    Core bulk writes bypass the hooks; run
+    rebuild_dashboard_stats.py after those.
+    """
+
+    @staticmethod
+    def register(session):
+        """Attach the flush hooks to a session, sessionmaker or scoped_session"""
+        if event.contains(session, 'before_flush', DashboardStatsService._before_flush):
+            return
+        event.listen(session, 'before_flush', DashboardStatsService._before_flush)
+        event.listen(session, 'after_flush', DashboardStatsService._after_flush)
+
+    @staticmethod
+    def _changed(invoice):
+        state = inspect(invoice)
+        return any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS)
+
+    @staticmethod
+    def _add_contributions(connection, invoice_ids, deltas, sign, lock=False):
+        """
+        Add sign times the given invoices' contributions, as stored in the
+        database, to deltas: (day, country_id, brand_id) -> [invoices, pending, amount]
+
+        lock takes the rows' write locks first (FOR UPDATE), so a concurrent
+        transaction changing the same invoice waits and then reads its new values.
+        SQLite has no row locks and ignores FOR UPDATE; there a write that
+        matches nothing takes the database write lock instead.
+        """
+        if not invoice_ids:
+            return
+        invoices = Invoice.__table__
+        query = db.select(
+            db.func.date(invoices.c.created_at), invoices.c.country_id, invoices.c.brand_id,
+            invoices.c.status, invoices.c.total_amount
+        ).where(invoices.c.id.in_(invoice_ids))
+        if lock and connection.dialect.name == 'sqlite':
+            connection.execute(invoices.update().where(db.false()).values(id=invoices.c.id))
+        elif lock:
+            query = query.with_for_update()
+        rows = connection.execute(query)
+        for day, country_id, brand_id, status, total_amount in rows:
+            if day is None:
+                continue
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            delta = deltas.setdefault((day, country_id, brand_id), [0, 0, 0.0])
+            delta[0] += sign
+            delta[1] += sign if status == 'pending' else 0
+            delta[2] += sign * (total_amount or 0)
+
+    @staticmethod
+    def _before_flush(session, flush_context, instances):
+        # Start afresh: leftovers from a flush that failed half way must not be applied
+        deltas = session.info['dashboard_stats_deltas'] = {}
+        session.info['dashboard_stats_ids'] = updated = [
+            o.id for o in session.dirty
+            if isinstance(o, Invoice) and o.id is not None and DashboardStatsService._changed(o)
+        ]
+        deleted = [o.id for o in session.deleted if isinstance(o, Invoice) and o.id is not None]
+        # Take out what the rows contribute before this flush rewrites or removes them. Locked, so
+        # two transactions changing one invoice don't both subtract the same committed values
+        DashboardStatsService._add_contributions(session.connection(), deleted + updated, deltas, -1, lock=True)
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        deltas = session.info.pop('dashboard_stats_deltas', {})
+        ids = session.info.pop('dashboard_stats_ids', [])
+        ids += [o.id for o in session.new if isinstance(o, Invoice)]
+        connection = session.connection()
+        DashboardStatsService._add_contributions(connection, ids, deltas, 1)
+        for bucket, (invoice_count, pending_count, total_amount) in deltas.items():
+            if invoice_count or pending_count or total_amount:
+                DashboardStatsService._apply_delta(connection, *bucket, invoice_count, pending_count, total_amount)
+
+    @staticmethod
+    def _upsert(table):
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(table)
+
+    @staticmethod
+    def _apply_delta(connection, day, country_id, brand_id, invoice_count, pending_count, total_amount):
+        """Add to one rollup row, creating it if needed and removing it once it covers no invoices"""
+        stats = InvoiceDailyStats.__table__
+        stmt = DashboardStatsService._upsert(stats).values(
+            day=day, country_id=country_id, brand_id=brand_id, invoice_count=invoice_count,
+            pending_count=pending_count, total_amount=total_amount, updated_at=datetime.utcnow()
+        )
+        # Relative to the stored row, so the row lock taken by the conflict orders concurrent writers
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[stats.c.day, stats.c.country_id, stats.c.brand_id],
+            set_={
+                'invoice_count': stats.c.invoice_count + stmt.excluded.invoice_count,
+                'pending_count': stats.c.pending_count + stmt.excluded.pending_count,
+                'total_amount': stats.c.total_amount + stmt.excluded.total_amount,
+                'updated_at': stmt.excluded.updated_at
+            }
+        ))
+        if invoice_count < 0:
+            key = (stats.c.day == day) & (stats.c.country_id == country_id) & (stats.c.brand_id == brand_id)
+            connection.execute(stats.delete().where(key & (stats.c.invoice_count <= 0)))
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every rollup row from the invoices table
+
+        Runs as one transaction, so readers keep seeing the previous rows until
+        the new ones are committed.
+
+        Returns:
+            Number of rollup rows written
+        """
+        try:
+            invoices = Invoice.__table__
+            stats = InvoiceDailyStats.__table__
+            day = db.func.date(invoices.c.created_at)
+
+            db.session.execute(stats.delete())
+            db.session.execute(stats.insert().from_select(
+                ['day', 'country_id', 'brand_id', 'invoice_count', 'pending_count', 'total_amount', 'updated_at'],
+                db.select(
+                    day,
+                    invoices.c.country_id,
+                    invoices.c.brand_id,
+                    db.func.count(invoices.c.id),
+                    db.func.coalesce(db.func.sum(db.case((invoices.c.status == 'pending', 1), else_=0)), 0),
+                    db.func.coalesce(db.func.sum(invoices.c.total_amount), 0),
+                    db.literal(datetime.utcnow())
+                ).where(
+                    invoices.c.created_at.isnot(None)
+                ).group_by(day, invoices.c.country_id, invoices.c.brand_id)
+            ))
+            rows = db.session.query(db.func.count()).select_from(stats).scalar()
+            db.session.commit()
+            return rows
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Failed to rebuild dashboard stats: {str(e)}")
+            raise
+
+    @staticmethod
+    def get_stats(month_start):
+        """
+        Totals for the dashboard from the rollup table
+
+        Args:
+            month_start: First day of the current month (date)
+
+        Returns:
+            Dict with total_invoices, invoices_pending, invoices_this_month, total_amount_month
+        """
+        s = InvoiceDailyStats
+        total, pending = db.session.query(
+            db.func.coalesce(db.func.sum(s.invoice_count), 0),
+            db.func.coalesce(db.func.sum(s.pending_count), 0)
+        ).one()
+        # Separate query so the month is a range over the day index
+        month_count, month_amount = db.session.query(
+            db.func.coalesce(db.func.sum(s.invoice_count), 0),
+            db.func.coalesce(db.func.sum(s.total_amount), 0)
+        ).filter(s.day >= month_start).one()
+        return {
+            'total_invoices': int(total),
+            'invoices_pending': int(pending),
+            'invoices_this_month': int(month_count),
+            'total_amount_month': float(month_amount)
+        }
@@ -3,256 +3,294 @@ from openpyxl.utils import get_column_letter
 
 class ExcelService:
     
+    # Expected headers and their internal keys
+    SUPPORTING_COLUMN_DEFS = {
+        'decathlon_sku': ['Decathlon SKU', 'Decathlon SKU #', 'SKU #', 'SKU', 'Model Code', 'Item Code'],
+        'model': ['Model', 'Model Code', 'Item Code', 'Model #', 'Item #', 'Article #', 'Style', 'Article Code', 'Product Code'],
+        'item_description': ['Item Description', 'Description', 'Product Description', 'Product Name', 'Name', 'Title'],
+        'quantity': ['QTY', 'Qty', 'Quantity', 'Units'],
+        'unit_cost': ['Unit Cost without VAT', 'Foreign FOB', 'Unit Cost', 'Cost', 'Cost Price'],
+        'unit_retail': ['Unit Retail With VAT', 'Unit Retail', 'Retail Price', 'RRP', 'Unit Price'],
+        'barcode': ['Barcode', 'EAN', 'UPC', 'GTIN', 'International Code']
+    }
+    
+    # Number of leading rows searched for the header row
+    HEADER_SEARCH_ROWS = 15
+    
     @staticmethod
     def read_supporting_excel(file_path):
-        """Read Decathlon SKU, quantity, and cost data from Excel using header names"""
+        """
+        Read Decathlon SKU, quantity, and cost data from Excel using header names
+        
+        Loads every item into a list, for the debug scripts; uploads stream
+        with iter_supporting_excel.
+        """
+        return list(ExcelService.iter_supporting_excel(file_path))
+    
+    @staticmethod
+    def _match_header_row(row_values, exact_only=False):
+        """Map internal keys to column indices for a candidate header row"""
+        found_keys = {}
+        for idx, cell_value in enumerate(row_values):
+            if cell_value is None: continue
+            cell_str = str(cell_value).strip().lower()
+            # Use partial matching for longer headers, exact for shorter ones
+            for key, possibilities in ExcelService.SUPPORTING_COLUMN_DEFS.items():
+                if key in found_keys: continue
+                for p in possibilities:
+                    p_low = p.lower()
+                    if cell_str == p_low or (not exact_only and len(p_low) > 5 and p_low in cell_str):
+                        found_keys[key] = idx
+                        break
+        return found_keys
+    
+    @staticmethod
+    def _normalize_supporting_row(row, columns):
+        """Turn a raw sheet row into an item dict, or None if it has no identifier"""
+        values = {}
+        row_len = len(row)
+        for key, idx in columns:
+            val = row[idx] if idx is not None and idx < row_len else None
+            values[key] = val if val is not None else ''
+        
+        # Extract and normalize
+        d_sku = str(values['decathlon_sku']).strip()
+        if d_sku.lower().endswith('.0'): d_sku = d_sku[:-2]
+        
+        model = str(values['model']).strip()
+        if model.lower().endswith('.0'): model = model[:-2]
+        
+        item_description = str(values['item_description']).strip()
+        
+        barcode_val = values['barcode']
+        barcode = ''
+        if barcode_val:
+            try:
+                if isinstance(barcode_val, (int, float)):
+                    barcode = "{:.0f}".format(barcode_val)
+                else:
+                    barcode = str(barcode_val).strip()
+                    if barcode.lower().endswith('.0'):
+                        barcode = barcode[:-2]
+            except:
+                barcode = str(barcode_val).strip()
+        
+        if not (d_sku or model or barcode):
+            return None
+        
+        qty_val = values['quantity']
+        try:
+            qty = float(qty_val) if qty_val != '' else 0
+        except: qty = 0
+        
+        cost_val = values['unit_cost']
+        try:
+            cost = float(cost_val) if cost_val != '' else 0.0
+        except: cost = 0.0
+        
+        retail_val = values['unit_retail']
+        try:
+            retail = float(retail_val) if retail_val != '' else 0.0
+        except: retail = 0.0
+        
+        return {
+            'decathlon_sku': d_sku,
+            'model': model,
+            'item_description': item_description,
+            'barcode': barcode,
+            'quantity': qty,
+            'unit_cost': cost,
+            'unit_retail': retail,
+            'color_size': f"000|{d_sku}" if d_sku else f"000|{model}"
+        }
+    
+    @staticmethod
+    def iter_supporting_excel(file_path):
+        """Stream normalized items from a supporting Excel file
+        
+        The workbook is opened in read-only mode and read in a single pass:
+        the first HEADER_SEARCH_ROWS rows are buffered while looking for the
+        header, after which rows are yielded one at a time, so memory stays
+        flat regardless of sheet size.
+        """
+        wb = None
         try:
-            wb = openpyxl.load_workbook(file_path, data_only=True)
+            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
             ws = wb.active
+            # Some writers store a wrong sheet dimension; read until the real end
+            ws.reset_dimensions()
             
-            # Find column indices by header name
-            header_map = {}
-            # Expected headers and their internal keys
-            column_defs = {
-                'decathlon_sku': ['Decathlon SKU', 'Decathlon SKU #', 'SKU #', 'SKU', 'Model Code', 'Item Code'],
-                'model': ['Model', 'Model Code', 'Item Code', 'Model #', 'Item #', 'Article #', 'Style', 'Article Code', 'Product Code'],
-                'item_description': ['Item Description', 'Description', 'Product Description', 'Product Name', 'Name', 'Title'],
-                'quantity': ['QTY', 'Qty', 'Quantity', 'Units'],
-                'unit_cost': ['Unit Cost without VAT', 'Foreign FOB', 'Unit Cost', 'Cost', 'Cost Price'],
-                'unit_retail': ['Unit Retail With VAT', 'Unit Retail', 'Retail Price', 'RRP', 'Unit Price'],
-                'barcode': ['Barcode', 'EAN', 'UPC', 'GTIN', 'International Code']
-            }
+            rows = ws.iter_rows(values_only=True)
             
-            # Find header row by searching first 15 rows
+            # Find header row by searching the first rows
+            header_map = {}
             header_row_idx = None
+            buffered = []
             print(f"[DEBUG] Searching for headers in Excel file...")
-            for r_idx in range(1, 16):
-                try:
-                    row_values = list(ws.iter_rows(min_row=r_idx, max_row=r_idx, values_only=True))[0]
-                    if not row_values: continue
-                    
-                    print(f"[DEBUG] Row {r_idx} values: {row_values[:10]}")  # Show first 10 columns
-                    
-                    found_keys = {}
-                    for idx, cell_value in enumerate(row_values):
-                        if cell_value is None: continue
-                        cell_str = str(cell_value).strip().lower()
-                        # Use partial matching for longer headers, exact for shorter ones
-                        for key, possibilities in column_defs.items():
-                            if key in found_keys: continue
-                            for p in possibilities:
-                                p_low = p.lower()
-                                if cell_str == p_low or (len(p_low) > 5 and p_low in cell_str):
-                                    found_keys[key] = idx
-                                    print(f"[DEBUG] Found '{key}' at column {idx} (header: '{cell_value}')")
-                                    break
-                    
+            for r_idx, row_values in enumerate(rows, start=1):
+                buffered.append(row_values)
+                if row_values:
+                    found_keys = ExcelService._match_header_row(row_values)
                     # If we found at least Decathlon SKU or Barcode + QTY/Cost, it's likely the header row
                     if 'decathlon_sku' in found_keys or ('barcode' in found_keys and len(found_keys) >= 2):
                         header_map = found_keys
                         header_row_idx = r_idx
                         print(f"[DEBUG] ✓ Header row found at index {r_idx}: {header_map}")
                         break
-                except:
-                    continue
+                if r_idx >= ExcelService.HEADER_SEARCH_ROWS:
+                    break
             
             if header_row_idx is None:
-                 print(f"[DEBUG] Header search failed. Defaulting to row 1.")
-                 header_row_idx = 1
-                 # Last ditch effort on row 1
-                 headers = list(ws.iter_rows(min_row=1, max_row=1, values_only=True))[0]
-                 for idx, cell_value in enumerate(headers):
-                    if not cell_value: continue
-                    cell_str = str(cell_value).strip().lower()
-                    for key, possibilities in column_defs.items():
-                        if key in header_map: continue
-                        if any(p.lower() == cell_str for p in possibilities):
-                            header_map[key] = idx
-
-            data = []
+                print(f"[DEBUG] Header search failed. Defaulting to row 1.")
+                header_row_idx = 1
+                # Last ditch effort on row 1
+                if buffered and buffered[0]:
+                    header_map = ExcelService._match_header_row(buffered[0], exact_only=True)
+                # Rows after row 1 that were buffered during the search are data rows
+                pending = buffered[1:]
+            else:
+                pending = []
+            
+            # Resolve (key, column index) once instead of per row
+            columns = [(key, header_map.get(key)) for key in ExcelService.SUPPORTING_COLUMN_DEFS]
+            
+            count = 0
             row_count = 0
-            for row in ws.iter_rows(min_row=header_row_idx + 1, values_only=True):
-                # Stop if row is completely empty
-                if not any(row): continue
-                
-                row_count += 1
-                # Helper to safely get value by key
-                def get_val(key):
-                    if key in header_map and header_map[key] < len(row):
-                        val = row[header_map[key]]
-                        return val if val is not None else ''
-                    return ''
-
-                # Extract and normalize
-                d_sku_val = get_val('decathlon_sku')
-                d_sku = str(d_sku_val).strip() if d_sku_val is not None else ''
-                if d_sku.lower().endswith('.0'): d_sku = d_sku[:-2]
-                
-                model_val = get_val('model')
-                model = str(model_val).strip() if model_val is not None else ''
-                if model.lower().endswith('.0'): model = model[:-2]
-                
-                item_desc_val = get_val('item_description')
-                item_description = str(item_desc_val).strip() if item_desc_val is not None else ''
-                
-                barcode_val = get_val('barcode')
-                barcode = ''
-                if barcode_val:
-                    try:
-                        if isinstance(barcode_val, (int, float)):
-                            barcode = "{:.0f}".format(barcode_val)
-                        else:
-                            barcode = str(barcode_val).strip()
-                            if barcode.lower().endswith('.0'):
-                                barcode = barcode[:-2]
-                    except:
-                        barcode = str(barcode_val).strip()
-
-                if d_sku or model or barcode:
-                    qty_val = get_val('quantity')
-                    try:
-                        qty = float(qty_val) if qty_val is not None and qty_val != '' else 0
-                    except: qty = 0
-                        
-                    cost_val = get_val('unit_cost')
-                    try:
-                        cost = float(cost_val) if cost_val is not None and cost_val != '' else 0.0
-                    except: cost = 0.0
-                        
-                    retail_val = get_val('unit_retail')
-                    try:
-                        retail = float(retail_val) if retail_val is not None and retail_val != '' else 0.0
-                    except: retail = 0.0
-
-                    item_data = {
-                        'decathlon_sku': d_sku,
-                        'model': model,
-                        'item_description': item_description,
-                        'barcode': barcode,
-                        'quantity': qty,
-                        'unit_cost': cost,
-                        'unit_retail': retail,
-                        'color_size': f"000|{d_sku}" if d_sku else f"000|{model}"
-                    }
+            for source in (pending, rows):
+                for row in source:
+                    # Skip completely empty rows
+                    if not row or not any(row): continue
+                    
+                    row_count += 1
+                    item_data = ExcelService._normalize_supporting_row(row, columns)
+                    if item_data is None:
+                        continue
                     
                     # Log first few items for debugging
-                    if len(data) < 3:
-                        print(f"[DEBUG] Excel row {row_count}: Decathlon SKU='{d_sku}', Model='{model}', Barcode='{barcode}'")
+                    if count < 3:
+                        print(f"[DEBUG] Excel row {row_count}: Decathlon SKU='{item_data['decathlon_sku']}', Model='{item_data['model']}', Barcode='{item_data['barcode']}'")
                     
-                    data.append(item_data)
+                    count += 1
+                    yield item_data
             
-            print(f"[DEBUG] Successfully read {len(data)} items from Excel (processed {row_count} rows)")
-            return data
+            print(f"[DEBUG] Successfully read {count} items from Excel (processed {row_count} rows)")
         except Exception as e:
             print(f"[ERROR] read_supporting_excel failed: {str(e)}")
             raise Exception(f"Excel reading error: {str(e)}")
+        finally:
+            # Read-only workbooks keep the file handle open until closed
+            if wb is not None:
+                wb.close()
+    
+    PO_HEADERS = [
+        'Company', 'Brand', 'MCU', 'InvoiceNumber', 'Albaran', 'BOX#',
+        'DateYYYYMMDD', 'Itemcode', 'Color|Size', 'Barcode', 'QTY',
+        'Local FOB', 'Foreign Cur', 'Foreign FOB', 'Unit Retail'
+    ]
+    
+    IM_HEADERS = [
+        'Itemcode', 'Desc. Line 1', 'Desc. Line 2', 'mancode', 'brand', 
+        'season', 'supplier', 'section', 'family', 'subfamily', 
+        'feature code', 'alternate code', 'HS Code', 'COO'
+    ]
+    
+    @staticmethod
+    def _po_rows(invoice_data, invoice_items, business_unit_code):
+        """Yield PO Creation data rows"""
+        for item in invoice_items:
+            yield [
+                '06002',              # Company
+                '54',                 # Brand
+                business_unit_code,   # MCU
+                invoice_data.get('invoice_number', ''), # InvoiceNumber
+                '',                   # Albaran
+                '',                   # BOX#
+                invoice_data.get('invoice_date', ''),   # DateYYYYMMDD
+                item.get('itemcode', ''),               # Itemcode
+                item.get('color_size', ''),             # Color|Size
+                item.get('barcode', ''),                # Barcode
+                item.get('quantity', 0),                # QTY
+                '',                                     # Local FOB
+                invoice_data.get('currency', 'QAR'),    # Foreign Cur
+                item.get('unit_cost', 0),               # Foreign FOB (The unit Cost)
+                item.get('unit_retail', 0)              # Unit Retail
+            ]
+    
+    @staticmethod
+    def _im_rows(invoice_items):
+        """Yield IM Creation data rows"""
+        for item in invoice_items:
+            # Split description if it's longer than 30 characters
+            full_desc = item.get('item_description') or ''
+            if len(full_desc) > 30:
+                desc_line_1 = full_desc[:30]
+                desc_line_2 = full_desc[30:]
+            else:
+                desc_line_1 = full_desc
+                desc_line_2 = ''
+            
+            yield [
+                item.get('itemcode', ''),           # Itemcode
+                desc_line_1,                        # Desc. Line 1
+                desc_line_2,                        # Desc. Line 2
+                item.get('mancode', ''),            # mancode
+                item.get('brand_code', ''),         # brand
+                item.get('season', ''),             # season
+                item.get('supplier_code', ''),      # supplier
+                item.get('section', ''),            # section
+                item.get('family', ''),             # family
+                item.get('subfamily', ''),          # subfamily
+                '',                                 # feature code (empty)
+                item.get('alternate_code', ''),     # alternate code
+                '',                                 # HS Code (empty)
+                ''                                  # COO (empty)
+            ]
+    
+    @staticmethod
+    def _column_widths(headers, rows):
+        """Track the longest text value per column as rows go by (numbers don't widen columns)"""
+        max_lengths = [len(h) for h in headers]
+        for row in rows:
+            for idx, value in enumerate(row):
+                if isinstance(value, str) and len(value) > max_lengths[idx]:
+                    max_lengths[idx] = len(value)
+        return [min(length + 2, 50) for length in max_lengths]
+    
+    @staticmethod
+    def _write_sheet(wb, title, headers, rows_factory):
+        """Append a write-only sheet; widths must be set before the first row is written"""
+        ws = wb.create_sheet(title)
+        
+        for idx, width in enumerate(ExcelService._column_widths(headers, rows_factory()), start=1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+        
+        ws.append(headers)
+        for row in rows_factory():
+            ws.append(row)
+        return ws
     
     @staticmethod
     def generate_erp_excel(invoice_data, invoice_items, supplier_name, business_unit_code):
-        """Generate ERP-ready Excel file with PO Creation and IM Creation sheets"""
+        """Generate ERP-ready Excel file with PO Creation and IM Creation sheets
+        
+        Returns a write-only workbook: rows are spooled to disk as they are
+        appended instead of being held as cell objects, and it can be saved once.
+        invoice_items must be re-iterable (e.g. a list of dicts).
+        """
         try:
-            wb = openpyxl.Workbook()
+            wb = openpyxl.Workbook(write_only=True)
             
             # ===== SHEET 1: PO CREATION (existing template) =====
-            ws_po = wb.active
-            ws_po.title = "PO Creation"
-            
-            # Define headers for PO Creation
-            headers_po = [
-                'Company', 'Brand', 'MCU', 'InvoiceNumber', 'Albaran', 'BOX#',
-                'DateYYYYMMDD', 'Itemcode', 'Color|Size', 'Barcode', 'QTY',
-                'Local FOB', 'Foreign Cur', 'Foreign FOB', 'Unit Retail'
-            ]
-            
-            ws_po.append(headers_po)
-            
-            # Add data rows for PO Creation
-            for item in invoice_items:
-                row = [
-                    '06002',              # Company
-                    '54',                 # Brand
-                    business_unit_code,   # MCU
-                    invoice_data.get('invoice_number', ''), # InvoiceNumber
-                    '',                   # Albaran
-                    '',                   # BOX#
-                    invoice_data.get('invoice_date', ''),   # DateYYYYMMDD
-                    item.get('itemcode', ''),               # Itemcode
-                    item.get('color_size', ''),             # Color|Size
-                    item.get('barcode', ''),                # Barcode
-                    item.get('quantity', 0),                # QTY
-                    '',                                     # Local FOB
-                    invoice_data.get('currency', 'QAR'),    # Foreign Cur
-                    item.get('unit_cost', 0),               # Foreign FOB (The unit Cost)
-                    item.get('unit_retail', 0)              # Unit Retail
-                ]
-                ws_po.append(row)
-            
-            # Auto-adjust column widths for PO sheet
-            for column in ws_po.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws_po.column_dimensions[column_letter].width = adjusted_width
+            ExcelService._write_sheet(
+                wb, "PO Creation", ExcelService.PO_HEADERS,
+                lambda: ExcelService._po_rows(invoice_data, invoice_items, business_unit_code)
+            )
             
             # ===== SHEET 2: IM CREATION =====
-            ws_im = wb.create_sheet("IM Creation")
-            
-            # Define headers for IM Creation
-            headers_im = [
-                'Itemcode', 'Desc. Line 1', 'Desc. Line 2', 'mancode', 'brand', 
-                'season', 'supplier', 'section', 'family', 'subfamily', 
-                'feature code', 'alternate code', 'HS Code', 'COO'
-            ]
-            
-            ws_im.append(headers_im)
-            
-            # Add data rows for IM Creation
-            for item in invoice_items:
-                # Split description if it's longer than 30 characters
-                full_desc = item.get('item_description', '')
-                if len(full_desc) > 30:
-                    desc_line_1 = full_desc[:30]
-                    desc_line_2 = full_desc[30:]
-                else:
-                    desc_line_1 = full_desc
-                    desc_line_2 = ''
-                
-                row = [
-                    item.get('itemcode', ''),           # Itemcode
-                    desc_line_1,                        # Desc. Line 1
-                    desc_line_2,                        # Desc. Line 2
-                    item.get('mancode', ''),            # mancode
-                    item.get('brand_code', ''),         # brand
-                    item.get('season', ''),             # season
-                    item.get('supplier_code', ''),      # supplier
-                    item.get('section', ''),            # section
-                    item.get('family', ''),             # family
-                    item.get('subfamily', ''),          # subfamily
-                    '',                                 # feature code (empty)
-                    item.get('alternate_code', ''),     # alternate code
-                    '',                                 # HS Code (empty)
-                    ''                                  # COO (empty)
-                ]
-                ws_im.append(row)
-            
-            # Auto-adjust column widths for IM sheet
-            for column in ws_im.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws_im.column_dimensions[column_letter].width = adjusted_width
+            ExcelService._write_sheet(
+                wb, "IM Creation", ExcelService.IM_HEADERS,
+                lambda: ExcelService._im_rows(invoice_items)
+            )
             
             return wb
         except Exception as e:
@@ -0,0 +1,254 @@
+from app import db
+from app.models.invoice import Invoice, InvoiceItem
+from app.services.excel_service import ExcelService
+from app.services.master_data_cache import master_data_cache
+from sqlalchemy.orm import joinedload
+import json
+import time
+
+class InvoiceService:
+    """Service for invoice ingestion operations"""
+    
+    # Rows per executemany round trip
+    ITEM_INSERT_BATCH_SIZE = 1000
+    
+    @staticmethod
+    def create_invoice(user_id, invoice_path, supporting_path, country_id, brand_id, business_unit_id, supplier_id, decathlon_data=None):
+        """
+        Create an invoice and its line items from already saved upload files
+        
+        Items are streamed from the supporting Excel (or taken from
+        decathlon_data when the sheet can't be read or is empty), merged by row
+        with the barcodes and models entered in the UI, and inserted
+        ITEM_INSERT_BATCH_SIZE at a time. Runs inside the current session
+        transaction; the caller commits and enqueues OCR.
+        
+        Args:
+            user_id: Uploading user
+            invoice_path, supporting_path: Saved invoice and supporting files
+            country_id, brand_id, business_unit_id, supplier_id: Master data ids
+            decathlon_data: Optional JSON string of manually entered products
+        
+        Returns:
+            (invoice, item_count, timings)
+        """
+        # Get supplier details for Itemcode generation (from the master data cache)
+        supplier = master_data_cache.supplier(int(supplier_id))
+        if not supplier:
+            raise ValueError('Supplier not found')
+        
+        supplier_code = supplier['supplier_code'] if supplier['supplier_code'] else '0000'
+        
+        # Get brand details for IM fields
+        brand = master_data_cache.brand(int(brand_id))
+        brand_code = brand['brand_code'] if brand else ''
+        
+        # Create invoice record - header fields are filled in by the OCR worker
+        invoice = Invoice(
+            user_id=user_id,
+            # currency will be set based on country or extraction
+            currency='QAR', # Use currency from country later if needed
+            country_id=country_id,
+            brand_id=brand_id,
+            bu_id=business_unit_id, # Map form field to model field
+            supplier_id=supplier_id,
+            invoice_file_path=invoice_path,
+            supporting_file_path=supporting_path,
+            status='processing'
+        )
+        
+        # Derive Company
+        company = master_data_cache.company(int(country_id), int(brand_id))
+        if company:
+            invoice.company_id = company['id']
+            
+        db.session.add(invoice)
+        # Flush to get the invoice id for the bulk item insert
+        db.session.flush()
+        
+        # Parse manual data to get Barcodes
+        manual_list = []
+        if decathlon_data:
+            try:
+                manual_list = json.loads(decathlon_data)
+                print(f"[DEBUG] Manual items: {len(manual_list)}")
+            except:
+                print("[DEBUG] Failed to parse manual data")
+                pass
+        
+        timings = {'parse_ms': 0.0, 'insert_ms': 0.0}
+        
+        def insert_chunk(merged_items):
+            stage_start = time.perf_counter()
+            item_rows = InvoiceService.build_item_rows(invoice.id, merged_items, brand_code, supplier_code)
+            count = InvoiceService.bulk_insert_items(item_rows)
+            timings['insert_ms'] += (time.perf_counter() - stage_start) * 1000
+            return count
+        
+        # Stream the supporting Excel straight into the insert, one batch at a time
+        print(f"[DEBUG] ===== PROCESSING EXCEL DATA & MERGING BARCODES =====")
+        progress = {'read': 0, 'inserted': 0}
+        try:
+            InvoiceService._insert_merged_items(
+                ExcelService.iter_supporting_excel(supporting_path), manual_list, insert_chunk, progress, timings
+            )
+        except Exception:
+            # Once rows are in, the sheet can't be swapped for the manual items; the caller rolls back
+            if progress['read']:
+                raise
+        
+        # If Excel reading failed or found nothing, use decathlon_data from form
+        if not progress['read'] and manual_list:
+            print(f"[DEBUG] No Excel items, using the {len(manual_list)} manual items")
+            InvoiceService._insert_merged_items(manual_list, manual_list, insert_chunk, progress, timings)
+        
+        print(f"[DEBUG] Processed {progress['inserted']} merged items from {progress['read']} rows")
+        timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+        
+        return invoice, progress['inserted'], timings
+    
+    @staticmethod
+    def _insert_merged_items(excel_items, manual_list, insert_chunk, progress, timings):
+        """
+        Merge items with the manual barcodes and models at the same index and
+        hand them to insert_chunk ITEM_INSERT_BATCH_SIZE at a time
+        
+        Items read and inserted are counted in progress as they go, so a
+        caller can tell whether a reading error came before any row; time
+        spent reading and merging is added to timings['parse_ms'].
+        """
+        chunk = []
+        stage_start = time.perf_counter()
+        for idx, excel_item in enumerate(excel_items):
+            progress['read'] += 1
+            decathlon_sku = str(excel_item.get('decathlon_sku', '')).strip()
+            
+            if not decathlon_sku:
+                print(f"[DEBUG] Row {idx+1}: Skipping - no Decathlon SKU")
+                continue
+            
+            # Get Barcode and Model from matching Manual Item (by index)
+            manual_barcode = ''
+            manual_model = ''
+            if idx < len(manual_list):
+                 manual_barcode = str(manual_list[idx].get('barcode', '')).strip()
+                 # Remove .0 if present
+                 if manual_barcode.endswith('.0'): manual_barcode = manual_barcode[:-2]
+                 manual_model = str(manual_list[idx].get('model', '')).strip()
+                 # Remove .0 if present
+                 if manual_model.endswith('.0'): manual_model = manual_model[:-2]
+            
+            if idx < 3:
+                model_val = excel_item.get('model', '')
+                desc_val = excel_item.get('item_description', '')
+                print(f"[DEBUG] Row {idx+1}: SKU='{decathlon_sku}' + ExcelModel='{model_val}' + ManualModel='{manual_model}' + Desc='{desc_val}' + Barcode='{manual_barcode}'")
+            
+            chunk.append({
+                'sku': decathlon_sku,
+                'model': manual_model or excel_item.get('model', ''),  # Prefer manual entry, fallback to Excel
+                'item_description': excel_item.get('item_description', ''),  # From Excel
+                'barcode': manual_barcode,  # From Manual Input (UI)
+                'quantity': excel_item.get('quantity', 0),
+                'unit_cost': excel_item.get('unit_cost', 0.0),
+                'unit_retail': excel_item.get('unit_retail', 0.0),
+                'color_size': f"000|{decathlon_sku}"
+            })
+            
+            if len(chunk) >= InvoiceService.ITEM_INSERT_BATCH_SIZE:
+                timings['parse_ms'] += (time.perf_counter() - stage_start) * 1000
+                progress['inserted'] += insert_chunk(chunk)
+                chunk = []
+                stage_start = time.perf_counter()
+        
+        timings['parse_ms'] += (time.perf_counter() - stage_start) * 1000
+        if chunk:
+            progress['inserted'] += insert_chunk(chunk)
+    
+    @staticmethod
+    def build_item_rows(invoice_id, merged_items, brand_code, supplier_code):
+        """
+        Build plain column dicts for invoice line items
+        
+        Args:
+            invoice_id: Invoice the items belong to
+            merged_items: Items merged from the supporting Excel and manual input
+            brand_code: Brand code for IM fields
+            supplier_code: Supplier code for Itemcode generation
+        """
+        rows = []
+        for item in merged_items:
+            rows.append({
+                'invoice_id': invoice_id,
+                # Correct Itemcode Formula: Season(000) + SupplierCode + SKU
+                'itemcode': f"000{supplier_code}{item.get('sku')}",
+                'barcode': item.get('barcode', ''),
+                'quantity': item.get('quantity', 0),
+                'unit_cost': item.get('unit_cost', 0.0),
+                'unit_retail': item.get('unit_retail', 0.0),
+                'color_size': item.get('color_size', ''),
+                'season': '000',
+                # IM fields - set initial values
+                'item_description': item.get('item_description', ''),  # From Excel
+                'mancode': item.get('model', ''),  # User's manually entered model from Decathlon products
+                'alternate_code': item.get('sku', ''),  # Decathlon SKU is the alternate code
+                'brand_code': brand_code,
+                'supplier_code': supplier_code,
+                'section': None,
+                'family': None,
+                'subfamily': None
+            })
+        return rows
+    
+    @staticmethod
+    def bulk_insert_items(rows, batch_size=None):
+        """
+        Insert line item rows with batched executemany instead of one ORM object per row
+        
+        Runs inside the current session transaction; the caller commits.
+        
+        Returns:
+            Number of rows inserted
+        """
+        batch_size = batch_size or InvoiceService.ITEM_INSERT_BATCH_SIZE
+        insert_stmt = InvoiceItem.__table__.insert()
+        
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(insert_stmt, rows[start:start + batch_size])
+        
+        return len(rows)
+    
+    @staticmethod
+    def list_invoice_summaries(page=1, per_page=10):
+        """
+        Load one page of invoices for listing without their line items
+        
+        Item count and quantity sum are correlated subqueries and country, brand,
+        business unit and supplier are eager-loaded, so a page costs one query
+        plus the total count.
+        
+        Returns:
+            Pagination whose items are (Invoice, item_count, total_quantity) rows
+        """
+        item_count = db.session.query(
+            db.func.count(InvoiceItem.id)
+        ).filter(
+            InvoiceItem.invoice_id == Invoice.id
+        ).correlate(Invoice).scalar_subquery()
+        
+        total_quantity = db.session.query(
+            db.func.coalesce(db.func.sum(InvoiceItem.quantity), 0)
+        ).filter(
+            InvoiceItem.invoice_id == Invoice.id
+        ).correlate(Invoice).scalar_subquery()
+        
+        query = db.session.query(Invoice, item_count, total_quantity).options(
+            joinedload(Invoice.country),
+            joinedload(Invoice.brand),
+            joinedload(Invoice.business_unit),
+            joinedload(Invoice.supplier)
+        ).order_by(Invoice.id)
+        
+        # Count the invoices table directly rather than wrapping the page query
+        invoices = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+        invoices.total = db.session.query(db.func.count(Invoice.id)).scalar()
+        return invoices
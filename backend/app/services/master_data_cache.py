@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+# How often (seconds) a worker re-reads the version stamp from the database
+CHECK_INTERVAL = float(os.getenv('MASTER_DATA_CHECK_SECONDS', 30))
+
+class MasterDataCache:
+    """
+    Process-local copy of countries, brands, business units, suppliers and companies
+
+    Everything is loaded in one pass and indexed by (country_id, brand_id). The
+    snapshot is tagged with the MasterDataVersion stamp; import_master_data.py
+    bumps the stamp and every worker reloads once it notices, within CHECK_INTERVAL.
+    Entries are plain dicts (the models' to_dict output), never ORM instances.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked_at = 0.0
+
+    @staticmethod
+    def current_version():
+        from app import db
+        from app.models.master_data_version import MasterDataVersion
+
+        version = db.session.query(MasterDataVersion.version).filter_by(id=1).scalar()
+        return version or 0
+
+    @staticmethod
+    def bump_version():
+        """Mark master data as changed; runs in the caller's transaction"""
+        from app import db
+        from app.models.master_data_version import MasterDataVersion
+
+        stamp = MasterDataVersion.query.get(1)
+        if stamp:
+            stamp.version = MasterDataVersion.version + 1
+        else:
+            db.session.add(MasterDataVersion(id=1, version=1))
+        db.session.flush()
+        master_data_cache.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
+            self.checked_at = 0.0
+
+    def _load(self, version):
+        from sqlalchemy.orm import joinedload
+        from app.models.country import Country
+        from app.models.brand import Brand
+        from app.models.business_unit import BusinessUnit
+        from app.models.supplier import Supplier
+        from app.models.company import Company
+
+        snapshot = {
+            'version': version,
+            'countries': [c.to_dict() for c in Country.query.order_by(Country.id).all()],
+            'brands': [b.to_dict() for b in Brand.query.order_by(Brand.id).all()],
+            'business_units': {},
+            'suppliers': {},
+            'suppliers_by_id': {},
+            'brands_by_id': {},
+            'companies': {}
+        }
+        snapshot['brands_by_id'] = {b['id']: b for b in snapshot['brands']}
+
+        units = BusinessUnit.query.options(
+            joinedload(BusinessUnit.brand), joinedload(BusinessUnit.country)
+        ).order_by(BusinessUnit.id).all()
+        for unit in units:
+            snapshot['business_units'].setdefault((unit.country_id, unit.brand_id), []).append(unit.to_dict())
+
+        suppliers = Supplier.query.options(
+            joinedload(Supplier.brand), joinedload(Supplier.country)
+        ).order_by(Supplier.id).all()
+        for supplier in suppliers:
+            data = supplier.to_dict()
+            snapshot['suppliers'].setdefault((supplier.country_id, supplier.brand_id), []).append(data)
+            snapshot['suppliers_by_id'][supplier.id] = data
+
+        # First company per (country, brand), as Company.query.filter_by(...).first() returned
+        for company in Company.query.order_by(Company.id).all():
+            snapshot['companies'].setdefault((company.country_id, company.brand_id), {
+                'id': company.id,
+                'company_name': company.company_name,
+                'company_code': company.company_code
+            })
+
+        return snapshot
+
+    def get(self):
+        """Return the current snapshot, reloading it if the version stamp moved"""
+        now = time.monotonic()
+        snapshot = self.snapshot
+        if snapshot is not None and now - self.checked_at < CHECK_INTERVAL:
+            return snapshot
+
+        with self.lock:
+            if self.snapshot is not None and now - self.checked_at < CHECK_INTERVAL:
+                return self.snapshot
+            version = self.current_version()
+            if self.snapshot is None or self.snapshot['version'] != version:
+                self.snapshot = self._load(version)
+                print(f"[DEBUG] Loaded master data cache version {version}")
+            self.checked_at = now
+            return self.snapshot
+
+    @property
+    def version(self):
+        return self.get()['version']
+
+    def countries(self):
+        return self.get()['countries']
+
+    def brands(self):
+        return self.get()['brands']
+
+    def business_units(self, country_id, brand_id):
+        return self.get()['business_units'].get((country_id, brand_id), [])
+
+    def suppliers(self, country_id, brand_id):
+        return self.get()['suppliers'].get((country_id, brand_id), [])
+
+    def supplier(self, supplier_id):
+        return self.get()['suppliers_by_id'].get(supplier_id)
+
+    def brand(self, brand_id):
+        return self.get()['brands_by_id'].get(brand_id)
+
+    def company(self, country_id, brand_id):
+        return self.get()['companies'].get((country_id, brand_id))
+
+master_data_cache = MasterDataCache()
@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+# Import the OCR engine here, in the main thread: tesserocr installs signal
+# handlers on import, which fails when the first import happens in a worker thread
+from app.utils import ocr_engine  # noqa: F401
+from app.utils.job_registry import JobRegistry
+
+class OCRJobQueue:
+    """In-process background queue that runs invoice OCR off the request thread"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self.jobs = JobRegistry(ttl=3600, max_entries=1000)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the worker pool; size comes from OCR_WORKERS"""
+        self.app = app
+        workers = int(app.config.get('OCR_WORKERS', 2))
+        self.jobs = JobRegistry(
+            ttl=int(app.config.get('JOB_RETENTION_SECONDS', 3600)),
+            max_entries=int(app.config.get('JOB_RETENTION_MAX', 1000))
+        )
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-worker')
+        app.extensions['ocr_queue'] = self
+
+    def enqueue(self, invoice_id, file_path):
+        """Schedule OCR for an invoice and return its job record"""
+        job = {
+            'invoice_id': invoice_id,
+            'state': 'queued',
+            'error': None,
+            'queued_at': datetime.utcnow().isoformat(),
+            'started_at': None,
+            'finished_at': None
+        }
+        with self.lock:
+            self.jobs.add(invoice_id, job)
+        self.executor.submit(self._run, invoice_id, file_path)
+        return dict(job)
+
+    def resume_pending(self):
+        """
+        Re-enqueue invoices left in 'processing' by a previous run of the server
+
+        Call once from the server process, not from scripts that only need the
+        app. With several server processes each one re-runs these invoices;
+        that is harmless, as OCR only fills header fields that are still empty.
+        """
+        from app import db
+        from app.models.invoice import Invoice
+
+        with self.app.app_context():
+            try:
+                pending = db.session.query(Invoice.id, Invoice.invoice_file_path).filter(
+                    Invoice.status == 'processing'
+                ).all()
+            finally:
+                db.session.remove()
+        with self.lock:
+            pending = [(invoice_id, path) for invoice_id, path in pending if invoice_id not in self.jobs]
+        for invoice_id, file_path in pending:
+            self.enqueue(invoice_id, file_path)
+        if pending:
+            print(f"[INFO] Re-queued OCR for {len(pending)} invoice(s) left in processing")
+        return len(pending)
+
+    def get_job(self, invoice_id):
+        """Return a copy of the job record for an invoice, or None"""
+        with self.lock:
+            job = self.jobs.get(invoice_id)
+            return dict(job) if job else None
+
+    def _update(self, invoice_id, **fields):
+        with self.lock:
+            job = self.jobs.get(invoice_id)
+            if job:
+                job.update(fields)
+                if job['state'] in ('done', 'failed', 'cancelled'):
+                    self.jobs.finish(invoice_id)
+
+    def _run(self, invoice_id, file_path):
+        """Worker body: run OCR and write the header fields back to the invoice"""
+        from app import db
+        from app.models.invoice import Invoice
+        from app.models.ocr_result import InvoiceOCRResult
+        from app.services.ocr_service import OCRService
+        from app.services.supplier_template_service import SupplierTemplateService
+
+        self._update(invoice_id, state='running', started_at=datetime.utcnow().isoformat())
+
+        with self.app.app_context():
+            ocr_data = None
+            error = None
+            try:
+                supplier_id = db.session.query(Invoice.supplier_id).filter(Invoice.id == invoice_id).scalar()
+                template = SupplierTemplateService.get_template(supplier_id)
+                ocr_data = OCRService.extract_invoice_data(file_path, template=template)
+            except Exception as ocr_err:
+                # OCR failed, the user can still enter the fields manually
+                error = str(ocr_err)
+                print(f"[ERROR] OCR job for invoice {invoice_id} failed: {error}")
+
+            saved = False
+            try:
+                invoice = Invoice.query.get(invoice_id)
+                if not invoice:
+                    # Invoice was deleted while the job was queued
+                    db.session.remove()
+                    self._update(invoice_id, state='cancelled', finished_at=datetime.utcnow().isoformat())
+                    return
+
+                if ocr_data:
+                    # Don't overwrite values the user already corrected via PATCH
+                    for field in ('invoice_number', 'invoice_date', 'total_amount'):
+                        if getattr(invoice, field) is None:
+                            setattr(invoice, field, ocr_data.get(field))
+                    invoice.status = 'processed'
+                    
+                    # Keep the raw OCR output so fields can be re-extracted later
+                    ocr_result = invoice.ocr_result or InvoiceOCRResult(invoice_id=invoice.id)
+                    ocr_result.raw_text = ocr_data.get('raw_text')
+                    ocr_result.region_text = ocr_data.get('region_text')
+                    ocr_result.word_confidences = ocr_data.get('word_confidences')
+                    ocr_result.field_matches = ocr_data.get('field_matches')
+                    ocr_result.page_sources = ocr_data.get('page_sources')
+                    db.session.add(ocr_result)
+                else:
+                    invoice.status = 'error'
+                supplier_id = invoice.supplier_id
+                db.session.commit()
+                saved = True
+            except Exception as e:
+                db.session.rollback()
+                error = error or str(e)
+                print(f"[ERROR] Failed to save OCR results for invoice {invoice_id}: {str(e)}")
+
+            try:
+                # Region OCR: remember where this supplier's labels are, or count a template hit.
+                # Its own transaction, after the invoice's, so a failure here can't undo the results
+                if saved and ocr_data and supplier_id:
+                    if ocr_data.get('learned_regions'):
+                        SupplierTemplateService.save_regions(supplier_id, ocr_data['learned_regions'])
+                    elif ocr_data.get('region_source') == 'template':
+                        SupplierTemplateService.record_region_hit(supplier_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARN] Could not update the OCR template of supplier {supplier_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+        self._update(
+            invoice_id,
+            state='failed' if error else 'done',
+            error=error,
+            finished_at=datetime.utcnow().isoformat()
+        )
+
+ocr_queue = OCRJobQueue()
@@ -1,12 +1,15 @@
 import pytesseract
 from PIL import Image
 import pdf2image
+import multiprocessing
+import threading
 import os
-from app.utils.ocr_helpers import (
-    extract_invoice_number, 
-    extract_invoice_date, 
-    extract_total_amount
-)
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from app.utils import ocr_cache, image_preprocessing, region_ocr, ocr_engine, pdf_raster
+from app.utils.field_extraction import extract_fields as extract_header_fields
+from app.utils.supplier_rules import apply_field_rules
+from app.utils.ocr_helpers import match_confidence
 
 # Configure Tesseract Path for Windows if not in PATH
 if os.name == 'nt':
@@ -22,46 +25,183 @@ if os.name == 'nt':
             pytesseract.pytesseract.tesseract_cmd = path
             break
 
+PDF_DPI = pdf_raster.DEFAULT_DPI
+TESSERACT_CONFIG = '--psm 6'
+
+# Use the embedded PDF text layer when a page has at least this many alphanumeric characters
+USE_TEXT_LAYER = os.getenv('OCR_PDF_TEXT_LAYER', 'true').lower() == 'true'
+TEXT_LAYER_MIN_CHARS = int(os.getenv('OCR_TEXT_LAYER_MIN_CHARS', 20))
+
+# Layout-aware mode: OCR only the regions around the invoice number, date and total labels
+REGION_MODE = os.getenv('OCR_REGION_MODE', 'false').lower() == 'true'
+# Resolution of the pass that locates those labels
+LOCATE_DPI = int(os.getenv('OCR_LOCATE_DPI', 120))
+HEADER_FIELDS = ('invoice_number', 'invoice_date', 'total_amount')
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+def _get_page_pool():
+    """Shared process pool for per-page PDF OCR, sized to the CPU count"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            workers = int(os.getenv('OCR_PAGE_WORKERS') or 0) or os.cpu_count() or 1
+            # spawn, not fork: the pool is created from OCR worker threads
+            _page_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _page_pool
+
+def _read_text_layer(pdf_path):
+    """Return the embedded text of every PDF page, or None if the PDF can't be parsed"""
+    try:
+        reader = PdfReader(pdf_path)
+        texts = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or '')
+            except Exception:
+                # A single broken page falls back to OCR
+                texts.append('')
+        return texts
+    except Exception as e:
+        print(f"[WARN] Could not read PDF text layer: {str(e)}")
+        return None
+
+def _is_usable_text(text):
+    """Whether a page's text layer has enough real content to skip OCR"""
+    if not text:
+        return False
+    return sum(1 for c in text if c.isalnum()) >= TEXT_LAYER_MIN_CHARS
+
+def _ocr_image(image):
+    """Run tesseract once and return the page text plus word-level confidences
+    
+    Which tesseract runs (a new process, or a pooled engine) is set by OCR_ENGINE.
+    """
+    return _data_to_text(ocr_engine.image_to_data(image, config=TESSERACT_CONFIG))
+
+def _data_to_text(data):
+    """Text and word-level confidences from image_to_data output
+    
+    The text is rebuilt from tesseract's word boxes (one line per OCR line,
+    blank line between blocks) so a single pass yields both outputs.
+    """
+    lines = []
+    words = []
+    current_key = None
+    current_block = None
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        conf = int(float(data['conf'][i]))
+        words.append([word, conf])
+        
+        key = (data['page_num'][i], data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if key != current_key:
+            if current_block is not None and key[:2] != current_block:
+                lines.append('')
+            lines.append(word)
+            current_key = key
+            current_block = key[:2]
+        else:
+            lines[-1] += ' ' + word
+    
+    return {'text': '\n'.join(lines), 'words': words}
+
+def _ocr_pdf_page(pdf_path, page_num):
+    """Rasterize and OCR a single PDF page (runs in a worker process)
+    
+    Returns a dict with the page text, its word-level confidences and how
+    the page was rasterized and preprocessed.
+    """
+    # Only this page, grayscale, at a DPI that suits its text size
+    image, raster = pdf_raster.rasterize_page(pdf_path, page_num)
+    print(f"[DEBUG] PDF Page {page_num} rasterized at {raster['dpi']} DPI (text {raster['line_height_pt']}pt, capped {raster['capped']})")
+    
+    image, report = image_preprocessing.preprocess(image)
+    print(f"[DEBUG] PDF Page {page_num} preprocessing ({report['mode']}): {report['stages']}, skipped {report['skipped']}")
+    
+    # Extract text - PSM 6 works well for most invoices
+    result = _ocr_image(image)
+    result['preprocess'] = report
+    result['raster'] = raster
+    return result
+
+def _load_page(file_path, page_num, dpi=None):
+    """A PDF page rasterized at dpi (None: chosen from its text size), or an image file scaled as if scanned at PDF_DPI"""
+    if file_path.lower().endswith('.pdf'):
+        return pdf_raster.rasterize_page(file_path, page_num, dpi)[0]
+    image = Image.open(file_path)
+    if dpi and dpi < PDF_DPI:
+        scale = dpi / PDF_DPI
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.Resampling.BILINEAR)
+    return image
+
+def _ocr_page_regions(file_path, page_num, regions=None, overview=None):
+    """OCR only the label regions of one page (runs in a worker process)
+    
+    A LOCATE_DPI pass reads the whole page, for the stored text, and finds
+    the invoice number, date and total labels; overview is that pass from an
+    earlier call, so it isn't run twice. regions (from a template) replace
+    the located ones and are cut from the full-resolution page.
+    Returns a dict with the text and words of the regions, the regions, the
+    merged boxes with their text, the share of the page that was OCR'd and
+    the overview (page text and located regions).
+    """
+    upscale_small = not file_path.lower().endswith('.pdf')
+    if overview is None:
+        image, _ = image_preprocessing.preprocess(_load_page(file_path, page_num, LOCATE_DPI))
+        data = ocr_engine.image_to_data(image, config=TESSERACT_CONFIG)
+        overview = {'text': _data_to_text(data)['text'], 'regions': region_ocr.find_label_regions(data, *image.size)}
+    located = regions is None
+    if located:
+        regions = overview['regions']
+    
+    result = {
+        'text': '', 'words': [], 'regions': regions, 'boxes': [], 'located': located, 'coverage': 0.0,
+        'overview': overview
+    }
+    if not regions:
+        return result
+    
+    # Preprocess the whole page so deskewing matches the pass that found the regions
+    image, _ = image_preprocessing.preprocess(_load_page(file_path, page_num), upscale_small=upscale_small)
+    texts = []
+    for box in region_ocr.merge_boxes(regions):
+        box_result = _ocr_image(region_ocr.crop_box(image, box))
+        texts.append(box_result['text'])
+        result['words'].extend(box_result['words'])
+        result['boxes'].append({'box': box, 'text': box_result['text']})
+    result['text'] = '\n\n'.join(texts)
+    result['coverage'] = region_ocr.covered_fraction([b['box'] for b in result['boxes']])
+    return result
+
 class OCRService:
     
     @staticmethod
-    def extract_text_from_image(image_path):
-        """Extract text from image using Tesseract OCR"""
+    def extract_text_from_image(image_path, with_words=False):
+        """Extract text from image using Tesseract OCR
+        
+        With with_words=True returns (text, words, page_sources) where words
+        holds the [word, confidence] pairs reported by tesseract and
+        page_sources carries the preprocessing report.
+        """
         try:
-            from PIL import ImageEnhance, ImageFilter
-            
             print(f"[DEBUG] Processing image OCR: {image_path}")
             image = Image.open(image_path)
             
-            # Enhance image for better OCR results
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Upscale image if it's too small (improves OCR accuracy)
-            width, height = image.size
-            if width < 800 or height < 600:
-                scale_factor = max(800 / width, 600 / height)
-                new_size = (int(width * scale_factor), int(height * scale_factor))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"[DEBUG] Image upscaled to {new_size}")
-            
-            # Apply noise reduction filter
-            image = image.filter(ImageFilter.MedianFilter(size=3))
-            
-            # Enhance contrast
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.8)
-            
-            # Enhance brightness
-            enhancer = ImageEnhance.Brightness(image)
-            image = enhancer.enhance(1.05)
-            
-            # Enhance sharpness
-            enhancer = ImageEnhance.Sharpness(image)
-            image = enhancer.enhance(2.0)
+            # Upscales small images, then cleans up only what the image needs
+            image, report = image_preprocessing.preprocess(image, upscale_small=True)
+            print(f"[DEBUG] Image preprocessing ({report['mode']}): {report['stages']}, skipped {report['skipped']}")
             
             # Extract text - PSM 6 is good for uniform text blocks
-            text = pytesseract.image_to_string(image, config='--psm 6')
+            result = _ocr_image(image)
+            text = result['text']
             
             print(f"[DEBUG] Extracted text length: {len(text)}")
             if len(text) < 100:
@@ -69,74 +209,301 @@ class OCRService:
             else:
                 print(f"[DEBUG] Text preview (first 100): {text[:100]}...")
                 
+            if with_words:
+                return text, result['words'], [{'page': 1, 'source': 'ocr', 'preprocess': report}]
             return text
         except Exception as e:
             print(f"[ERROR] OCR Service Error: {str(e)}")
             raise Exception(f"OCR Error: {str(e)}")
     
     @staticmethod
-    def extract_text_from_pdf(pdf_path):
-        """Extract text from PDF by converting to images with enhanced quality"""
+    def extract_text_from_pdf(pdf_path, parallel=None, with_words=False):
+        """Extract text from PDF, using the embedded text layer where it is usable
+        
+        Pages without a usable text layer are rasterized one at a time,
+        preprocessed and OCR'd. In parallel mode they are OCR'd
+        concurrently in a process pool; page order is kept in the output.
+        With with_words=True returns (text, words, page_sources) where
+        page_sources records whether each page came from the text layer or OCR,
+        plus the preprocessing report for OCR'd pages.
+        """
         try:
-            from PIL import ImageEnhance, ImageFilter
+            text_layer = _read_text_layer(pdf_path) if USE_TEXT_LAYER else None
+            if text_layer is not None:
+                page_count = len(text_layer)
+            else:
+                page_count = pdf2image.pdfinfo_from_path(pdf_path)['Pages']
+            pages = list(range(1, page_count + 1))
             
-            # Convert PDF pages to images with higher DPI for better OCR
-            images = pdf2image.convert_from_path(pdf_path, dpi=300)
-            extracted_text = ""
+            page_results = {}
+            ocr_pages = []
+            for page_num in pages:
+                layer_text = text_layer[page_num - 1] if text_layer else None
+                if _is_usable_text(layer_text):
+                    # Born-digital page: the embedded text is exact, no OCR needed
+                    page_results[page_num] = {
+                        'text': layer_text,
+                        'words': [[word, 100] for word in layer_text.split()],
+                        'source': 'text_layer'
+                    }
+                else:
+                    ocr_pages.append(page_num)
             
-            for page_num, image in enumerate(images):
-                # Enhance image quality before OCR
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Apply filters
-                image = image.filter(ImageFilter.MedianFilter(size=3))
-                
-                # Enhance contrast
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.8)
-                
-                # Enhance brightness
-                enhancer = ImageEnhance.Brightness(image)
-                image = enhancer.enhance(1.05)
-                
-                # Enhance sharpness
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(2.0)
-                
-                # Extract text - PSM 6 works well for most invoices
-                text = pytesseract.image_to_string(image, config='--psm 6')
+            if parallel is None:
+                parallel = os.getenv('OCR_PARALLEL_PAGES', 'true').lower() == 'true'
+            
+            if parallel and len(ocr_pages) > 1:
+                # map() yields results in submission order, so pages stay in sequence
+                results = _get_page_pool().map(_ocr_pdf_page, [pdf_path] * len(ocr_pages), ocr_pages)
+            else:
+                results = (_ocr_pdf_page(pdf_path, page_num) for page_num in ocr_pages)
+            
+            for page_num, result in zip(ocr_pages, results):
+                result['source'] = 'ocr'
+                page_results[page_num] = result
+            
+            extracted_text = ""
+            words = []
+            page_sources = []
+            for page_num in pages:
+                result = page_results[page_num]
+                text = result['text']
                 extracted_text += text + "\n"
-                print(f"[DEBUG] PDF Page {page_num + 1}: Extracted {len(text)} characters")
+                words.extend(result['words'])
+                source = {'page': page_num, 'source': result['source']}
+                if 'preprocess' in result:
+                    source['preprocess'] = result['preprocess']
+                if 'raster' in result:
+                    source['raster'] = result['raster']
+                page_sources.append(source)
+                print(f"[DEBUG] PDF Page {page_num} ({result['source']}): Extracted {len(text)} characters")
             
+            if with_words:
+                return extracted_text, words, page_sources
             return extracted_text
         except Exception as e:
             raise Exception(f"PDF OCR Error: {str(e)}")
     
     @staticmethod
-    def extract_invoice_data(file_path):
-        """Main method to extract invoice data from file"""
+    def _template_pages(template_regions, ocr_pages, page_count):
+        """Map template regions ('first'/'last' page) onto this document's OCR pages"""
+        by_page = {}
+        for region in template_regions or []:
+            page_num = 1 if region.get('page') == 'first' else page_count
+            if page_num in ocr_pages:
+                by_page.setdefault(page_num, []).append({'field': region['field'], 'box': region['box']})
+        return by_page
+    
+    @staticmethod
+    def _learn_regions(page_results, field_matches, page_count):
+        """Template regions: the boxes whose text holds each field's match, on the first or last page"""
+        learned = []
+        for field, match in field_matches.items():
+            for page_num, result in sorted(page_results.items()):
+                if page_num not in (1, page_count):
+                    continue
+                box = next((b['box'] for b in result.get('boxes', []) if match['match'] in b['text']), None)
+                if box:
+                    learned.append({'field': field, 'page': 'first' if page_num == 1 else 'last', 'box': box})
+                    break
+        return learned
+    
+    @staticmethod
+    def extract_by_regions(file_path, template_regions=None, parallel=None, rules=None):
+        """Read the header fields from OCR of the label regions only
+        
+        Every OCR page gets a LOCATE_DPI pass, whose text is kept as the
+        document text. The fields are read from the supplier's template
+        regions first, then from the labels located on every OCR page.
+        Pages with a usable PDF text layer are read as usual.
+        
+        Returns:
+            Invoice data dict as from extract_fields, with raw_text the whole
+            document and region_text the regions the fields were read from,
+            plus page_sources, region_source ('template' or 'located') and
+            learned_regions when the labels were located; None when either
+            attempt leaves a header field unread, so the caller falls back to
+            full-page OCR
+        """
+        is_pdf = file_path.lower().endswith('.pdf')
+        text_layer = _read_text_layer(file_path) if is_pdf and USE_TEXT_LAYER else None
+        if not is_pdf:
+            page_count = 1
+        elif text_layer is not None:
+            page_count = len(text_layer)
+        else:
+            page_count = pdf2image.pdfinfo_from_path(file_path)['Pages']
+        
+        layer_pages = {}
+        ocr_pages = []
+        for page_num in range(1, page_count + 1):
+            layer_text = text_layer[page_num - 1] if text_layer else None
+            if _is_usable_text(layer_text):
+                layer_pages[page_num] = layer_text
+            else:
+                ocr_pages.append(page_num)
+        
+        if parallel is None:
+            parallel = os.getenv('OCR_PARALLEL_PAGES', 'true').lower() == 'true'
+        
+        attempts = []
+        by_page = OCRService._template_pages(template_regions, ocr_pages, page_count)
+        if by_page:
+            # Pages without template regions only get the overview pass
+            attempts.append(('template', {page_num: by_page.get(page_num, []) for page_num in ocr_pages}))
+        attempts.append(('located', {page_num: None for page_num in ocr_pages}))
+        
+        # Overview passes of the template attempt, reused by the located one
+        overviews = {}
+        for region_source, pages in attempts:
+            page_nums = sorted(pages)
+            regions = [pages[page_num] for page_num in page_nums]
+            known = [overviews.get(page_num) for page_num in page_nums]
+            if parallel and len(page_nums) > 1:
+                results = _get_page_pool().map(_ocr_page_regions, [file_path] * len(page_nums), page_nums, regions, known)
+            else:
+                results = map(_ocr_page_regions, [file_path] * len(page_nums), page_nums, regions, known)
+            page_results = dict(zip(page_nums, results))
+            overviews.update((page_num, result['overview']) for page_num, result in page_results.items())
+            
+            text = ''
+            full_text = ''
+            words = []
+            page_sources = []
+            for page_num in range(1, page_count + 1):
+                if page_num in layer_pages:
+                    text += layer_pages[page_num] + "\n"
+                    full_text += layer_pages[page_num] + "\n"
+                    words.extend([word, 100] for word in layer_pages[page_num].split())
+                    page_sources.append({'page': page_num, 'source': 'text_layer'})
+                elif page_num in page_results:
+                    result = page_results[page_num]
+                    text += result['text'] + "\n"
+                    full_text += result['overview']['text'] + "\n"
+                    words.extend(result['words'])
+                    page_sources.append({
+                        'page': page_num,
+                        'source': 'ocr_regions',
+                        'regions': len(result['boxes']),
+                        'coverage': result['coverage']
+                    })
+            print(f"[DEBUG] Region OCR ({region_source}): {page_sources}")
+            
+            invoice_data = OCRService.extract_fields(text, words, rules)
+            if all(invoice_data.get(field) is not None for field in HEADER_FIELDS):
+                invoice_data['raw_text'] = full_text
+                invoice_data['region_text'] = text
+                invoice_data['page_sources'] = page_sources
+                invoice_data['region_source'] = region_source
+                if region_source == 'located':
+                    invoice_data['learned_regions'] = OCRService._learn_regions(
+                        page_results, invoice_data['field_matches'], page_count
+                    )
+                return invoice_data
+            missing = [field for field in HEADER_FIELDS if invoice_data.get(field) is None]
+            print(f"[DEBUG] Region OCR ({region_source}) missed {missing}")
+        
+        return None
+    
+    @staticmethod
+    def cache_config(file_ext):
+        """Config string that, together with the file bytes, identifies an OCR result"""
+        raster = pdf_raster.config() if file_ext == '.pdf' else 'dpi=native'
+        config = f"{file_ext}|{raster}|{image_preprocessing.version()}|{TESSERACT_CONFIG}|words"
+        if file_ext == '.pdf' and USE_TEXT_LAYER:
+            config += f"|text_layer={TEXT_LAYER_MIN_CHARS}"
+        if REGION_MODE:
+            config += f"|regions={LOCATE_DPI}+overview"
+        if ocr_engine.name() != 'pytesseract':
+            config += f"|engine={ocr_engine.name()}"
+        return config
+    
+    @staticmethod
+    def extract_fields(text, words=None, rules=None):
+        """Extract header fields from OCR text, recording how each one was found
+        
+        Used both after OCR and to re-extract from stored text without re-running OCR.
+        rules are the supplier's learned field rules; fields they read skip the
+        generic pattern cascade.
+        """
+        invoice_data = {'raw_text': text, 'word_confidences': words or [], 'field_matches': {}}
+        
+        found = apply_field_rules(text, rules) if rules else {}
+        remaining = [field for field in HEADER_FIELDS if field not in found]
+        if remaining:
+            generic = extract_header_fields(text, return_match=True, fields=remaining)
+            found.update({field: generic[field] for field in remaining})
+        
+        for field, match in found.items():
+            invoice_data[field] = match['value'] if match else None
+            if match:
+                invoice_data['field_matches'][field] = {
+                    'pattern': match['pattern'],
+                    'match': match['match'],
+                    'confidence': match_confidence(match['match'], words)
+                }
+        
+        return invoice_data
+    
+    @staticmethod
+    def extract_invoice_data(file_path, template=None):
+        """Main method to extract invoice data from file
+        
+        template is the supplier's SupplierTemplate dict, if any. Its field
+        rules are tried before the generic patterns and, in region mode, its
+        learned regions before locating the labels.
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
         
         try:
-            if file_ext == '.pdf':
-                text = OCRService.extract_text_from_pdf(file_path)
-            elif file_ext in ['.png', '.jpg', '.jpeg']:
-                text = OCRService.extract_text_from_image(file_path)
-            else:
+            if file_ext not in ['.pdf', '.png', '.jpg', '.jpeg']:
                 raise ValueError(f"Unsupported file format: {file_ext}")
             
+            # Identical files with the same OCR config reuse the cached text
+            key = ocr_cache.cache_key(file_path, OCRService.cache_config(file_ext))
+            cached = ocr_cache.get_cached(key)
+            region_data = None
+            region_text = None
+            if not cached and REGION_MODE:
+                # Falls back to full-page OCR below when a header field is missing
+                region_data = OCRService.extract_by_regions(
+                    file_path, (template or {}).get('regions'), rules=(template or {}).get('field_rules')
+                )
+            
+            if cached:
+                print(f"[DEBUG] OCR cache hit: {key[:12]}")
+                text = cached['raw_text']
+                region_text = cached.get('region_text')
+                words = cached.get('word_confidences', [])
+                page_sources = cached.get('page_sources', [])
+            elif region_data:
+                text = region_data['raw_text']
+                region_text = region_data['region_text']
+                words = region_data['word_confidences']
+                page_sources = region_data['page_sources']
+            elif file_ext == '.pdf':
+                text, words, page_sources = OCRService.extract_text_from_pdf(file_path, with_words=True)
+            else:
+                text, words, page_sources = OCRService.extract_text_from_image(file_path, with_words=True)
+            
             print(f"[DEBUG] ========== RAW OCR TEXT ({file_ext}) ==========")
             print(text)
             print(f"[DEBUG] ========== END RAW OCR TEXT ==========")
             
-            # Extract structured data
-            invoice_data = {
-                'invoice_number': extract_invoice_number(text),
-                'invoice_date': extract_invoice_date(text),
-                'total_amount': extract_total_amount(text),
-                'raw_text': text
-            }
+            # Extract structured data (always re-run so regex and template changes apply to cached text);
+            # in region mode from the full-resolution regions, the whole text is kept alongside
+            invoice_data = OCRService.extract_fields(region_text or text, words, (template or {}).get('field_rules'))
+            invoice_data['raw_text'] = text
+            if region_text:
+                invoice_data['region_text'] = region_text
+            invoice_data['page_sources'] = page_sources
+            if region_data:
+                invoice_data['region_source'] = region_data['region_source']
+                if region_data.get('learned_regions'):
+                    invoice_data['learned_regions'] = region_data['learned_regions']
+            
+            if not cached:
+                ocr_cache.store(key, invoice_data)
             
             print(f"[DEBUG] Extracted Data:")
             print(f"  - Invoice Number: {invoice_data['invoice_number']}")
@@ -0,0 +1,109 @@
+from app import db
+from app.models.supplier_template import SupplierTemplate
+from app.utils.ttl_cache import TTLCache
+from app.utils.supplier_rules import candidate_rules
+from sqlalchemy.exc import IntegrityError
+import os
+
+# Templates change rarely; every worker re-reads a supplier's template at most this often
+template_cache = TTLCache(ttl=int(os.getenv('SUPPLIER_TEMPLATE_CACHE_TTL', 300)), max_entries=1024)
+# Corrections that must agree on a field's rule before it replaces the generic patterns
+RULE_AGREEMENT = int(os.getenv('SUPPLIER_RULE_AGREEMENT', 2))
+
+class SupplierTemplateService:
+    """Load and store per-supplier OCR templates"""
+
+    @staticmethod
+    def get_template(supplier_id):
+        """Template dict for a supplier (see SupplierTemplate.to_dict), or None"""
+        if not supplier_id:
+            return None
+
+        def load():
+            template = SupplierTemplate.query.get(supplier_id)
+            # Cache misses too, as an empty dict, so unknown suppliers don't hit the database
+            return template.to_dict() if template else {}
+
+        template, _ = template_cache.get_or_compute(supplier_id, load)
+        return template or None
+
+    @staticmethod
+    def _get_or_create(supplier_id):
+        template = SupplierTemplate.query.get(supplier_id)
+        if template:
+            return template
+        try:
+            # Savepoint: when another worker creates the template first, only this insert is undone
+            with db.session.begin_nested():
+                db.session.add(SupplierTemplate(supplier_id=supplier_id, region_hits=0, corrections=0))
+        except IntegrityError:
+            print(f"[DEBUG] Template of supplier {supplier_id} created concurrently, updating it")
+        return SupplierTemplate.query.get(supplier_id)
+
+    @staticmethod
+    def save_regions(supplier_id, regions):
+        """Replace the learned OCR regions of a supplier and commit"""
+        template = SupplierTemplateService._get_or_create(supplier_id)
+        template.regions = regions
+        db.session.commit()
+        # Cached only once committed, so no worker reads regions that were rolled back
+        template_cache.set(supplier_id, template.to_dict())
+
+    @staticmethod
+    def record_region_hit(supplier_id):
+        """Count an invoice read from the template regions alone and commit"""
+        db.session.query(SupplierTemplate).filter_by(supplier_id=supplier_id).update(
+            {SupplierTemplate.region_hits: SupplierTemplate.region_hits + 1},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    @staticmethod
+    def learn_from_correction(supplier_id, raw_text, corrected):
+        """
+        Update a supplier's field rules from header fields a user corrected
+
+        Each correction yields candidate rules per field. A candidate becomes
+        the field's rule (replacing any earlier one) once RULE_AGREEMENT
+        corrections in a row agree on it and no other candidate is left;
+        until then the field keeps its previous rule or the generic patterns.
+        Commits the caller's transaction. Fields whose corrected value can't
+        be found in the OCR text are left as they were.
+
+        Args:
+            supplier_id: Supplier of the corrected invoice
+            raw_text: Stored OCR text the invoice's fields were read from (its region text in region mode)
+            corrected: {field: corrected value}
+
+        Returns:
+            Names of the fields whose rule was learned
+        """
+        found = {}
+        for field, value in corrected.items():
+            candidates = candidate_rules(field, value, raw_text)
+            if candidates:
+                found[field] = candidates
+        if not found:
+            return []
+
+        template = SupplierTemplateService._get_or_create(supplier_id)
+        rules = dict(template.field_rules or {})
+        pending = dict(template.rule_candidates or {})
+        learned = []
+        for field, candidates in found.items():
+            previous = pending.get(field) or {'rules': [], 'count': 0}
+            agreed = [rule for rule in candidates if rule in previous['rules']]
+            entry = {'rules': agreed, 'count': previous['count'] + 1} if agreed else {'rules': candidates, 'count': 1}
+            if len(entry['rules']) == 1 and entry['count'] >= RULE_AGREEMENT:
+                rules[field] = entry['rules'][0]
+                pending.pop(field, None)
+                learned.append(field)
+            else:
+                pending[field] = entry
+        # Reassign rather than mutate so the JSON columns are marked dirty
+        template.field_rules = rules
+        template.rule_candidates = pending
+        template.corrections = (template.corrections or 0) + 1
+        db.session.commit()
+        template_cache.set(supplier_id, template.to_dict())
+        return learned
@@ -1,11 +1,23 @@
 from app import db
-from app.models.lpo_tracker import LPOTracker
+from app.models.lpo_tracker import LPOTracker, LPOSerialCounter
 from app.models.business_unit import BusinessUnit
+from sqlalchemy.orm import joinedload
 from datetime import datetime
+import base64
+import json
 
 class TrackerService:
     """Service for managing LPO Tracker operations"""
     
+    @staticmethod
+    def _seed_serial_counter(prefix, year):
+        """Highest number already issued for a prefix/year, read once when its counter row is created"""
+        serials = db.session.query(LPOTracker.serial_number).filter(
+            LPOTracker.serial_number.startswith(f"{prefix}-{year}-", autoescape=True)
+        ).all()
+        numbers = [int(s.rsplit('-', 1)[-1]) for (s,) in serials if s.rsplit('-', 1)[-1].isdigit()]
+        return max(numbers, default=0)
+    
     @staticmethod
     def generate_serial_number(bu_id):
         """
@@ -13,6 +25,12 @@ class TrackerService:
         BU_CODE: Business Unit abbreviation (first 3 letters of bu_code)
         YY: Last 2 digits of current year
         XXXX: Incremental number padded to 4 digits
+        
+        The number comes from the lpo_serial_counters row for (BU_CODE, YY),
+        incremented in a single UPDATE ... RETURNING. The row stays locked until
+        the caller's transaction ends, so concurrent adds queue on it instead of
+        issuing duplicates, and a rolled back add releases its number. Must run
+        in the same transaction that inserts the tracker.
         """
         try:
             bu = BusinessUnit.query.get(bu_id)
@@ -25,16 +43,31 @@ class TrackerService:
             # Get last 2 digits of current year
             current_year = datetime.now().strftime('%y')
             
-            # Count existing trackers for this BU this year
-            # Find all trackers for this BU with serial numbers starting with bu_code-current_year
-            prefix = f"{bu_code}-{current_year}-"
-            existing_count = db.session.query(LPOTracker).filter(
-                LPOTracker.bu_id == bu_id,
-                LPOTracker.serial_number.like(f"{prefix}%")
-            ).count()
+            counters = LPOSerialCounter.__table__
+            next_number = db.session.execute(
+                counters.update()
+                .where(counters.c.prefix == bu_code, counters.c.year == current_year)
+                .values(last_value=counters.c.last_value + 1)
+                .returning(counters.c.last_value)
+            ).scalar()
+            
+            if next_number is None:
+                # First serial for this prefix and year: create the counter, continuing
+                # from any serials issued before counters existed. ON CONFLICT covers
+                # another request creating the row first.
+                if db.engine.dialect.name == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                seed = TrackerService._seed_serial_counter(bu_code, current_year)
+                stmt = insert(counters).values(prefix=bu_code, year=current_year, last_value=seed + 1)
+                next_number = db.session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[counters.c.prefix, counters.c.year],
+                        set_={'last_value': counters.c.last_value + 1}
+                    ).returning(counters.c.last_value)
+                ).scalar()
             
-            # Increment counter
-            next_number = existing_count + 1
             serial_number = f"{bu_code}-{current_year}-{str(next_number).zfill(4)}"
             
             return serial_number
@@ -81,7 +114,7 @@ class TrackerService:
             if not bu_id:
                 raise ValueError("Invoice must have a Business Unit assigned")
             
-            # Generate serial number
+            # Generate serial number (locks the BU/year counter until commit)
             serial_number = TrackerService.generate_serial_number(bu_id)
             
             # Create tracker record
@@ -108,6 +141,140 @@ class TrackerService:
             print(f"[ERROR] Failed to add to tracker: {str(e)}")
             raise
     
+    # Sort keys accepted by get_trackers_page; each is backed by an index ending in the id tiebreaker
+    SORT_KEYS = ('serial_number', 'created_at')
+    
+    MAX_PAGE_SIZE = 500
+    # Page size when the caller gives none, so a listing never loads the whole table
+    DEFAULT_PAGE_SIZE = 100
+    
+    @staticmethod
+    def encode_cursor(sort, tracker):
+        """Opaque cursor pointing just after the given tracker"""
+        value = getattr(tracker, sort)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps([value, tracker.id]).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(sort, cursor):
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if sort == 'created_at':
+                value = datetime.fromisoformat(value)
+            return value, int(last_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+    
+    @staticmethod
+    def get_trackers_page(filters=None, sort='serial_number', direction='asc', limit=None, cursor=None):
+        """
+        Load a page of trackers for listing in a single query
+        
+        Invoice, country and business unit (with its brand and country) are
+        eager-loaded and each invoice's total item quantity is summed in SQL,
+        so serializing the result issues no further queries. Pagination is
+        keyset-based on (sort column, id), so later pages cost the same as the first.
+        
+        Args:
+            filters: Optional dict with country_id, bu_id, shipment_status (list),
+                date_from, date_to (date_of_request range), ticket_no and
+                shipment_no (prefixes)
+            sort: One of SORT_KEYS
+            direction: 'asc' or 'desc'
+            limit: Page size (DEFAULT_PAGE_SIZE when None, at most MAX_PAGE_SIZE)
+            cursor: Cursor returned with the previous page
+        
+        Returns:
+            (list of (LPOTracker, total_quantity) tuples, next cursor or None)
+        """
+        try:
+            from app.models.invoice import InvoiceItem
+            
+            if sort not in TrackerService.SORT_KEYS:
+                raise ValueError(f"Invalid sort key: {sort}")
+            if direction not in ('asc', 'desc'):
+                raise ValueError(f"Invalid sort direction: {direction}")
+            if limit is None:
+                limit = TrackerService.DEFAULT_PAGE_SIZE
+            limit = max(1, min(int(limit), TrackerService.MAX_PAGE_SIZE))
+            filters = filters or {}
+            
+            # Correlated so only the returned page's invoices are summed
+            total_quantity = db.session.query(
+                db.func.coalesce(db.func.sum(InvoiceItem.quantity), 0)
+            ).filter(
+                InvoiceItem.invoice_id == LPOTracker.invoice_id
+            ).correlate(LPOTracker).scalar_subquery()
+            
+            query = db.session.query(LPOTracker, total_quantity).options(
+                joinedload(LPOTracker.invoice),
+                joinedload(LPOTracker.country),
+                joinedload(LPOTracker.business_unit).joinedload(BusinessUnit.brand),
+                joinedload(LPOTracker.business_unit).joinedload(BusinessUnit.country)
+            )
+            
+            if filters.get('country_id'):
+                query = query.filter(LPOTracker.country_id == filters['country_id'])
+            if filters.get('bu_id'):
+                query = query.filter(LPOTracker.bu_id == filters['bu_id'])
+            if filters.get('shipment_status'):
+                query = query.filter(LPOTracker.shipment_status.in_(filters['shipment_status']))
+            if filters.get('date_from'):
+                query = query.filter(LPOTracker.date_of_request >= filters['date_from'])
+            if filters.get('date_to'):
+                query = query.filter(LPOTracker.date_of_request <= filters['date_to'])
+            if filters.get('ticket_no'):
+                query = query.filter(LPOTracker.ticket_no.startswith(filters['ticket_no'], autoescape=True))
+            if filters.get('shipment_no'):
+                query = query.filter(LPOTracker.shipment_no.startswith(filters['shipment_no'], autoescape=True))
+            
+            sort_column = getattr(LPOTracker, sort)
+            if cursor:
+                value, last_id = TrackerService.decode_cursor(sort, cursor)
+                if direction == 'asc':
+                    query = query.filter(db.or_(
+                        sort_column > value,
+                        db.and_(sort_column == value, LPOTracker.id > last_id)
+                    ))
+                else:
+                    query = query.filter(db.or_(
+                        sort_column < value,
+                        db.and_(sort_column == value, LPOTracker.id < last_id)
+                    ))
+            
+            if direction == 'asc':
+                query = query.order_by(sort_column.asc(), LPOTracker.id.asc())
+            else:
+                query = query.order_by(sort_column.desc(), LPOTracker.id.desc())
+            
+            # Fetch one extra row to know whether another page exists
+            rows = query.limit(limit + 1).all()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = TrackerService.encode_cursor(sort, rows[-1][0])
+            return rows, next_cursor
+        except Exception as e:
+            print(f"[ERROR] Failed to get trackers page: {str(e)}")
+            raise
+    
+    @staticmethod
+    def get_trackers_with_quantities(country_id=None, bu_id=None):
+        """
+        Load all trackers, MAX_PAGE_SIZE rows per query
+        
+        Returns:
+            List of (LPOTracker, total_quantity) tuples ordered by serial number
+        """
+        filters = {'country_id': country_id, 'bu_id': bu_id}
+        rows, cursor = TrackerService.get_trackers_page(filters, limit=TrackerService.MAX_PAGE_SIZE)
+        while cursor:
+            page, cursor = TrackerService.get_trackers_page(filters, limit=TrackerService.MAX_PAGE_SIZE, cursor=cursor)
+            rows.extend(page)
+        return rows
+    
     @staticmethod
     def get_trackers_by_country_and_bu(country_id, bu_id=None):
         """
@@ -129,16 +296,20 @@ class TrackerService:
             raise
     
     @staticmethod
-    def get_all_countries_with_trackers():
-        """Get all countries that have trackers, organized by country"""
+    def get_all_countries_with_trackers(rows=None):
+        """
+        Get all countries that have trackers, organized by country
+        
+        Groups the given (LPOTracker, total_quantity) rows, or every tracker if
+        none are given. Trackers are stored as (LPOTracker, total_quantity) tuples.
+        """
         try:
-            from app.models.country import Country
-            
-            # Get all unique countries from trackers
-            trackers = db.session.query(LPOTracker).all()
             countries_dict = {}
             
-            for tracker in trackers:
+            if rows is None:
+                rows = TrackerService.get_trackers_with_quantities()
+            
+            for tracker, total_quantity in rows:
                 country = tracker.country
                 if country:
                     if country.id not in countries_dict:
@@ -155,7 +326,7 @@ class TrackerService:
                                 'bu': bu,
                                 'trackers': []
                             }
-                        countries_dict[country.id]['bus'][bu.id]['trackers'].append(tracker)
+                        countries_dict[country.id]['bus'][bu.id]['trackers'].append((tracker, total_quantity))
             
             return countries_dict
         except Exception as e:
@@ -0,0 +1,60 @@
+import glob
+import os
+import threading
+
+# On-disk cache of generated ERP workbooks, one file per (invoice id, version stamp)
+CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', './export_cache')
+
+def version_stamp(invoice):
+    """
+    Stamp that changes whenever the invoice, its line items or the master data
+    the workbook reads (supplier name, business unit code) are modified
+    """
+    from app.services.master_data_cache import MasterDataCache
+
+    changed_at = invoice.updated_at or invoice.created_at
+    invoice_stamp = changed_at.strftime('%Y%m%d%H%M%S%f') if changed_at else '0'
+    # Read from the database, not the per-process snapshot, so every worker agrees at once
+    return f"{invoice_stamp}m{MasterDataCache.current_version()}"
+
+def etag_for(invoice):
+    return f"invoice-{invoice.id}-{version_stamp(invoice)}"
+
+def cached_path(invoice):
+    return os.path.join(CACHE_DIR, f"invoice_{invoice.id}_{version_stamp(invoice)}.xlsx")
+
+def get_or_create(invoice, generate):
+    """
+    Return the path of the cached workbook for the invoice's current version
+    
+    Args:
+        invoice: Invoice instance
+        generate: Callable taking an output path and writing the workbook to it
+    """
+    path = cached_path(invoice)
+    if os.path.exists(path):
+        return path
+    
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        generate(tmp_path)
+        # Atomic rename so concurrent downloads never see a partial file
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    # Older versions of this invoice's workbook can never be served again
+    invalidate(invoice.id, keep=path)
+    return path
+
+def invalidate(invoice_id, keep=None):
+    """Remove cached workbooks for an invoice (except keep)"""
+    for path in glob.glob(os.path.join(CACHE_DIR, f"invoice_{invoice_id}_*.xlsx")):
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
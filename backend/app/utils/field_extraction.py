@@ -0,0 +1,174 @@
+import re
+from datetime import datetime, timedelta
+from app.utils.ocr_helpers import (
+    INVOICE_NUMBER_PATTERNS,
+    INVOICE_DATE_PATTERNS,
+    TOTAL_AMOUNT_PATTERNS
+)
+
+# Single-pass header field extraction.
+#
+# Produces the same results as extract_invoice_number / extract_invoice_date /
+# extract_total_amount in ocr_helpers, but compiles every pattern once at import,
+# splits the text into lines once, parses date candidates without the strptime
+# trial loop and stops scanning for the total at the first line that yields one.
+
+_INVOICE_NUMBER_REGEXES = [
+    (p, re.compile(p, re.MULTILINE | re.IGNORECASE)) for p in INVOICE_NUMBER_PATTERNS
+]
+_INVOICE_DATE_REGEXES = [
+    (p, re.compile(p, re.IGNORECASE)) for p in INVOICE_DATE_PATTERNS
+]
+# No flags here: the currency pattern relies on being case-sensitive
+_TOTAL_AMOUNT_REGEXES = [(p, re.compile(p)) for p in TOTAL_AMOUNT_PATTERNS]
+
+_WHITESPACE_RE = re.compile(r'[\s\n\r]+')
+_DATE_SEPARATORS_RE = re.compile(r'[\s/\-_]+')
+
+_INVALID_INVOICE_NUMBERS = {'PAGE', 'TOTAL', 'DATE', 'NOTES', 'TERMS', 'AMOUNT', 'REF', 'NO'}
+
+# Same directive regexes strptime uses for %d, %m, %Y, %y and %b (C locale)
+_DAY_RE = re.compile(r'3[01]|[12]\d|0[1-9]|[1-9]')
+_MONTH_RE = re.compile(r'1[0-2]|0[1-9]|[1-9]')
+_YEAR4_RE = re.compile(r'\d\d\d\d')
+_YEAR2_RE = re.compile(r'\d\d')
+_MONTH_ABBRS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+def _year2(value):
+    # strptime maps 69-99 to 19xx and 00-68 to 20xx
+    year = int(value)
+    return year + (1900 if year >= 69 else 2000)
+
+def _month_abbr(value):
+    return _MONTH_ABBRS.get(value.lower())
+
+# Date candidates are normalized to '/' separators before parsing, so only the
+# '/' variants of the legacy format list can ever match. Order matches that list.
+_DATE_LAYOUTS = [
+    ('d', 'm', 'Y'),   # %d/%m/%Y
+    ('m', 'd', 'Y'),   # %m/%d/%Y
+    ('Y', 'm', 'd'),   # %Y/%m/%d
+    ('d', 'm', 'y'),   # %d/%m/%y
+    ('m', 'd', 'y'),   # %m/%d/%y
+    ('d', 'b', 'Y'),   # %d/%b/%Y
+    ('d', 'b', 'y'),   # %d/%b/%y
+]
+
+def _parse_part(kind, value):
+    """Parse one date component the way the matching strptime directive would"""
+    if kind == 'd':
+        return int(value) if _DAY_RE.fullmatch(value) else None
+    if kind == 'm':
+        return int(value) if _MONTH_RE.fullmatch(value) else None
+    if kind == 'Y':
+        return int(value) if _YEAR4_RE.fullmatch(value) else None
+    if kind == 'y':
+        return _year2(value) if _YEAR2_RE.fullmatch(value) else None
+    if kind == 'b':
+        return _month_abbr(value)
+    return None
+
+def _parse_date_candidates(date_str):
+    """Yield datetimes for every layout the candidate string parses under, in priority order"""
+    parts = _DATE_SEPARATORS_RE.sub('/', date_str).split('/')
+    if len(parts) != 3:
+        return
+    for layout in _DATE_LAYOUTS:
+        values = {}
+        for kind, value in zip(layout, parts):
+            parsed = _parse_part(kind, value)
+            if parsed is None:
+                break
+            values['m' if kind == 'b' else kind.lower()] = parsed
+        else:
+            try:
+                yield datetime(values['y'], values['m'], values['d'])
+            except ValueError:
+                continue
+
+def _parse_amount(val_str):
+    """Normalize a US/EU formatted number string and return it as a float"""
+    val_str = val_str.strip().replace(' ', '')
+    if ',' in val_str and '.' in val_str:
+        if val_str.rfind('.') > val_str.rfind(','):
+            # US: 1,234.56
+            val_str = val_str.replace(',', '')
+        else:
+            # EU: 1.234,56
+            val_str = val_str.replace('.', '').replace(',', '.')
+    elif ',' in val_str:
+        if len(val_str.split(',')[-1]) in [2, 3]:
+            # Likely decimal (,45 or ,456)
+            val_str = val_str.replace(',', '.')
+        else:
+            # Likely thousands
+            val_str = val_str.replace(',', '')
+    return float(val_str)
+
+def _find_invoice_number(text):
+    for pattern, regex in _INVOICE_NUMBER_REGEXES:
+        for match in regex.finditer(text):
+            val = _WHITESPACE_RE.sub('', match.group(1).strip())
+            if 2 <= len(val) <= 30 and any(c.isalnum() for c in val) \
+                    and val.upper() not in _INVALID_INVOICE_NUMBERS:
+                return {'value': val, 'pattern': pattern, 'match': match.group(1)}
+    return None
+
+def _find_invoice_date(text, now=None):
+    now = now or datetime.now()
+    earliest = now - timedelta(days=730)
+    latest = now + timedelta(days=30)
+    seen = set()
+    for pattern, regex in _INVOICE_DATE_REGEXES:
+        for match in regex.finditer(text):
+            date_str = match.group(1).strip()
+            # The same candidate often matches several patterns; it can only fail again
+            if date_str in seen:
+                continue
+            seen.add(date_str)
+            for date_obj in _parse_date_candidates(date_str):
+                if earliest <= date_obj <= latest:
+                    return {'value': date_obj.strftime('%Y%m%d'), 'pattern': pattern, 'match': date_str}
+    return None
+
+def _find_total_amount(lines):
+    # The legacy scorer weights line position above pattern rank above amount,
+    # so the answer is the largest amount of the best pattern on the lowest
+    # line that has any valid match - scan bottom-up and stop there.
+    for line in reversed(lines):
+        if len(line.strip()) < 3:
+            continue
+        for pattern, regex in _TOTAL_AMOUNT_REGEXES:
+            best = None
+            for match in regex.finditer(line):
+                try:
+                    amount = _parse_amount(match.group(1))
+                except (ValueError, AttributeError):
+                    continue
+                if 0 < amount < 100000000 and (best is None or amount > best['value']):
+                    best = {'value': amount, 'pattern': pattern, 'match': match.group(1)}
+            if best:
+                return best
+    return None
+
+def extract_fields(text, return_match=False, fields=None):
+    """Extract invoice number, date and total from OCR text in one call
+
+    Returns {'invoice_number', 'invoice_date', 'total_amount'}. With
+    return_match=True each value is a dict with the value, the pattern that
+    matched and the raw matched text (or None). fields limits the search to
+    those keys; the others are returned as None.
+    """
+    text = text or ''
+    fields = fields if fields is not None else ('invoice_number', 'invoice_date', 'total_amount')
+    matches = {
+        'invoice_number': _find_invoice_number(text) if 'invoice_number' in fields else None,
+        'invoice_date': _find_invoice_date(text) if 'invoice_date' in fields else None,
+        'total_amount': _find_total_amount(text.split('\n')) if 'total_amount' in fields else None
+    }
+    if return_match:
+        return matches
+    return {field: match['value'] if match else None for field, match in matches.items()}
@@ -1,8 +1,12 @@
 from werkzeug.utils import secure_filename
 import os
+import shutil
+import uuid
 from datetime import datetime
 
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'xlsx', 'xls'}
+INVOICE_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+SUPPORTING_EXTENSIONS = {'xlsx', 'xls'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -25,3 +29,83 @@ def save_uploaded_file(file, upload_folder):
 def get_file_extension(filename):
     """Get file extension"""
     return filename.rsplit('.', 1)[1].lower() if '.' in filename else None
+
+def save_batch_file(source, filename, upload_folder):
+    """
+    Save a batch upload file (an uploaded file or an open zip member) under a unique name
+    
+    Batches often repeat file names (invoice.pdf in every folder), so a short
+    random suffix is added to the timestamp prefix.
+    """
+    if not allowed_file(filename):
+        return None
+    
+    filename = secure_filename(os.path.basename(filename))
+    if not filename:
+        return None
+    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S_')}{uuid.uuid4().hex[:8]}_{filename}"
+    
+    filepath = os.path.join(upload_folder, filename)
+    os.makedirs(upload_folder, exist_ok=True)
+    if hasattr(source, 'save'):
+        source.save(filepath)
+    else:
+        with open(filepath, 'wb') as out:
+            shutil.copyfileobj(source, out)
+    
+    return filepath
+
+def pair_archive_files(archive):
+    """
+    Pair invoice and supporting files inside a zip archive
+    
+    A folder holding exactly one invoice and one spreadsheet is one pair;
+    otherwise files pair up by base name (INV-1.pdf with INV-1.xlsx).
+    
+    Args:
+        archive: Open zipfile.ZipFile
+    
+    Returns:
+        (pairs, unmatched) where pairs is a list of
+        {'name', 'invoice': ZipInfo, 'supporting': ZipInfo} and unmatched lists member names
+    """
+    folders = {}
+    unmatched = []
+    for info in archive.infolist():
+        name = info.filename
+        base = os.path.basename(name)
+        # Skip folders, hidden files and macOS resource forks
+        if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+            continue
+        ext = get_file_extension(base)
+        if ext in INVOICE_EXTENSIONS:
+            kind = 'invoice'
+        elif ext in SUPPORTING_EXTENSIONS:
+            kind = 'supporting'
+        else:
+            unmatched.append(name)
+            continue
+        folder = folders.setdefault(os.path.dirname(name), {'invoice': [], 'supporting': []})
+        folder[kind].append(info)
+    
+    pairs = []
+    for folder_name, files in sorted(folders.items()):
+        if len(files['invoice']) == 1 and len(files['supporting']) == 1:
+            invoice = files['invoice'][0]
+            name = os.path.basename(folder_name) or os.path.splitext(os.path.basename(invoice.filename))[0]
+            pairs.append({'name': name, 'invoice': invoice, 'supporting': files['supporting'][0]})
+            continue
+        
+        sheets = {}
+        for info in files['supporting']:
+            sheets.setdefault(os.path.splitext(os.path.basename(info.filename))[0].lower(), []).append(info)
+        for invoice in files['invoice']:
+            stem = os.path.splitext(os.path.basename(invoice.filename))[0]
+            matches = sheets.get(stem.lower())
+            if matches:
+                pairs.append({'name': stem, 'invoice': invoice, 'supporting': matches.pop(0)})
+            else:
+                unmatched.append(invoice.filename)
+        unmatched.extend(info.filename for infos in sheets.values() for info in infos)
+    
+    return pairs, unmatched
@@ -0,0 +1,246 @@
+import os
+import time
+from PIL import Image, ImageEnhance, ImageFilter
+
+# NumPy is optional: without it every image goes through the legacy PIL chain
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 'adaptive' (NumPy, quality-driven) or 'legacy' (fixed PIL chain)
+PREPROCESS_MODE = os.getenv('OCR_PREPROCESS_MODE', 'adaptive').lower()
+
+# Images smaller than this are upscaled before OCR
+MIN_WIDTH = 800
+MIN_HEIGHT = 600
+
+# Quality thresholds for the adaptive pipeline
+NOISE_SIGMA_THRESHOLD = 6.0      # Estimated noise std dev above which the median filter runs
+SPECKLE_FRACTION_THRESHOLD = 0.002  # Share of isolated specks above which the median filter runs
+SPECKLE_DELTA = 48               # A speck differs from all four neighbours by more than this, the same way
+BINARY_MIDTONE_FRACTION = 0.02   # Below this share of mid-tone pixels the page counts as binarized already
+DESKEW_MAX_ANGLE = 5.0           # Skew angles searched, in degrees either way
+DESKEW_STEP = 0.25
+DESKEW_MIN_ANGLE = 0.3           # Smaller skews are left alone
+METRIC_MAX_SIDE = 1000           # Metrics and skew are measured on a strided view at most this large
+
+# Peak bytes held per page pixel while preprocessing: the adaptive pipeline keeps
+# the grayscale page, its working array and a median / deskewed copy; the legacy
+# one an RGB page plus the filtered copy
+PEAK_BYTES_PER_PIXEL_ADAPTIVE = 4
+PEAK_BYTES_PER_PIXEL_LEGACY = 8
+
+LEGACY_VERSION = 'median3-contrast1.8-brightness1.05-sharpness2.0'
+ADAPTIVE_VERSION = 'np1-gray-median-noise6-speckle-otsu-deskew5'
+
+def use_adaptive():
+    return PREPROCESS_MODE == 'adaptive' and np is not None
+
+def peak_bytes_per_pixel():
+    return PEAK_BYTES_PER_PIXEL_ADAPTIVE if use_adaptive() else PEAK_BYTES_PER_PIXEL_LEGACY
+
+def version():
+    """Identifies the active pipeline so cached OCR text from another one is not reused"""
+    return ADAPTIVE_VERSION if use_adaptive() else LEGACY_VERSION
+
+class _StageTimer:
+    """Collects per-stage wall time in milliseconds"""
+
+    def __init__(self):
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = round((now - self.start) * 1000, 1)
+        self.start = now
+
+def preprocess(image, upscale_small=False):
+    """
+    Prepare an image for tesseract
+
+    Args:
+        image: PIL image
+        upscale_small: Upscale images under MIN_WIDTH x MIN_HEIGHT (photos and screenshots)
+
+    Returns:
+        (image, report) where report holds the mode, per-stage timings in ms,
+        the skipped stages and the quality metrics that decided them
+    """
+    if use_adaptive():
+        return _preprocess_adaptive(image, upscale_small)
+    return _preprocess_legacy(image, upscale_small)
+
+def _upscale(image):
+    width, height = image.size
+    if width >= MIN_WIDTH and height >= MIN_HEIGHT:
+        return image, False
+    scale_factor = max(MIN_WIDTH / width, MIN_HEIGHT / height)
+    new_size = (int(width * scale_factor), int(height * scale_factor))
+    print(f"[DEBUG] Image upscaled to {new_size}")
+    return image.resize(new_size, Image.Resampling.LANCZOS), True
+
+def _preprocess_legacy(image, upscale_small):
+    """Fixed chain: RGB, optional upscale, median 3, contrast, brightness, sharpness"""
+    timer = _StageTimer()
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if upscale_small:
+        image, _ = _upscale(image)
+    timer.lap('convert')
+
+    image = image.filter(ImageFilter.MedianFilter(size=3))
+    timer.lap('denoise')
+
+    image = ImageEnhance.Contrast(image).enhance(1.8)
+    image = ImageEnhance.Brightness(image).enhance(1.05)
+    image = ImageEnhance.Sharpness(image).enhance(2.0)
+    timer.lap('enhance')
+
+    return image, {'mode': 'legacy', 'stages': timer.stages, 'skipped': [], 'metrics': {}}
+
+def _sample(arr):
+    """Strided view (no copy) with its longest side at most METRIC_MAX_SIDE"""
+    step = max(1, -(-max(arr.shape) // METRIC_MAX_SIDE))
+    return arr[::step, ::step]
+
+def _crop(arr):
+    """Contiguous centre view (no copy) at most METRIC_MAX_SIDE square; noise needs real neighbours"""
+    height, width = arr.shape
+    top = max(0, (height - METRIC_MAX_SIDE) // 2)
+    left = max(0, (width - METRIC_MAX_SIDE) // 2)
+    return arr[top:top + METRIC_MAX_SIDE, left:left + METRIC_MAX_SIDE]
+
+def _speckle_fraction(crop):
+    """Share of pixels darker or brighter than all four neighbours by more than SPECKLE_DELTA"""
+    height, width = crop.shape
+    if height < 3 or width < 3:
+        return 0.0
+    c = crop.astype(np.int16)
+    center = c[1:-1, 1:-1]
+    neighbours = (c[:-2, 1:-1], c[2:, 1:-1], c[1:-1, :-2], c[1:-1, 2:])
+    darker = np.ones(center.shape, dtype=bool)
+    brighter = np.ones(center.shape, dtype=bool)
+    for n in neighbours:
+        diff = n - center
+        darker &= diff > SPECKLE_DELTA
+        brighter &= diff < -SPECKLE_DELTA
+    return float(np.count_nonzero(darker | brighter)) / center.size
+
+def _noise_sigma(sample):
+    """
+    Noise std dev from Immerkaer's Laplacian difference mask
+
+    Uses the median absolute response rather than the mean, so the sharp
+    edges of text (a small share of pixels) don't read as noise.
+    """
+    height, width = sample.shape
+    if height < 3 or width < 3:
+        return 0.0
+    s = sample.astype(np.int16)
+    response = (
+        s[:-2, :-2] + s[:-2, 2:] + s[2:, :-2] + s[2:, 2:]
+        - 2 * (s[:-2, 1:-1] + s[2:, 1:-1] + s[1:-1, :-2] + s[1:-1, 2:])
+        + 4 * s[1:-1, 1:-1]
+    )
+    # The mask's response has std dev 6 * sigma; median |x| of a normal is 0.6745 * std dev
+    return float(np.median(np.abs(response))) / (6 * 0.6745)
+
+def _otsu_threshold(hist):
+    """Otsu threshold from a 256-bin histogram, vectorized over all candidate levels"""
+    total = hist.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+def _skew_angle(sample):
+    """
+    Text skew in degrees from the projection profile of dark pixels
+
+    Each candidate angle shears the ink coordinates and histograms them by
+    row; text lines line up (sharpest profile) at the true skew.
+    """
+    ys, xs = np.nonzero(sample < 128)
+    if len(ys) < 50:
+        return 0.0
+    angles = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP)
+    offset = int(sample.shape[1] * np.tan(np.radians(DESKEW_MAX_ANGLE))) + 1
+    best_angle, best_score = 0.0, -1.0
+    for angle in angles:
+        rows = np.rint(ys + xs * np.tan(np.radians(angle))).astype(np.int64) + offset
+        profile = np.bincount(rows)
+        score = float(np.dot(profile, profile))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def _preprocess_adaptive(image, upscale_small):
+    """
+    NumPy pipeline on one grayscale buffer: only the stages the page needs
+
+    Grayscale conversion happens once and binarization is applied in place.
+    Noise is measured on a contiguous centre crop; mid-tone share and skew
+    on a strided view, whose histogram also gives the Otsu threshold. Low-contrast pages need
+    no separate stretch: Otsu picks the split between ink and paper wherever
+    it lies.
+    """
+    timer = _StageTimer()
+    skipped = []
+
+    gray = image.convert('L') if image.mode != 'L' else image
+    if upscale_small:
+        gray, upscaled = _upscale(gray)
+        if not upscaled:
+            skipped.append('upscale')
+    # One writable buffer, modified in place from here on
+    arr = np.array(gray, dtype=np.uint8)
+    timer.lap('grayscale')
+
+    sample = _sample(arr)
+    crop = _crop(arr)
+    hist = np.bincount(sample.ravel(), minlength=256)
+    metrics = {
+        'noise_sigma': round(_noise_sigma(crop), 2),
+        'speckle_fraction': round(_speckle_fraction(crop), 5),
+        'midtone_fraction': round(float(hist[32:224].sum()) / max(int(hist.sum()), 1), 4)
+    }
+    timer.lap('metrics')
+
+    if metrics['noise_sigma'] > NOISE_SIGMA_THRESHOLD or metrics['speckle_fraction'] > SPECKLE_FRACTION_THRESHOLD:
+        # PIL's median filter runs in C on the single-channel buffer
+        arr = np.array(Image.fromarray(arr).filter(ImageFilter.MedianFilter(size=3)))
+        hist = np.bincount(_sample(arr).ravel(), minlength=256)
+        timer.lap('denoise')
+    else:
+        skipped.append('denoise')
+
+    if metrics['midtone_fraction'] >= BINARY_MIDTONE_FRACTION:
+        threshold = _otsu_threshold(hist)
+        metrics['threshold'] = threshold
+        np.multiply(arr > threshold, 255, out=arr, casting='unsafe')
+        timer.lap('binarize')
+    else:
+        skipped.append('binarize')
+
+    angle = _skew_angle(_sample(arr))
+    metrics['skew_angle'] = angle
+    timer.lap('skew_detect')
+
+    result = Image.fromarray(arr)
+    if abs(angle) >= DESKEW_MIN_ANGLE:
+        # Sheared rows line up at +angle, so rotate back by the same amount
+        result = result.rotate(-angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+        timer.lap('deskew')
+    else:
+        skipped.append('deskew')
+
+    return result, {'mode': 'adaptive', 'stages': timer.stages, 'skipped': skipped, 'metrics': metrics}
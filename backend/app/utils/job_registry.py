@@ -0,0 +1,49 @@
+from collections import OrderedDict
+import time
+
+class JobRegistry:
+    """
+    Job records kept for status polling
+
+    Finished records are dropped ttl seconds after they finish, or oldest
+    first once there are more than max_entries records. Running jobs are
+    never dropped. Not thread-safe: callers hold their own lock.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.records = {}
+        # key -> monotonic finish time, oldest first
+        self.finished = OrderedDict()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def add(self, key, record):
+        self.finished.pop(key, None)
+        self.records[key] = record
+        self.prune()
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def finish(self, key):
+        """Mark a record finished, starting its ttl"""
+        if key not in self.records:
+            return
+        self.finished[key] = time.monotonic()
+        self.finished.move_to_end(key)
+        self.prune()
+
+    def prune(self):
+        cutoff = time.monotonic() - self.ttl
+        while self.finished:
+            key, finished_at = next(iter(self.finished.items()))
+            if finished_at > cutoff and len(self.records) <= self.max_entries:
+                break
+            del self.finished[key]
+            self.records.pop(key, None)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Content-addressed on-disk cache of OCR results, keyed by file bytes + OCR config
+CACHE_DIR = os.getenv('OCR_CACHE_DIR', './ocr_cache')
+CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_MB', 200)) * 1024 * 1024
+CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Eviction frees space down to this share of CACHE_MAX_BYTES, so the next writes don't evict again
+EVICT_TARGET = 0.9
+# The size total is kept per process; a full recount picks up other processes' writes this often
+RESCAN_SECONDS = int(os.getenv('OCR_CACHE_RESCAN_SECONDS', 600))
+
+_evict_lock = threading.Lock()
+_total_bytes = None
+_counted_at = 0.0
+
+def cache_key(file_path, config):
+    """Hash the file contents together with the OCR config string"""
+    digest = hashlib.sha256()
+    digest.update(config.encode('utf-8'))
+    digest.update(b'\0')
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def get_cached(key):
+    """Return the cached entry for a key, or None on a miss"""
+    if not CACHE_ENABLED:
+        return None
+    path = _entry_path(key)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        # Touch the entry so eviction treats it as recently used
+        os.utime(path, None)
+        return entry
+    except (OSError, ValueError):
+        return None
+
+def store(key, entry):
+    """Write an entry to the cache and evict least recently used entries if over budget"""
+    if not CACHE_ENABLED:
+        return
+    path = _entry_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(entry).encode('utf-8')
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        # Atomic rename so concurrent readers never see a partial file
+        os.replace(tmp_path, path)
+        _account(len(data) - replaced)
+    except OSError as e:
+        print(f"[WARN] Failed to write OCR cache entry {key}: {str(e)}")
+
+def _scan():
+    """(mtime, size, path) of every cache entry, and their total size"""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+    return entries, total
+
+def _account(delta):
+    """Add a write to the running size total; the directory is only walked to recount or evict"""
+    global _total_bytes, _counted_at
+    with _evict_lock:
+        if _total_bytes is None or time.monotonic() - _counted_at > RESCAN_SECONDS:
+            _, _total_bytes = _scan()
+            _counted_at = time.monotonic()
+        else:
+            _total_bytes += delta
+        if _total_bytes > CACHE_MAX_BYTES:
+            _evict()
+
+def _evict():
+    """Delete least recently used entries until the cache is down to EVICT_TARGET of CACHE_MAX_BYTES (holds _evict_lock)"""
+    global _total_bytes, _counted_at
+    entries, total = _scan()
+    target = CACHE_MAX_BYTES * EVICT_TARGET
+    if total > CACHE_MAX_BYTES:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+    _total_bytes = total
+    _counted_at = time.monotonic()
@@ -0,0 +1,135 @@
+import os
+import queue
+import re
+import threading
+import pytesseract
+
+# tesserocr is optional: without it every page goes through pytesseract
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+except ValueError as e:
+    # cysignals refuses to load outside the main thread
+    print(f"[WARN] tesserocr could not be loaded: {e}")
+    tesserocr = None
+
+# 'pytesseract' starts a tesseract process per call and passes the image
+# through a temp file; 'tesserocr' keeps long-lived engines in this process
+# and hands them images in memory
+ENGINE = os.getenv('OCR_ENGINE', 'pytesseract').lower()
+# Most engines kept alive per process; callers beyond this wait for a free one
+ENGINE_POOL_SIZE = int(os.getenv('OCR_ENGINE_POOL_SIZE') or 0) or os.cpu_count() or 1
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+
+if ENGINE == 'tesserocr' and tesserocr is None:
+    print("[WARN] OCR_ENGINE=tesserocr but tesserocr is not installed, using pytesseract")
+
+_TSV_INT_FIELDS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height')
+
+def use_tesserocr():
+    return ENGINE == 'tesserocr' and tesserocr is not None
+
+def name():
+    """Engine actually in use (tesserocr falls back to pytesseract when it isn't installed)"""
+    return 'tesserocr' if use_tesserocr() else 'pytesseract'
+
+def _engine_options(config):
+    """PSM and OEM of a tesseract command line config such as '--psm 6'"""
+    options = {}
+    psm = re.search(r'--psm\s+(\d+)', config or '')
+    oem = re.search(r'--oem\s+(\d+)', config or '')
+    if psm:
+        options['psm'] = int(psm.group(1))
+    if oem:
+        options['oem'] = int(oem.group(1))
+    return options
+
+def _parse_tsv(tsv):
+    """tesseract TSV rows as the column dict pytesseract.image_to_data returns"""
+    data = {field: [] for field in _TSV_INT_FIELDS + ('conf', 'text')}
+    for row in tsv.splitlines():
+        columns = row.split('\t')
+        if len(columns) < 11 or not columns[0].isdigit():
+            continue
+        for field, value in zip(_TSV_INT_FIELDS, columns):
+            data[field].append(int(value))
+        data['conf'].append(int(float(columns[10])))
+        data['text'].append(columns[11] if len(columns) > 11 else '')
+    return data
+
+class TesseractEnginePool:
+    """Long-lived tesserocr engines, one per concurrent caller up to a fixed size
+
+    Loading the language model is the expensive part of a tesseract run, so
+    engines are created lazily and reused for every page after that.
+    """
+
+    def __init__(self, size, lang, config):
+        self.size = size
+        self.lang = lang
+        self.options = _engine_options(config)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        try:
+            # TESSDATA_PREFIX, when set, tells tesseract where the traineddata files are
+            return tesserocr.PyTessBaseAPI(lang=self.lang, **self.options)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def image_to_data(self, image):
+        engine = self._acquire()
+        try:
+            engine.SetImage(image)
+            return _parse_tsv(engine.GetTSVText(0))
+        finally:
+            # Drop this page's results but keep the loaded model
+            engine.Clear()
+            self._idle.put(engine)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(config):
+    """Engine pool of this process for a tesseract config (created on first use, also in worker processes)"""
+    with _pools_lock:
+        pool = _pools.get(config)
+        if pool is None:
+            pool = TesseractEnginePool(ENGINE_POOL_SIZE, OCR_LANG, config)
+            _pools[config] = pool
+        return pool
+
+def image_to_data(image, config=''):
+    """
+    Word boxes, confidences and layout numbers of an image
+
+    Returns the same column dict as pytesseract.image_to_data with
+    Output.DICT, whichever engine is configured.
+    """
+    if use_tesserocr():
+        return _get_pool(config).image_to_data(image)
+    return pytesseract.image_to_data(image, lang=OCR_LANG, config=config, output_type=pytesseract.Output.DICT)
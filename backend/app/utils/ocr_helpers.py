@@ -1,23 +1,59 @@
 import re
 from datetime import datetime
 
-def extract_invoice_number(text):
-    """Extract invoice number from OCR text"""
-    # Patterns ordered by specificity - look for exact label matches first
-    patterns = [
-        # Match "Inv. No." specifically (your format)
-        r'(?i)inv\.?\s*no\.?\s*[:\-]?\s*([A-Z0-9\-\.\/]+?)(?:\s|$)',
-        r'(?i)invoice\s*no\.?\s*[:\-]?\s*([A-Z0-9\-\.\/]+?)(?:\s|$)',
-        
-        # More flexible patterns
-        r'(?i)inv(?:oice)?\s*(?:number|no\.?|#)[:\s]+([A-Z0-9\-\.\/]+?)(?:\s|$)',
-        r'(?i)invoice[:\s#]*([A-Z0-9\-\.\/]+?)(?:\s|$)',
-        
-        # Fallback - numbers with context
-        r'(?i)(?:ref|reference|doc|document)[.\s]*(?:number|no\.?|#)?[:\s]*([A-Z0-9\-\.\/]{4,})',
-    ]
+# Patterns ordered by specificity - look for exact label matches first
+INVOICE_NUMBER_PATTERNS = [
+    # Match "Inv. No." specifically (your format)
+    r'(?i)inv\.?\s*no\.?\s*[:\-]?\s*([A-Z0-9\-\.\/]+?)(?:\s|$)',
+    r'(?i)invoice\s*no\.?\s*[:\-]?\s*([A-Z0-9\-\.\/]+?)(?:\s|$)',
+
+    # More flexible patterns
+    r'(?i)inv(?:oice)?\s*(?:number|no\.?|#)[:\s]+([A-Z0-9\-\.\/]+?)(?:\s|$)',
+    r'(?i)invoice[:\s#]*([A-Z0-9\-\.\/]+?)(?:\s|$)',
+
+    # Fallback - numbers with context
+    r'(?i)(?:ref|reference|doc|document)[.\s]*(?:number|no\.?|#)?[:\s]*([A-Z0-9\-\.\/]{4,})',
+]
+
+# Try multiple date patterns with different separators
+INVOICE_DATE_PATTERNS = [
+    # Explicit "Date" label (your format)
+    r'(?i)date\s*[:\-]?\s*(\d{1,4}[-/]\d{1,2}[-/]\d{1,4})',
+    r'(?i)invoice\s*date\s*[:\-]?\s*(\d{1,4}[-/]\d{1,2}[-/]\d{1,4})',
+
+    # Generic date patterns (DD/MM/YYYY, MM/DD/YYYY, etc.)
+    r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})',
+    r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+
+    # With month names
+    r'(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/]\d{4})',
+
+    # Less strict - just look after date label
+    r'(?i)date[:\s]+([0-9/\-]+)',
+]
+
+# Patterns to look for - ordered by specificity
+TOTAL_AMOUNT_PATTERNS = [
+    # High priority - explicit "Total" label (your format)
+    r'(?i)total\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
+    r'(?i)grand\s*total\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
+    r'(?i)total\s*(?:amount|invoice)\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
+
+    # Medium priority
+    r'(?i)net\s*(?:amount|payable|am)?\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
+    r'(?i)sum\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
+
+    # Currency + amount patterns
+    r'(?:[A-Z]{3}|[A-Z]{2})\s*[:]?\s*([\d,\.]+)',
+]
+
+def extract_invoice_number(text, return_match=False):
+    """Extract invoice number from OCR text
     
-    for pattern in patterns:
+    With return_match=True returns a dict with the value, the pattern that
+    matched and the raw matched text (or None).
+    """
+    for pattern in INVOICE_NUMBER_PATTERNS:
         matches = re.finditer(pattern, text, re.MULTILINE | re.IGNORECASE)
         for match in matches:
             val = match.group(1).strip()
@@ -31,30 +67,19 @@ def extract_invoice_number(text):
                 if any(c.isalnum() for c in val):
                     # Reject common false positives
                     if val.upper() not in ['PAGE', 'TOTAL', 'DATE', 'NOTES', 'TERMS', 'AMOUNT', 'REF', 'NO']:
+                        if return_match:
+                            return {'value': val, 'pattern': pattern, 'match': match.group(1)}
                         return val
     
     return None
 
-def extract_invoice_date(text):
-    """Extract invoice date and convert to YYYYMMDD format"""
-    # Try multiple date patterns with different separators
-    patterns = [
-        # Explicit "Date" label (your format)
-        r'(?i)date\s*[:\-]?\s*(\d{1,4}[-/]\d{1,2}[-/]\d{1,4})',
-        r'(?i)invoice\s*date\s*[:\-]?\s*(\d{1,4}[-/]\d{1,2}[-/]\d{1,4})',
-        
-        # Generic date patterns (DD/MM/YYYY, MM/DD/YYYY, etc.)
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})',
-        r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-        
-        # With month names
-        r'(\d{1,2}[-/](?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*[-/]\d{4})',
-        
-        # Less strict - just look after date label
-        r'(?i)date[:\s]+([0-9/\-]+)',
-    ]
+def extract_invoice_date(text, return_match=False):
+    """Extract invoice date and convert to YYYYMMDD format
     
-    for pattern in patterns:
+    With return_match=True returns a dict with the value, the pattern that
+    matched and the raw matched text (or None).
+    """
+    for pattern in INVOICE_DATE_PATTERNS:
         matches = re.finditer(pattern, text, re.IGNORECASE)
         for match in matches:
             date_str = match.group(1).strip()
@@ -82,6 +107,8 @@ def extract_invoice_date(text):
                         from datetime import timedelta
                         now = datetime.now()
                         if (now - timedelta(days=730)) <= date_obj <= (now + timedelta(days=30)):
+                            if return_match:
+                                return {'value': date_obj.strftime('%Y%m%d'), 'pattern': pattern, 'match': date_str}
                             return date_obj.strftime('%Y%m%d')
                     except ValueError:
                         continue
@@ -90,28 +117,18 @@ def extract_invoice_date(text):
     
     return None
 
-def extract_total_amount(text):
-    """Extract total amount from OCR text"""
+def extract_total_amount(text, return_match=False):
+    """Extract total amount from OCR text
+    
+    With return_match=True returns a dict with the value, the pattern that
+    matched and the raw matched text (or None).
+    """
     # Split text into lines for better processing
     lines = text.split('\n')
     
-    # Patterns to look for - ordered by specificity
-    patterns = [
-        # High priority - explicit "Total" label (your format)
-        r'(?i)total\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
-        r'(?i)grand\s*total\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
-        r'(?i)total\s*(?:amount|invoice)\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
-        
-        # Medium priority
-        r'(?i)net\s*(?:amount|payable|am)?\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
-        r'(?i)sum\s*[:\-]?\s*(?:[A-Z]{1,3}[\s.]*)?\s*([\d,\.]+)',
-        
-        # Currency + amount patterns
-        r'(?:[A-Z]{3}|[A-Z]{2})\s*[:]?\s*([\d,\.]+)',
-    ]
-    
     best_match = None
     best_priority = -1
+    best_info = None
     
     # Search lines in reverse order (last occurrence usually has the total)
     for line_num, line in enumerate(reversed(lines)):
@@ -122,9 +139,9 @@ def extract_total_amount(text):
         # Higher priority for lines further down
         position_priority = len(lines) - line_num
         
-        for pattern_idx, pattern in enumerate(patterns):
+        for pattern_idx, pattern in enumerate(TOTAL_AMOUNT_PATTERNS):
             # Higher priority for patterns earlier in list
-            pattern_priority = len(patterns) - pattern_idx
+            pattern_priority = len(TOTAL_AMOUNT_PATTERNS) - pattern_idx
             
             matches = re.finditer(pattern, line)
             for match in matches:
@@ -162,9 +179,12 @@ def extract_total_amount(text):
                         if combined_priority > best_priority:
                             best_priority = combined_priority
                             best_match = amount
+                            best_info = {'value': amount, 'pattern': pattern, 'match': match.group(1)}
                 except (ValueError, AttributeError):
                     continue
     
+    if return_match:
+        return best_info
     return best_match
 
 def generate_itemcode(season, supplier_code, decathlon_sku):
@@ -185,3 +205,30 @@ def normalize_currency(currency):
         'kwd': 'KWD',
     }
     return currency_map.get(currency.lower(), currency.upper())
+
+_EDGE_PUNCTUATION = '.,:;#()[]{}"\'|'
+
+def match_confidence(matched_text, words):
+    """Lowest tesseract confidence among the OCR words that make up a matched value
+    
+    words is a list of [word, confidence] pairs. OCR words count when they equal a
+    whole word of the match, ignoring surrounding punctuation. Returns None if none does.
+    """
+    if not matched_text or not words:
+        return None
+    
+    tokens = {_strip_punctuation(token) for token in matched_text.split()} - {''}
+    confidences = [
+        conf for word, conf in words
+        if word and conf >= 0 and _word_parts(word) & tokens
+    ]
+    return min(confidences) if confidences else None
+
+def _strip_punctuation(token):
+    return token.strip(_EDGE_PUNCTUATION)
+
+def _word_parts(word):
+    """An OCR word without surrounding punctuation, plus its parts when a label is glued on ("No:INV-001")"""
+    parts = {_strip_punctuation(word)}
+    parts.update(_strip_punctuation(part) for part in re.split(r'[:#]', word))
+    return parts - {''}
@@ -0,0 +1,150 @@
+import os
+import statistics
+import tempfile
+import pdf2image
+from PIL import Image
+from PyPDF2 import PdfReader
+from app.utils import image_preprocessing
+
+# Low-memory PDF rasterization: one page at a time, grayscale, written by
+# pdftoppm to a temporary folder and opened from there, so the raw page bytes
+# never sit in memory next to the decoded image. Each page's DPI follows its
+# text size, and a per-page memory ceiling caps it for oversized pages.
+
+# DPI when the text size can't be measured, or adaptive DPI is off
+DEFAULT_DPI = 300
+ADAPTIVE_DPI = os.getenv('OCR_ADAPTIVE_DPI', 'true').lower() == 'true'
+MIN_DPI = int(os.getenv('OCR_MIN_DPI', 150))
+MAX_DPI = int(os.getenv('OCR_MAX_DPI', 400))
+# Pixel height of a line of text tesseract reads best (10pt text at 300 DPI)
+TARGET_LINE_HEIGHT = int(os.getenv('OCR_TARGET_LINE_HEIGHT', 38))
+# Most memory one page may take while rasterized and preprocessed
+PAGE_MEMORY_MB = int(os.getenv('OCR_PAGE_MEMORY_MB', 96))
+
+# Resolution of the pass that measures page size and text height
+PROBE_DPI = 72
+DPI_STEP = 25
+# Text lines are measured in this many vertical strips, so skew and columns don't merge lines
+PROBE_STRIPS = 4
+# A row counts as ink when its mean is this far below the paper level
+INK_ROW_DELTA = 6
+# Runs shorter than this (probe pixels) are table rules, not text
+MIN_LINE_PX = 3
+# Fewer measured lines than this and the page keeps DEFAULT_DPI
+MIN_LINES = 5
+
+def config():
+    """Identifies the rasterization settings so cached OCR text from others is not reused"""
+    if ADAPTIVE_DPI:
+        dpi = f"auto{MIN_DPI}-{MAX_DPI}@{TARGET_LINE_HEIGHT}px"
+    else:
+        dpi = str(DEFAULT_DPI)
+    return f"dpi={dpi}|gray|mem={PAGE_MEMORY_MB}"
+
+def _row_means(image):
+    """Mean brightness of every row, computed by Pillow in C"""
+    return list(image.resize((1, image.height), Image.Resampling.BOX).getdata())
+
+def text_line_height(probe):
+    """
+    Median height in pixels of the text lines of a grayscale page, or None
+
+    Rows with ink form runs, one per text line; the median ignores rules,
+    logos and the odd merged line.
+    """
+    runs = []
+    strip_width = probe.width // PROBE_STRIPS
+    if strip_width < 1 or probe.height < MIN_LINE_PX:
+        return None
+    for strip in range(PROBE_STRIPS):
+        means = _row_means(probe.crop((strip * strip_width, 0, (strip + 1) * strip_width, probe.height)))
+        # Paper level from the brightest rows, so grey scans work too
+        paper = sorted(means)[int(len(means) * 0.9)]
+        run = 0
+        for mean in means + [paper]:
+            if mean < paper - INK_ROW_DELTA:
+                run += 1
+                continue
+            if run >= MIN_LINE_PX:
+                runs.append(run)
+            run = 0
+    if len(runs) < MIN_LINES:
+        return None
+    return statistics.median(runs)
+
+def memory_dpi_cap(width_in, height_in):
+    """Highest DPI at which a page of this size stays within PAGE_MEMORY_MB"""
+    budget = PAGE_MEMORY_MB * 1024 * 1024 / image_preprocessing.peak_bytes_per_pixel()
+    return int((budget / max(width_in * height_in, 0.01)) ** 0.5)
+
+def _hold_to_ceiling(dpi, width_in, height_in, info):
+    cap = memory_dpi_cap(width_in, height_in)
+    if dpi > cap:
+        # The ceiling wins over MIN_DPI: a huge page is read coarser rather than not at all
+        dpi, info['capped'] = cap, True
+    info['dpi'] = dpi
+    return dpi, info
+
+def page_size(pdf_path, page_num):
+    """(width, height) of a PDF page in inches from its media box, or None if the PDF can't be parsed"""
+    try:
+        box = PdfReader(pdf_path).pages[page_num - 1].mediabox
+        return float(box.width) / 72, float(box.height) / 72
+    except Exception as e:
+        print(f"[WARN] Could not read the size of page {page_num}: {str(e)}")
+        return None
+
+def choose_dpi(probe, dpi=None):
+    """
+    DPI for a page from its PROBE_DPI rendering
+
+    Args:
+        probe: Grayscale page rendered at PROBE_DPI
+        dpi: Fixed DPI; otherwise from the text size when ADAPTIVE_DPI is on
+
+    Returns:
+        (dpi, info) where info records the measured line height in points and
+        whether the memory ceiling lowered the DPI
+    """
+    info = {'line_height_pt': None, 'capped': False}
+    if dpi is None:
+        dpi = DEFAULT_DPI
+        if ADAPTIVE_DPI:
+            line_height = text_line_height(probe)
+            if line_height:
+                info['line_height_pt'] = round(line_height * 72 / PROBE_DPI, 1)
+                wanted = TARGET_LINE_HEIGHT * PROBE_DPI / line_height
+                dpi = min(MAX_DPI, max(MIN_DPI, int(round(wanted / DPI_STEP)) * DPI_STEP))
+
+    return _hold_to_ceiling(dpi, probe.width / PROBE_DPI, probe.height / PROBE_DPI, info)
+
+def _render(pdf_path, page_num, dpi):
+    with tempfile.TemporaryDirectory() as folder:
+        path = pdf2image.convert_from_path(
+            pdf_path, dpi=dpi, first_page=page_num, last_page=page_num,
+            output_folder=folder, paths_only=True, single_file=True, grayscale=True
+        )[0]
+        image = Image.open(path)
+        # Decode before the folder goes away
+        image.load()
+    return image
+
+def rasterize_page(pdf_path, page_num, dpi=None):
+    """
+    One PDF page as a grayscale image
+
+    Args:
+        pdf_path: PDF file
+        page_num: 1-based page number
+        dpi: Fixed DPI (still held to the memory ceiling); None picks it from the text size
+
+    Returns:
+        (image, info) with the DPI used, see choose_dpi
+    """
+    # A fixed DPI only needs the page size for the ceiling, read without rendering a probe
+    size = page_size(pdf_path, page_num) if dpi is not None else None
+    if size:
+        dpi, info = _hold_to_ceiling(dpi, *size, {'line_height_pt': None, 'capped': False})
+    else:
+        dpi, info = choose_dpi(_render(pdf_path, page_num, PROBE_DPI), dpi)
+    return _render(pdf_path, page_num, dpi), info
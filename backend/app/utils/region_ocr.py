@@ -0,0 +1,118 @@
+import re
+
+# Region-of-interest OCR helpers: find header/total labels on a low-resolution
+# pass and turn them into page regions (fractions of the page size) that are
+# then OCR'd from the full-resolution page.
+
+LABEL_PATTERNS = {
+    'invoice_number': re.compile(r'\binv(?:oice)?\b\.?\s*(?:no\b|number\b|#)', re.IGNORECASE),
+    'invoice_date': re.compile(r'\bdate\b', re.IGNORECASE),
+    'total_amount': re.compile(r'\b(?:grand\s*)?total\b|\bnet\s*(?:amount|payable)\b', re.IGNORECASE)
+}
+
+# Region around a label line, in multiples of the line height: values sit to
+# the right of the label or in the line(s) just below it
+REGION_ABOVE = 0.5
+REGION_BELOW = 2.5
+# Width kept to the left of the label start, as a fraction of the page width
+REGION_LEFT_MARGIN = 0.02
+# Cap per page so a page full of "Total" columns doesn't turn into a full-page OCR
+MAX_REGIONS_PER_PAGE = 6
+
+def group_lines(data):
+    """
+    Group tesseract image_to_data output into lines
+
+    Returns:
+        List of {'text', 'box': (left, top, right, bottom)} in pixels, in reading order
+    """
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word:
+            continue
+        key = (data['page_num'][i], data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        left, top = data['left'][i], data['top'][i]
+        right, bottom = left + data['width'][i], top + data['height'][i]
+        line = lines.get(key)
+        if line is None:
+            lines[key] = {'words': [word], 'box': [left, top, right, bottom]}
+        else:
+            line['words'].append(word)
+            box = line['box']
+            box[0], box[1] = min(box[0], left), min(box[1], top)
+            box[2], box[3] = max(box[2], right), max(box[3], bottom)
+    return [
+        {'text': ' '.join(line['words']), 'box': tuple(line['box'])}
+        for _, line in sorted(lines.items())
+    ]
+
+def find_label_regions(data, width, height):
+    """
+    Regions around the invoice number, date and total labels of one page
+
+    Args:
+        data: pytesseract image_to_data dict from the locate pass
+        width, height: Size of the image the locate pass ran on
+
+    Returns:
+        List of {'field', 'box': [x0, y0, x1, y1]} with coordinates as fractions of the page
+    """
+    regions = []
+    for line in group_lines(data):
+        left, top, right, bottom = line['box']
+        line_height = max(bottom - top, 1)
+        for field, pattern in LABEL_PATTERNS.items():
+            match = pattern.search(line['text'])
+            if not match:
+                continue
+            # Start at the label itself, not the start of the line
+            start = left + (right - left) * match.start() / max(len(line['text']), 1)
+            regions.append({
+                'field': field,
+                'box': [
+                    round(max(0.0, start / width - REGION_LEFT_MARGIN), 4),
+                    round(max(0.0, (top - REGION_ABOVE * line_height) / height), 4),
+                    1.0,
+                    round(min(1.0, (bottom + REGION_BELOW * line_height) / height), 4)
+                ]
+            })
+    # Totals are usually the lowest matches on a page, headers the highest
+    headers = [r for r in regions if r['field'] != 'total_amount'][:MAX_REGIONS_PER_PAGE // 2]
+    totals = [r for r in regions if r['field'] == 'total_amount'][-(MAX_REGIONS_PER_PAGE // 2):]
+    return headers + totals
+
+def _overlaps(a, b):
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
+
+def merge_boxes(regions):
+    """Merge overlapping region boxes so no part of the page is OCR'd twice"""
+    boxes = [list(r['box']) for r in regions]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box in boxes:
+            for other in result:
+                if _overlaps(box, other):
+                    other[0], other[1] = min(other[0], box[0]), min(other[1], box[1])
+                    other[2], other[3] = max(other[2], box[2]), max(other[3], box[3])
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    # Top to bottom, so region text keeps the page's reading order
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+def crop_box(image, box):
+    """Pixel crop of a fractional box"""
+    width, height = image.size
+    return image.crop((
+        int(box[0] * width), int(box[1] * height),
+        int(round(box[2] * width)), int(round(box[3] * height))
+    ))
+
+def covered_fraction(boxes):
+    """Share of the page covered by merged (non-overlapping) boxes"""
+    return round(sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes), 4)
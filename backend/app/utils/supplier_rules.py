@@ -0,0 +1,218 @@
+import re
+from datetime import datetime
+
+# Per-supplier field rules learned from user corrections.
+#
+# A rule records the label (anchor) in front of a field's value and, for
+# dates and amounts, the exact way the supplier writes them. Applying a rule
+# is one anchored regex and a single strptime / float conversion; fields a
+# rule can't read fall back to the generic patterns in field_extraction.
+# One correction yields candidate rules; SupplierTemplateService only applies
+# a rule once several corrections agree on it.
+
+# Date layouts tried when learning; applying uses only the learned one
+DATE_FORMATS = [
+    '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%m/%d/%Y', '%Y-%m-%d', '%Y/%m/%d',
+    '%d/%m/%y', '%d-%m-%y', '%d.%m.%y', '%m/%d/%y',
+    '%d %b %Y', '%d-%b-%Y', '%d-%b-%y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y'
+]
+
+# (thousands separator, decimal separator) conventions tried when learning amounts
+AMOUNT_CONVENTIONS = [(',', '.'), ('', '.'), ('.', ','), ('', ','), (' ', ','), (' ', '.')]
+
+# Label words kept in front of a value: enough for "Invoice No" or "Grand Total"
+ANCHOR_MAX_WORDS = 2
+
+_DIRECTIVE_REGEXES = {
+    '%d': r'\d{1,2}', '%m': r'\d{1,2}', '%Y': r'\d{4}', '%y': r'\d{2}',
+    '%b': r'[A-Za-z]{3}', '%B': r'[A-Za-z]{3,9}'
+}
+_DIRECTIVE_RE = re.compile(r'%[dmYybB]')
+_INVOICE_NUMBER_VALUE = r'([A-Z0-9][A-Z0-9\-./]*[A-Z0-9]|[A-Z0-9])'
+_SEPARATORS = ' \t:#-.'
+# Anchors that name the invoice number, preferred over other labels next to the same value (PO Ref, Order No)
+_INVOICE_NUMBER_LABEL = re.compile(r'\b(?:inv(?:oice)?|bill)\b', re.IGNORECASE)
+
+def _swapped_format(fmt):
+    """The DATE_FORMATS entry with day and month swapped (%d/%m/%Y <-> %m/%d/%Y), or None"""
+    swapped = fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+    return swapped if swapped != fmt and swapped in DATE_FORMATS else None
+
+def _render_date(date_obj, fmt, pad=True):
+    """strftime, optionally without zero padding on day and month"""
+    if not pad:
+        fmt = fmt.replace('%d', str(date_obj.day)).replace('%m', str(date_obj.month))
+    return date_obj.strftime(fmt)
+
+def _render_amount(value, thousands, decimal, places):
+    whole, frac = f"{abs(value):,.{places}f}".split('.') if places else (f"{abs(value):,.0f}", '')
+    whole = whole.replace(',', thousands)
+    return whole + (decimal + frac if places else '')
+
+def _find_all(text, needle):
+    """Positions (line index, start) of needle in text, bounded so it isn't part of a longer token"""
+    pattern = re.compile(r'(?<![\w.,])' + re.escape(needle) + r'(?![\w]|[.,]\d)', re.IGNORECASE)
+    hits = []
+    for index, line in enumerate(text.split('\n')):
+        for match in pattern.finditer(line):
+            hits.append((index, match.start()))
+    return hits
+
+def _find(text, needle, last=False):
+    """First (or last) position of needle in text, or None"""
+    hits = _find_all(text, needle)
+    if not hits:
+        return None
+    return hits[-1] if last else hits[0]
+
+def _anchor_words(fragment):
+    """The trailing label words of a text fragment, or None"""
+    words = []
+    for word in reversed(fragment.split()):
+        if not word.strip(_SEPARATORS):
+            continue
+        if any(c.isdigit() for c in word) or len(words) == ANCHOR_MAX_WORDS:
+            break
+        words.insert(0, word)
+    anchor = ' '.join(words).strip(_SEPARATORS)
+    return anchor if any(c.isalpha() for c in anchor) else None
+
+def _anchor_at(text, position):
+    """Label for a value found at (line index, start): text before it on the line, or the line above"""
+    lines = text.split('\n')
+    index, start = position
+    anchor = _anchor_words(lines[index][:start])
+    if anchor:
+        return anchor, 'right'
+    for previous in reversed(lines[:index]):
+        if previous.strip():
+            anchor = _anchor_words(previous)
+            return (anchor, 'below') if anchor else (None, None)
+    return None, None
+
+def candidate_rules(field, value, text):
+    """
+    Rules one corrected field could have been read with, from the invoice's OCR text
+
+    Args:
+        field: invoice_number, invoice_date or total_amount
+        value: The corrected value (invoice_date as YYYYMMDD or YYYY-MM-DD)
+        text: Stored raw OCR text of the invoice
+
+    Returns:
+        List of rule dicts, empty when the value can't be found in the text
+    """
+    if value in (None, '') or not text:
+        return []
+
+    if field == 'invoice_number':
+        fallback = None
+        for position in _find_all(text, str(value).strip()):
+            anchor, where = _anchor_at(text, position)
+            if not anchor:
+                continue
+            if _INVOICE_NUMBER_LABEL.search(anchor):
+                return [{'anchor': anchor, 'position': where}]
+            fallback = fallback or {'anchor': anchor, 'position': where}
+        return [fallback] if fallback else []
+
+    if field == 'invoice_date':
+        digits = str(value).replace('-', '').strip()
+        try:
+            date_obj = datetime.strptime(digits, '%Y%m%d')
+        except ValueError:
+            return []
+        # Every format the sample is found under. A day of 12 or less could be the month,
+        # so %d/%m and %m/%d both stay candidates until a later correction tells them apart
+        candidates = []
+        for fmt in DATE_FORMATS:
+            for pad in (True, False):
+                position = _find(text, _render_date(date_obj, fmt, pad))
+                if not position:
+                    continue
+                anchor, where = _anchor_at(text, position)
+                formats = [fmt]
+                if date_obj.day <= 12 and _swapped_format(fmt):
+                    formats.append(_swapped_format(fmt))
+                for candidate in formats:
+                    rule = {'anchor': anchor, 'position': where, 'format': candidate}
+                    if anchor and rule not in candidates:
+                        candidates.append(rule)
+                break
+        return candidates
+
+    if field == 'total_amount':
+        try:
+            amount = float(value)
+        except (TypeError, ValueError):
+            return []
+        for places in (2, 3, 0):
+            if places == 0 and amount != int(amount):
+                continue
+            for thousands, decimal in AMOUNT_CONVENTIONS:
+                # Totals sit at the bottom; prefer the last occurrence over a matching subtotal
+                position = _find(text, _render_amount(amount, thousands, decimal, places), last=True)
+                if position:
+                    anchor, where = _anchor_at(text, position)
+                    return [{'anchor': anchor, 'position': where, 'thousands': thousands, 'decimal': decimal}] if anchor else []
+        return []
+
+    return []
+
+def _date_regex(fmt):
+    parts = []
+    last = 0
+    for match in _DIRECTIVE_RE.finditer(fmt):
+        parts.append(re.escape(fmt[last:match.start()]).replace(r'\ ', r'\s+'))
+        parts.append(_DIRECTIVE_REGEXES[match.group(0)])
+        last = match.end()
+    parts.append(re.escape(fmt[last:]).replace(r'\ ', r'\s+'))
+    return '(' + ''.join(parts) + ')'
+
+def _value_regex(field, rule):
+    if field == 'invoice_number':
+        return _INVOICE_NUMBER_VALUE
+    if field == 'invoice_date':
+        return _date_regex(rule['format'])
+    # Optional currency code, then digits with only this supplier's separators
+    allowed = re.escape(rule.get('thousands', '') + rule.get('decimal', '.'))
+    return r'(?:[A-Z]{1,3}[\s.]*)?(\d[\d' + allowed + r']*\d|\d)'
+
+def _rule_regex(field, rule):
+    anchor = r'\s*'.join(re.escape(word) for word in rule['anchor'].split())
+    gap = r'[\s:#\-.]*' if rule.get('position') == 'right' else r'[^\n]*\n[\s:#\-.]*'
+    return re.compile(r'(?<![A-Za-z])' + anchor + gap + _value_regex(field, rule), re.IGNORECASE)
+
+def _parse(field, raw, rule):
+    if field == 'invoice_number':
+        return raw.strip()
+    if field == 'invoice_date':
+        return datetime.strptime(re.sub(r'\s+', ' ', raw.strip()), rule['format']).strftime('%Y%m%d')
+    raw = raw.strip().replace(' ', '')
+    if rule.get('thousands'):
+        raw = raw.replace(rule['thousands'], '')
+    return float(raw.replace(rule.get('decimal', '.'), '.'))
+
+def apply_field_rules(text, rules):
+    """
+    Read fields with a supplier's rules
+
+    Returns:
+        {field: {'value', 'pattern', 'match'}} for the fields whose rule matched
+    """
+    matches = {}
+    for field, rule in (rules or {}).items():
+        if not rule or not rule.get('anchor'):
+            continue
+        found = list(_rule_regex(field, rule).finditer(text or ''))
+        if not found:
+            continue
+        # Same preference as when learning: last total, first of everything else
+        for match in (reversed(found) if field == 'total_amount' else found):
+            try:
+                value = _parse(field, match.group(1), rule)
+            except ValueError:
+                continue
+            matches[field] = {'value': value, 'pattern': f"template:{rule['anchor']}", 'match': match.group(1)}
+            break
+    return matches
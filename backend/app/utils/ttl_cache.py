@@ -0,0 +1,47 @@
+import threading
+import time
+
+class TTLCache:
+    """Small thread-safe in-process cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            now = time.monotonic()
+            if len(self.entries) >= self.max_entries:
+                # Drop expired entries first, then the ones closest to expiring
+                for k in [k for k, (expires_at, _) in self.entries.items() if expires_at <= now]:
+                    del self.entries[k]
+                while len(self.entries) >= self.max_entries:
+                    del self.entries[min(self.entries, key=lambda k: self.entries[k][0])]
+            self.entries[key] = (now + self.ttl, value)
+
+    def get_or_compute(self, key, compute):
+        """Return (value, hit); compute() fills the cache on a miss"""
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.set(key, value)
+        return value, False
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+sys.path.insert(0, '.')
+
+from app import create_app
+from app.utils.ocr_helpers import extract_invoice_number, extract_invoice_date, extract_total_amount
+from app.utils.field_extraction import extract_fields
+
+ITERATIONS = int(os.getenv('BENCH_ITERATIONS', 50))
+
+def load_corpus():
+    """Stored OCR texts from invoice_ocr_results, plus any .txt samples in uploads/"""
+    texts = []
+    app = create_app()
+    with app.app_context():
+        from app.models.ocr_result import InvoiceOCRResult
+        for result in InvoiceOCRResult.query.all():
+            if result.raw_text:
+                texts.append(result.raw_text)
+    
+    if os.path.isdir('uploads'):
+        for name in sorted(os.listdir('uploads')):
+            if name.endswith('.txt'):
+                with open(os.path.join('uploads', name), encoding='utf-8', errors='ignore') as f:
+                    texts.append(f.read())
+    return texts
+
+def legacy_extract(text):
+    return {
+        'invoice_number': extract_invoice_number(text),
+        'invoice_date': extract_invoice_date(text),
+        'total_amount': extract_total_amount(text)
+    }
+
+def time_it(fn, texts):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for text in texts:
+            fn(text)
+    return time.perf_counter() - start
+
+texts = load_corpus()
+if not texts:
+    print("No OCR texts found (invoice_ocr_results is empty and uploads/ has no .txt files)")
+    exit()
+
+print(f"Corpus: {len(texts)} texts, {sum(len(t) for t in texts)} characters, {ITERATIONS} iterations")
+print("=" * 60)
+
+# Results must be identical before timings mean anything
+mismatches = [i for i, t in enumerate(texts) if legacy_extract(t) != extract_fields(t)]
+if mismatches:
+    print(f"✗ {len(mismatches)} texts extract differently, e.g. text #{mismatches[0]}:")
+    print(f"  legacy: {legacy_extract(texts[mismatches[0]])}")
+    print(f"  engine: {extract_fields(texts[mismatches[0]])}")
+else:
+    print("✓ Engine results identical to legacy extractors")
+
+legacy_time = time_it(legacy_extract, texts)
+engine_time = time_it(extract_fields, texts)
+calls = ITERATIONS * len(texts)
+
+print(f"\nLegacy extractors: {legacy_time:.3f}s ({legacy_time / calls * 1000:.3f} ms/text)")
+print(f"Single-pass engine: {engine_time:.3f}s ({engine_time / calls * 1000:.3f} ms/text)")
+print(f"Speedup: {legacy_time / engine_time:.1f}x")
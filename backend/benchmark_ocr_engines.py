@@ -0,0 +1,116 @@
+"""
+Compare OCR throughput of the pytesseract path (one tesseract process per
+page) with the pooled tesserocr engines (OCR_ENGINE=tesserocr).
+
+Pages are the images in uploads/ (and PDF pages, when poppler is installed),
+preprocessed once up front so only OCR is timed. Each page is also cut into a
+header crop, the size region OCR sends, where process startup weighs most.
+Run with: python benchmark_ocr_engines.py
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, '.')
+
+import pytesseract
+import pdf2image
+from PIL import Image
+from app.utils import image_preprocessing, ocr_engine
+from app.services.ocr_service import TESSERACT_CONFIG, PDF_DPI
+
+ITERATIONS = int(os.getenv('BENCH_ITERATIONS', 3))
+THREADS = int(os.getenv('BENCH_THREADS') or 0) or os.cpu_count() or 1
+MAX_PAGES = int(os.getenv('BENCH_MAX_PAGES', 10))
+
+def load_pages():
+    pages = []
+    if not os.path.isdir('uploads'):
+        return pages
+    for name in sorted(os.listdir('uploads')):
+        path = os.path.join('uploads', name)
+        ext = os.path.splitext(name)[1].lower()
+        try:
+            if ext in ('.png', '.jpg', '.jpeg', '.tif', '.tiff'):
+                pages.append(image_preprocessing.preprocess(Image.open(path), upscale_small=True)[0])
+            elif ext == '.pdf':
+                for image in pdf2image.convert_from_path(path, dpi=PDF_DPI, first_page=1, last_page=1):
+                    pages.append(image_preprocessing.preprocess(image)[0])
+        except Exception as e:
+            print(f"  skipped {name}: {e}")
+        if len(pages) >= MAX_PAGES:
+            break
+    return pages
+
+def header_crop(image):
+    return image.crop((0, 0, image.width, image.height // 4))
+
+def pytesseract_data(image):
+    return pytesseract.image_to_data(image, lang=ocr_engine.OCR_LANG, config=TESSERACT_CONFIG, output_type=pytesseract.Output.DICT)
+
+def available_engines():
+    engines = {}
+    try:
+        pytesseract.get_tesseract_version()
+        engines['pytesseract'] = pytesseract_data
+    except Exception as e:
+        print(f"  pytesseract unavailable: {e}")
+    if ocr_engine.tesserocr is not None:
+        pool = ocr_engine.TesseractEnginePool(THREADS, ocr_engine.OCR_LANG, TESSERACT_CONFIG)
+        try:
+            # Load the model outside the timings, as a running worker already has
+            pool.image_to_data(Image.new('L', (64, 64), 255))
+            engines['tesserocr'] = pool.image_to_data
+        except Exception as e:
+            print(f"  tesserocr unavailable: {e}")
+    else:
+        print("  tesserocr unavailable: not installed")
+    return engines
+
+def words(data):
+    return [w for w in data['text'] if w.strip()]
+
+def pages_per_second(fn, images, threads):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        if threads == 1:
+            for image in images:
+                fn(image)
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(fn, images))
+    return ITERATIONS * len(images) / (time.perf_counter() - start)
+
+pages = load_pages()
+if not pages:
+    print("No invoice images found in uploads/")
+    exit()
+
+engines = available_engines()
+if not engines:
+    print("No OCR engine available (install tesseract for pytesseract, or tesserocr)")
+    exit()
+
+crops = [header_crop(page) for page in pages]
+print(f"Pages: {len(pages)} full pages + {len(crops)} header crops, {ITERATIONS} iterations, {THREADS} threads")
+print("=" * 60)
+
+# Both engines must read the same words before timings mean anything
+if len(engines) == 2:
+    same = sum(words(engines['pytesseract'](p)) == words(engines['tesserocr'](p)) for p in pages)
+    print(f"{'✓' if same == len(pages) else '✗'} Identical words on {same}/{len(pages)} pages")
+
+results = {}
+for name, fn in engines.items():
+    for label, images in (('full page', pages), ('header crop', crops)):
+        for threads in sorted({1, THREADS}):
+            rate = pages_per_second(fn, images, threads)
+            results[(name, label, threads)] = rate
+            print(f"{name:12} {label:12} {threads:2} thread(s): {rate:7.2f} pages/s")
+
+if len(engines) == 2:
+    print()
+    for (name, label, threads), rate in results.items():
+        if name == 'tesserocr':
+            print(f"Speedup {label}, {threads} thread(s): {rate / results[('pytesseract', label, threads)]:.1f}x")
@@ -0,0 +1,220 @@
+"""
+Seed a production-sized dataset, run the API's hot queries and fail if any of
+them plans a sequential scan on a large table.
+
+Run with: PLAN_CHECK_DATABASE_URL=postgresql://.../scratch_db python check_query_plans.py
+Without PLAN_CHECK_DATABASE_URL a throwaway SQLite file is used (EXPLAIN QUERY PLAN).
+The target database is DROPPED and re-seeded - never point this at real data.
+
+Every statement the checked code paths execute is captured and EXPLAINed with
+its real parameters. Statements without a WHERE clause (unfiltered totals, full
+master data loads) are expected to read the whole table and are skipped; a
+check left with no statement to examine fails, as it proves nothing.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, '.')
+
+db_file = None
+if os.getenv('PLAN_CHECK_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['PLAN_CHECK_DATABASE_URL']
+else:
+    db_file = os.path.join(tempfile.mkdtemp(), 'plans.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+# Dataset size
+COUNTRIES = 7
+BRANDS = 20
+SUPPLIERS = int(os.getenv('PLAN_CHECK_SUPPLIERS', 5000))
+BUSINESS_UNITS = int(os.getenv('PLAN_CHECK_BUSINESS_UNITS', 2000))
+INVOICES = int(os.getenv('PLAN_CHECK_INVOICES', 20000))
+ITEMS_PER_INVOICE = int(os.getenv('PLAN_CHECK_ITEMS_PER_INVOICE', 20))
+
+# Sequential scans on these tables fail the check; the rest are small lookups
+LARGE_TABLES = {
+    'invoices', 'invoice_line_items', 'lpo_trackers', 'suppliers', 'business_units', 'companies',
+    'invoice_daily_stats'
+}
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from app.models.company import Company
+from app.models.user import User
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.lpo_tracker import LPOTracker
+from app.services.dashboard_stats import DashboardStatsService
+
+app = create_app()
+
+def insert_rows(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+
+def seed():
+    print(f"Seeding {INVOICES} invoices x {ITEMS_PER_INVOICE} items, {SUPPLIERS} suppliers, {BUSINESS_UNITS} BUs...")
+    start = time.perf_counter()
+    db.drop_all()
+    db.create_all()
+
+    user = User(email='plans@example.com', name='Plan Check')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+
+    insert_rows(Country, [{'id': i, 'country_name': f'Country {i}'} for i in range(1, COUNTRIES + 1)])
+    insert_rows(Brand, [{'id': i, 'brand_name': f'Brand {i}', 'brand_code': f'{i:02d}'} for i in range(1, BRANDS + 1)])
+    insert_rows(Company, [
+        {'id': i, 'company_name': f'Company {i}', 'company_code': f'C{i}',
+         'brand_id': i % BRANDS + 1, 'country_id': i % COUNTRIES + 1}
+        for i in range(1, COUNTRIES * BRANDS + 1)
+    ])
+    insert_rows(Supplier, [
+        {'id': i, 'supplier_name': f'Supplier {i}', 'supplier_code': f'{i:05d}',
+         'brand_id': i % BRANDS + 1, 'country_id': i % COUNTRIES + 1}
+        for i in range(1, SUPPLIERS + 1)
+    ])
+    insert_rows(BusinessUnit, [
+        {'id': i, 'bu_code': f'B{i:05d}', 'store_name': f'Store {i}',
+         'brand_id': i % BRANDS + 1, 'country_id': i % COUNTRIES + 1}
+        for i in range(1, BUSINESS_UNITS + 1)
+    ])
+
+    # Two years of invoices, mostly processed
+    now = datetime.utcnow()
+    invoices = []
+    trackers = []
+    items = []
+    for i in range(1, INVOICES + 1):
+        bu_id = i % BUSINESS_UNITS + 1
+        country_id = bu_id % COUNTRIES + 1
+        invoices.append({
+            'id': i, 'user_id': user.id, 'invoice_number': f'INV-{i}', 'country_id': country_id,
+            'brand_id': bu_id % BRANDS + 1, 'bu_id': bu_id, 'supplier_id': i % SUPPLIERS + 1,
+            'currency': 'QAR', 'total_amount': float(i % 5000), 'status': 'pending' if i % 50 == 0 else 'processed',
+            'created_at': now - timedelta(minutes=(INVOICES - i) * 730 * 24 * 60 // INVOICES)
+        })
+        trackers.append({
+            'invoice_id': i, 'country_id': country_id, 'bu_id': bu_id,
+            'serial_number': f'B{bu_id:05d}-{i:06d}', 'shipment_status': 'Delivered' if i % 10 else 'In Transit',
+            'ticket_no': f'T{i:06d}', 'shipment_no': f'S{i:06d}', 'created_at': invoices[-1]['created_at']
+        })
+        for n in range(ITEMS_PER_INVOICE):
+            items.append({'invoice_id': i, 'itemcode': f'{i}-{n}', 'quantity': n + 1})
+    insert_rows(Invoice, invoices)
+    insert_rows(LPOTracker, trackers)
+    insert_rows(InvoiceItem, items)
+    db.session.commit()
+    # Core inserts bypass the rollup hooks
+    DashboardStatsService.rebuild()
+
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('ANALYZE')
+        conn.commit()
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+    return create_access_token(identity=str(user.id))
+
+def capture(fn):
+    """Run fn and return the (statement, parameters) pairs it executed"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+def sequential_scans(statement, parameters):
+    """Return descriptions of sequential scans on LARGE_TABLES in the statement's plan"""
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'postgresql':
+            plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+            found = []
+
+            def walk(node):
+                if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+                    found.append(f"Seq Scan on {node['Relation Name']}")
+                for child in node.get('Plans', []):
+                    walk(child)
+
+            walk(plan[0]['Plan'])
+            return found
+
+        details = [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        # A rowid-ordered walk that stops at LIMIT shows as a bare 'SCAN t' too; it is
+        # only a full read when the rows must be sorted afterwards
+        ordered_limit = re.search(r'\bLIMIT\b', statement, re.IGNORECASE) and \
+            not any('TEMP B-TREE' in detail for detail in details)
+        found = []
+        for detail in details:
+            words = detail.split()
+            # 'SCAN t' reads the whole table; 'SCAN t USING INDEX' / 'SEARCH t ...' do not
+            if words[0] == 'SCAN' and 'USING' not in words and words[1] in LARGE_TABLES and not ordered_limit:
+                found.append(detail)
+        return found
+
+def get(client, url, headers):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, (url, response.status_code, response.get_json())
+
+failed = False
+with app.app_context():
+    token = seed()
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    mid_invoice = INVOICES // 2
+    recent = (datetime.utcnow() - timedelta(days=30)).date().isoformat()
+
+    checks = [
+        ('Suppliers by country and brand', lambda: Supplier.query.filter_by(country_id=3, brand_id=4).all()),
+        ('Business units by country and brand', lambda: BusinessUnit.query.filter_by(country_id=3, brand_id=4).all()),
+        ('Company by brand and country', lambda: Company.query.filter_by(brand_id=4, country_id=3).first()),
+        ('Invoice detail with items', lambda: get(client, f'/api/invoices/{mid_invoice}', headers)),
+        ('Invoice list summaries', lambda: get(client, '/api/invoices/user?page=50&per_page=20', headers)),
+        ('Dashboard stats', lambda: get(client, '/api/dashboard/stats', headers)),
+        ('Tracker page by country and BU', lambda: get(client, '/api/tracker/country/3?bu_id=9&limit=50', headers)),
+        ('Tracker page by status', lambda: get(client, '/api/tracker/all?shipment_status=In%20Transit&limit=50', headers)),
+        ('Tracker ticket prefix search', lambda: get(client, '/api/tracker/all?ticket_no=T0001&limit=50', headers)),
+        ('Timeseries by supplier, last month', lambda: get(client, f'/api/dashboard/timeseries?interval=week&from={recent}&group_by=supplier', headers)),
+        ('Tracker status distribution, last month', lambda: get(client, f'/api/dashboard/tracker-status?from={recent}', headers)),
+    ]
+
+    for name, fn in checks:
+        problems = []
+        checked = 0
+        for statement, parameters in capture(fn):
+            if not re.search(r'\bWHERE\b', statement, re.IGNORECASE):
+                continue
+            checked += 1
+            for scan in sequential_scans(statement, parameters):
+                problems.append(f"{scan}\n      in: {' '.join(statement.split())[:200]}")
+
+        if not checked:
+            failed = True
+            print(f"✗ {name}: no filtered statement to examine")
+        elif problems:
+            failed = True
+            print(f"✗ {name}")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            print(f"✓ {name}: {checked} statement(s), no sequential scans")
+
+if db_file:
+    os.remove(db_file)
+
+sys.exit(1 if failed else 0)
@@ -15,23 +15,27 @@ def debug_invoice():
         print(f"File Path: '{invoice.invoice_file_path}'")
         
         print("\n--- RAW OCR TEXT ---")
-        # Raw text is not stored in the model's to_dict but it is in the ocr_data temporarily.
-        # However, we don't store it in the DB. 
-        # I'll check if I can re-run OCR on the file or if I added it to the model.
-        # Looking at models/invoice.py... it doesn't have a raw_text field.
-        # I'll re-run OCR on the file path.
-        from app.services.ocr_service import OCRService
-        try:
-            # Handle relative path if necessary
-            path = invoice.invoice_file_path
-            if path.startswith('./'):
-                import os
-                path = os.path.join(os.getcwd(), path[2:])
+        # Raw text is stored in invoice_ocr_results by the OCR worker.
+        # Older invoices have no stored result, so fall back to re-running OCR on the file.
+        if invoice.ocr_result:
+            print(invoice.ocr_result.raw_text)
             
-            data = OCRService.extract_invoice_data(path)
-            print(data.get('raw_text', 'No text extracted'))
-        except Exception as e:
-            print(f"Error re-running OCR: {e}")
+            print("\n--- FIELD MATCHES ---")
+            for field, info in (invoice.ocr_result.field_matches or {}).items():
+                print(f" - {field}: '{info.get('match')}' (confidence: {info.get('confidence')}, pattern: {info.get('pattern')})")
+        else:
+            from app.services.ocr_service import OCRService
+            try:
+                # Handle relative path if necessary
+                path = invoice.invoice_file_path
+                if path.startswith('./'):
+                    import os
+                    path = os.path.join(os.getcwd(), path[2:])
+                
+                data = OCRService.extract_invoice_data(path)
+                print(data.get('raw_text', 'No text extracted'))
+            except Exception as e:
+                print(f"Error re-running OCR: {e}")
 
         print("\n--- ITEMS ---")
         for item in invoice.items:
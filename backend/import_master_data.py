@@ -1,5 +1,7 @@
 import openpyxl
 import os
+import sys
+import time
 from app import create_app, db
 from app.models.country import Country
 from app.models.brand import Brand
@@ -7,162 +9,249 @@ from app.models.company import Company
 from app.models.supplier import Supplier
 from app.models.business_unit import BusinessUnit
 from app.models.invoice import Invoice # To ensure it is loaded if needed
+from app.services.master_data_cache import master_data_cache
 
-DATA_DIR = r"C:\Users\Lenovo\Desktop\Projects\LPOs Automation\excel-sheets-dbupload"
+# Folder holding the four master data sheets; override with MASTER_DATA_DIR or the first CLI argument
+DATA_DIR = os.getenv(
+    'MASTER_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'excel-sheets-dbupload')
+)
 
-def read_excel(filename):
-    path = os.path.join(DATA_DIR, filename)
+# Rows per executemany round trip
+UPSERT_BATCH_SIZE = 1000
+
+def read_excel(filename, data_dir=None):
+    """Stream a sheet in read-only mode and return its rows as dicts keyed by header"""
+    path = os.path.join(data_dir or DATA_DIR, filename)
     if not os.path.exists(path):
         print(f"[WARN] File not found: {path}")
         return []
-    
-    wb = openpyxl.load_workbook(path)
-    sheet = wb.active
-    rows = list(sheet.iter_rows(values_only=True))
-    header = rows[0]
-    data = []
-    for row in rows[1:]:
-        if not any(row): continue # Skip empty rows
-        # Create dict using header
-        # Normalize header: trim, lower? Users headers seem clean e.g. 'brand_name'
-        row_dict = {}
-        for i, h in enumerate(header):
-            if h:
-                row_dict[str(h).strip()] = row[i]
-        data.append(row_dict)
-    return data
-
-def import_master_data():
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = wb.active
+        # Some exporters write a wrong <dimension>, which truncates read-only iteration
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return []
+        columns = [(i, str(h).strip()) for i, h in enumerate(header) if h]
+
+        data = []
+        for row in rows:
+            if not any(row): continue # Skip empty rows
+            data.append({name: row[i] if i < len(row) else None for i, name in columns})
+        return data
+    finally:
+        wb.close()
+
+def _clean(value):
+    return str(value).strip()
+
+def _insert(table):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def upsert(model, rows, key_columns, update_columns):
+    """
+    Diff rows against the table by natural key and upsert only new or changed rows
+
+    Existing rows are read in one query; the changed rows are written with
+    INSERT ... ON CONFLICT DO UPDATE in batches. Within rows the first occurrence
+    of a key wins. Runs in the caller's transaction.
+
+    Returns:
+        Summary dict with rows read, inserted, updated and unchanged
+    """
+    table = model.__table__
+
+    incoming = {}
+    for row in rows:
+        incoming.setdefault(tuple(row[c] for c in key_columns), row)
+
+    existing = {
+        tuple(r[:len(key_columns)]): tuple(r[len(key_columns):])
+        for r in db.session.execute(
+            db.select(*[table.c[c] for c in key_columns + update_columns])
+        )
+    }
+
+    inserts = []
+    updates = []
+    for key, row in incoming.items():
+        if key not in existing:
+            inserts.append(row)
+        elif existing[key] != tuple(row[c] for c in update_columns):
+            updates.append(row)
+
+    changed = inserts + updates
+    if changed:
+        stmt = _insert(table)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c[c] for c in key_columns],
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[table.c[c] for c in key_columns])
+        for start in range(0, len(changed), UPSERT_BATCH_SIZE):
+            db.session.execute(stmt, changed[start:start + UPSERT_BATCH_SIZE])
+
+    return {
+        'read': len(rows),
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'unchanged': len(incoming) - len(changed)
+    }
+
+def import_master_data(data_dir=None):
     app = create_app()
     with app.app_context():
         print("--- Starting Master Data Import ---")
-        
+        print(f"Reading sheets from: {os.path.abspath(data_dir or DATA_DIR)}")
+
+        summary = {}
+        start = time.perf_counter()
+
         # Files
-        brands_data = read_excel("Brands Sheet.xlsx")
-        suppliers_data = read_excel("Suppliers Sheet.xlsx")
-        bu_data = read_excel("Business Units Sheet.xlsx")
-        companies_data = read_excel("Companies Sheet.xlsx")
-        
-        # 1. Harvest Countries
-        print("Step 1: Extracting Countries...")
-        country_names = set()
-        
-        # From Suppliers
-        for row in suppliers_data:
-            c = row.get('country_name') or row.get('Country')
-            if c: country_names.add(str(c).strip())
-            
-        # From Companies
-        for row in companies_data:
-            c = row.get('country_name') or row.get('Country')
-            if c: country_names.add(str(c).strip())
-            
-        # From BUs
-        for row in bu_data:
-            c = row.get('country_name') or row.get('Country')
-            if c: country_names.add(str(c).strip())
-            
-        print(f"Found {len(country_names)} unique countries: {country_names}")
-        
-        # Insert Countries
-        for name in country_names:
-            if not Country.query.filter_by(country_name=name).first():
-                db.session.add(Country(country_name=name))
-        db.session.commit()
-        
-        # Build Country Map
-        country_map = {c.country_name: c.id for c in Country.query.all()}
-        
-        # 2. Brands
-        print("Step 2: Importing Brands...")
-        for row in brands_data:
-            name = row.get('brand_name') or row.get('Brand')
-            code = row.get('brand_code') or row.get('BrandCode')
-            if name and code:
-                name = str(name).strip()
-                code = str(code).strip()
-                if not Brand.query.filter_by(brand_code=code).first():
-                    db.session.add(Brand(brand_name=name, brand_code=code))
-        db.session.commit()
-        
-        # Build Brand Map
-        brand_map = {b.brand_name: b.id for b in Brand.query.all()} # Access by Name
-        
-        # 3. Companies
-        print("Step 3: Importing Companies...")
-        for row in companies_data:
-            brand_name = str(row.get('brand_name') or row.get('Brand')).strip()
-            country_name = str(row.get('country_name') or row.get('Country')).strip()
-            comp_name = row.get('company_name') or row.get('CompanyName')
-            comp_code = row.get('company_code') or row.get('CompanyCode')
-            
-            b_id = brand_map.get(brand_name)
-            c_id = country_map.get(country_name)
-            
-            if b_id and c_id and comp_name and comp_code:
-                 if not Company.query.filter_by(company_code=str(comp_code).strip()).first():
-                     db.session.add(Company(
-                         company_name=str(comp_name).strip(),
-                         company_code=str(comp_code).strip(),
-                         brand_id=b_id,
-                         country_id=c_id
-                     ))
-            else:
-                print(f"[WARN] Skipping Company: {comp_name}. Missing dependencies (Brand: {brand_name}->{b_id}, Country: {country_name}->{c_id})")
-        db.session.commit()
-
-        # 4. Suppliers
-        print("Step 4: Importing Suppliers...")
-        for row in suppliers_data:
-            brand_name = str(row.get('brand_name') or row.get('Brand')).strip()
-            country_name = str(row.get('country_name') or row.get('Country')).strip()
-            name = row.get('supplier_name') or row.get('Supplier')
-            code = row.get('supplier_code') or row.get('SupplierCode')
-            addr = row.get('supplier_address') or row.get('SupplierAddress')
-            
-            b_id = brand_map.get(brand_name)
-            c_id = country_map.get(country_name)
-            
-            if b_id and c_id and name and code:
-                # Check if exists for THIS Country/Brand
-                if not Supplier.query.filter_by(supplier_code=str(code).strip(), country_id=c_id).first():
-                    db.session.add(Supplier(
-                        supplier_name=str(name).strip(),
-                        supplier_code=str(code).strip(),
-                        supplier_address=str(addr).strip() if addr else None,
-                        brand_id=b_id,
-                        country_id=c_id
-                    ))
+        brands_data = read_excel("Brands Sheet.xlsx", data_dir)
+        suppliers_data = read_excel("Suppliers Sheet.xlsx", data_dir)
+        bu_data = read_excel("Business Units Sheet.xlsx", data_dir)
+        companies_data = read_excel("Companies Sheet.xlsx", data_dir)
+        read_ms = (time.perf_counter() - start) * 1000
+
+        def timed(name, fn):
+            stage_start = time.perf_counter()
+            result = fn()
+            result['ms'] = (time.perf_counter() - stage_start) * 1000
+            summary[name] = result
+
+        try:
+            # 1. Harvest Countries from Suppliers, Companies and BUs
+            print("Step 1: Extracting Countries...")
+            country_names = set()
+            for row in suppliers_data + companies_data + bu_data:
+                c = row.get('country_name') or row.get('Country')
+                if c: country_names.add(_clean(c))
+            print(f"Found {len(country_names)} unique countries: {country_names}")
+
+            timed('countries', lambda: upsert(
+                Country, [{'country_name': name} for name in sorted(country_names)], ['country_name'], []
+            ))
+            country_map = {c.country_name: c.id for c in Country.query.all()}
+
+            # 2. Brands
+            print("Step 2: Importing Brands...")
+            brand_rows = []
+            for row in brands_data:
+                name = row.get('brand_name') or row.get('Brand')
+                code = row.get('brand_code') or row.get('BrandCode')
+                if name and code:
+                    brand_rows.append({'brand_name': _clean(name), 'brand_code': _clean(code)})
+            timed('brands', lambda: upsert(Brand, brand_rows, ['brand_code'], ['brand_name']))
+
+            # Build Brand Map
+            brand_map = {b.brand_name: b.id for b in Brand.query.all()} # Access by Name
+
+            # 3. Companies
+            print("Step 3: Importing Companies...")
+            company_rows = []
+            for row in companies_data:
+                brand_name = _clean(row.get('brand_name') or row.get('Brand'))
+                country_name = _clean(row.get('country_name') or row.get('Country'))
+                comp_name = row.get('company_name') or row.get('CompanyName')
+                comp_code = row.get('company_code') or row.get('CompanyCode')
+
+                b_id = brand_map.get(brand_name)
+                c_id = country_map.get(country_name)
+
+                if b_id and c_id and comp_name and comp_code:
+                    company_rows.append({
+                        'company_name': _clean(comp_name),
+                        'company_code': _clean(comp_code),
+                        'brand_id': b_id,
+                        'country_id': c_id
+                    })
+                else:
+                    print(f"[WARN] Skipping Company: {comp_name}. Missing dependencies (Brand: {brand_name}->{b_id}, Country: {country_name}->{c_id})")
+            timed('companies', lambda: upsert(
+                Company, company_rows, ['company_code'], ['company_name', 'brand_id', 'country_id']
+            ))
+
+            # 4. Suppliers
+            print("Step 4: Importing Suppliers...")
+            supplier_rows = []
+            for row in suppliers_data:
+                brand_name = _clean(row.get('brand_name') or row.get('Brand'))
+                country_name = _clean(row.get('country_name') or row.get('Country'))
+                name = row.get('supplier_name') or row.get('Supplier')
+                code = row.get('supplier_code') or row.get('SupplierCode')
+                addr = row.get('supplier_address') or row.get('SupplierAddress')
+
+                b_id = brand_map.get(brand_name)
+                c_id = country_map.get(country_name)
+
+                if b_id and c_id and name and code:
+                    supplier_rows.append({
+                        'supplier_name': _clean(name),
+                        'supplier_code': _clean(code),
+                        'supplier_address': _clean(addr) if addr else None,
+                        'brand_id': b_id,
+                        'country_id': c_id
+                    })
+                else:
+                    print(f"[WARN] Skipping Supplier: {name}. Missing dependencies. Brand: '{brand_name}' -> {b_id}, Country: '{country_name}' -> {c_id}, Code: {code}")
+            timed('suppliers', lambda: upsert(
+                Supplier, supplier_rows, ['supplier_code', 'country_id'],
+                ['supplier_name', 'supplier_address', 'brand_id']
+            ))
+
+            # 5. Business Units
+            print("Step 5: Importing Business Units...")
+            bu_rows = []
+            for row in bu_data:
+                brand_name = _clean(row.get('brand_name') or row.get('Brand'))
+                country_name = _clean(row.get('country_name') or row.get('Country'))
+                store_name = row.get('store_name') or row.get('Store')
+                bu_code = row.get('bu_code') or row.get('BUCode')
+
+                b_id = brand_map.get(brand_name)
+                c_id = country_map.get(country_name)
+
+                if b_id and c_id and store_name and bu_code:
+                    bu_rows.append({
+                        'store_name': _clean(store_name),
+                        'bu_code': _clean(bu_code),
+                        'brand_id': b_id,
+                        'country_id': c_id
+                    })
                 else:
-                    print(f"[INFO] Skipping Supplier: {name} (Code: {code}) for Country ID {c_id}. Already exists.")
-            else:
-                 print(f"[WARN] Skipping Supplier: {name}. Missing dependencies. Brand: '{brand_name}' -> {b_id}, Country: '{country_name}' -> {c_id}, Code: {code}")
-        db.session.commit()
-
-        # 5. Business Units
-        print("Step 5: Importing Business Units...")
-        for row in bu_data:
-            brand_name = str(row.get('brand_name') or row.get('Brand')).strip()
-            country_name = str(row.get('country_name') or row.get('Country')).strip()
-            store_name = row.get('store_name') or row.get('Store')
-            bu_code = row.get('bu_code') or row.get('BUCode')
-            
-            b_id = brand_map.get(brand_name)
-            c_id = country_map.get(country_name)
-            
-            if b_id and c_id and store_name and bu_code:
-                if not BusinessUnit.query.filter_by(bu_code=str(bu_code).strip(), country_id=c_id).first():
-                    db.session.add(BusinessUnit(
-                        store_name=str(store_name).strip(),
-                        bu_code=str(bu_code).strip(),
-                        brand_id=b_id,
-                        country_id=c_id
-                    ))
-            else:
-                print(f"[WARN] Skipping BU: {store_name}. Missing dependencies.")
-        db.session.commit()
-        
+                    print(f"[WARN] Skipping BU: {store_name}. Missing dependencies.")
+            timed('business_units', lambda: upsert(
+                BusinessUnit, bu_rows, ['bu_code', 'country_id'], ['store_name', 'brand_id']
+            ))
+
+            # Tell running servers to reload their master data cache
+            master_data_cache.bump_version()
+
+            # Everything above lands in a single transaction
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Master data import failed, nothing was written: {str(e)}")
+            raise
+
+        print(f"\n{'table':<16}{'read':>8}{'inserted':>10}{'updated':>9}{'unchanged':>11}{'ms':>9}")
+        for name, result in summary.items():
+            print(f"{name:<16}{result['read']:>8}{result['inserted']:>10}{result['updated']:>9}{result['unchanged']:>11}{result['ms']:>9.1f}")
+        print(f"Read sheets in {read_ms:.1f} ms, total {(time.perf_counter() - start) * 1000:.1f} ms")
+
         print("✅ Master Data Import Completed!")
+        return summary
 
 if __name__ == "__main__":
-    import_master_data()
+    import_master_data(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,34 +1,157 @@
+"""
+Versioned schema migrations for existing databases.
+
+New tables are created by db.create_all() when the app starts; migrations cover
+changes to tables that already exist (new columns, indexes, constraints). Each
+migration runs once, in its own transaction, and is recorded in schema_migrations.
+Migrations listed in AUTOCOMMIT run statement by statement outside a transaction
+instead, so they can build indexes CONCURRENTLY without blocking writes.
+
+Usage:
+    python migrate_db.py           Apply pending migrations
+    python migrate_db.py status    List applied and pending migrations
+"""
+
+import sys
 from app import create_app, db
 from sqlalchemy import text
 
-app = create_app()
+# (version, description, statements) - append only, never edit an applied migration
+MIGRATIONS = [
+    ('0001', 'Invoice file paths', [
+        "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS supporting_file_path VARCHAR(255)",
+        "ALTER TABLE invoices ADD COLUMN IF NOT EXISTS invoice_file_path VARCHAR(255)",
+    ]),
+    ('0002', 'Line item cost and retail', [
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS unit_cost FLOAT",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS unit_retail FLOAT",
+    ]),
+    ('0003', 'IM Creation fields on line items', [
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS item_description VARCHAR(255)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS mancode VARCHAR(255)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS brand_code VARCHAR(100)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS supplier_code VARCHAR(100)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS section VARCHAR(255)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS family VARCHAR(255)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS subfamily VARCHAR(255)",
+        "ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS alternate_code VARCHAR(255)",
+    ]),
+    ('0004', 'Per-page text layer / OCR source on stored OCR results', [
+        "ALTER TABLE invoice_ocr_results ADD COLUMN IF NOT EXISTS page_sources JSON",
+    ]),
+    ('0005', 'Tracker listing filters and keyset pagination', [
+        "CREATE INDEX IF NOT EXISTS ix_lpo_trackers_country_bu_serial ON lpo_trackers (country_id, bu_id, serial_number)",
+        "CREATE INDEX IF NOT EXISTS ix_lpo_trackers_created_at_id ON lpo_trackers (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_lpo_trackers_shipment_status ON lpo_trackers (shipment_status)",
+        "CREATE INDEX IF NOT EXISTS ix_lpo_trackers_ticket_no ON lpo_trackers (ticket_no varchar_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_lpo_trackers_shipment_no ON lpo_trackers (shipment_no varchar_pattern_ops)",
+    ]),
+    ('0006', 'Natural keys for the master data import upserts', [
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_suppliers_code_country ON suppliers (supplier_code, country_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_business_units_code_country ON business_units (bu_code, country_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_companies_code ON companies (company_code)",
+    ]),
+    ('0007', 'Hot lookup path indexes', [
+        "CREATE INDEX IF NOT EXISTS ix_suppliers_country_brand ON suppliers (country_id, brand_id)",
+        "CREATE INDEX IF NOT EXISTS ix_business_units_country_brand ON business_units (country_id, brand_id)",
+        "CREATE INDEX IF NOT EXISTS ix_companies_brand_country ON companies (brand_id, country_id)",
+        "CREATE INDEX IF NOT EXISTS ix_invoices_status ON invoices (status)",
+        "CREATE INDEX IF NOT EXISTS ix_invoices_created_at ON invoices (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_invoice_line_items_invoice_id ON invoice_line_items (invoice_id)",
+        "ANALYZE invoices",
+        "ANALYZE invoice_line_items",
+    ]),
+    # Each replacement is built under a temporary name, swapped in for the old index and
+    # renamed; a leftover (possibly invalid) index from an interrupted run is dropped first
+    ('0008', 'Covering columns for dashboard analytics', [
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invoices_created_at_new",
+        "CREATE INDEX CONCURRENTLY ix_invoices_created_at_new ON invoices (created_at) "
+        "INCLUDE (country_id, brand_id, bu_id, supplier_id, total_amount)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invoices_created_at",
+        "ALTER INDEX ix_invoices_created_at_new RENAME TO ix_invoices_created_at",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invoice_line_items_invoice_id_new",
+        "CREATE INDEX CONCURRENTLY ix_invoice_line_items_invoice_id_new ON invoice_line_items (invoice_id) INCLUDE (quantity)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invoice_line_items_invoice_id",
+        "ALTER INDEX ix_invoice_line_items_invoice_id_new RENAME TO ix_invoice_line_items_invoice_id",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_lpo_trackers_created_at_status",
+        "CREATE INDEX CONCURRENTLY ix_lpo_trackers_created_at_status ON lpo_trackers (created_at) "
+        "INCLUDE (shipment_status, country_id, bu_id)",
+    ]),
+    ('0009', 'Supplier field rules learned from corrections', [
+        "ALTER TABLE supplier_templates ADD COLUMN IF NOT EXISTS field_rules JSON",
+        "ALTER TABLE supplier_templates ADD COLUMN IF NOT EXISTS corrections INTEGER NOT NULL DEFAULT 0",
+    ]),
+    ('0010', 'Region OCR text kept next to the page text', [
+        "ALTER TABLE invoice_ocr_results ADD COLUMN IF NOT EXISTS region_text_z BYTEA",
+    ]),
+    ('0011', 'Supplier field rules awaiting agreement', [
+        "ALTER TABLE supplier_templates ADD COLUMN IF NOT EXISTS rule_candidates JSON",
+    ]),
+]
+
+# Versions whose statements run in autocommit mode (CREATE/DROP INDEX CONCURRENTLY cannot run
+# in a transaction). They must be safe to re-run, as a failure leaves earlier statements applied.
+AUTOCOMMIT = {'0008'}
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(20) PRIMARY KEY, "
+        "description VARCHAR(255), "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+def _applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
 
 def migrate():
+    app = create_app()
     with app.app_context():
-        try:
-            with db.engine.connect() as conn:
-                # Add columns to invoices table
-                conn.execute(text("ALTER TABLE invoices ADD COLUMN IF NOT EXISTS supporting_file_path VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoices ADD COLUMN IF NOT EXISTS invoice_file_path VARCHAR(255)"))
-                
-                # Add columns to invoice_line_items table (correct table name)
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS unit_cost FLOAT"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS unit_retail FLOAT"))
-                
-                # Add IM Creation fields to invoice_line_items table
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS item_description VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS mancode VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS brand_code VARCHAR(100)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS supplier_code VARCHAR(100)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS section VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS family VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS subfamily VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE invoice_line_items ADD COLUMN IF NOT EXISTS alternate_code VARCHAR(255)"))
-                
-                conn.commit()
-                print("Migration successful: Added missing columns if they didn't exist.")
-        except Exception as e:
-            print(f"Migration failed: {e}")
+        with db.engine.connect() as conn:
+            _ensure_migrations_table(conn)
+            conn.commit()
+            applied = _applied_versions(conn)
+
+        pending = [m for m in MIGRATIONS if m[0] not in applied]
+        if not pending:
+            print("Database is up to date.")
+            return True
+
+        for version, description, statements in pending:
+            try:
+                if version in AUTOCOMMIT:
+                    connection = db.engine.execution_options(isolation_level='AUTOCOMMIT').connect()
+                else:
+                    # One transaction per migration: a failure leaves earlier ones applied
+                    connection = db.engine.begin()
+                with connection as conn:
+                    for statement in statements:
+                        conn.execute(text(statement))
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                        {'version': version, 'description': description}
+                    )
+                print(f"Applied {version}: {description}")
+            except Exception as e:
+                print(f"Migration {version} failed: {e}")
+                return False
+
+        print(f"Migration successful: applied {len(pending)} migration(s).")
+        return True
+
+def status():
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            _ensure_migrations_table(conn)
+            conn.commit()
+            applied = _applied_versions(conn)
+
+        for version, description, _ in MIGRATIONS:
+            print(f"[{'x' if version in applied else ' '}] {version} {description}")
 
 if __name__ == "__main__":
-    migrate()
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        status()
+    else:
+        sys.exit(0 if migrate() else 1)
@@ -0,0 +1,19 @@
+"""
+Recompute the dashboard rollup (invoice_daily_stats) from the invoices table.
+Run after backfills, bulk imports or any write that bypasses the ORM.
+Run with: python rebuild_dashboard_stats.py
+"""
+
+import time
+from app import create_app
+from app.services.dashboard_stats import DashboardStatsService
+
+def rebuild_dashboard_stats():
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        rows = DashboardStatsService.rebuild()
+        print(f"✅ Rebuilt dashboard stats: {rows} rollup rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    rebuild_dashboard_stats()
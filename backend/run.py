@@ -3,5 +3,10 @@ import os
 
 app = create_app()
 
+# Under the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    from app.services.ocr_queue import ocr_queue
+    ocr_queue.resume_pending()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,208 @@
+"""
+Check the batch upload endpoint: zip archives pair files by folder and by base
+name, paired file lists honour per-item overrides, and every pair ends up as
+an invoice with its line items, streamed from the sheet in batches. Finished jobs are pruned, and invoices left in
+processing by a previous run are re-queued.
+Run with: python test_batch_upload.py (uses a throwaway SQLite database and upload folder)
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+sys.path.insert(0, '.')
+
+workdir = tempfile.mkdtemp(prefix='batch_upload_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+os.environ['OCR_CACHE_DIR'] = os.path.join(workdir, 'ocr_cache')
+
+import openpyxl
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+
+app = create_app()
+client = app.test_client()
+
+def sheet_bytes(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Decathlon SKU', 'Item Description', 'Quantity', 'Unit Cost'])
+    for i in range(rows):
+        ws.append([f'{8000000 + i}', f'Item {i}', i + 1, 10.0])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+PDF = b'%PDF-1.4\n%placeholder\n'
+
+with app.app_context():
+    user = User(email='batch@example.com', name='Batch Test')
+    user.set_password('password123')
+    other = User(email='other@example.com', name='Other')
+    other.set_password('password123')
+    country = Country(country_name='Qatar')
+    brand = Brand(brand_name='Decathlon', brand_code='54')
+    db.session.add_all([user, other, country, brand])
+    db.session.flush()
+    bu = BusinessUnit(bu_code='QDC01', store_name='Store', brand_id=brand.id, country_id=country.id)
+    suppliers = [
+        Supplier(supplier_name='Supplier A', supplier_code='1111', brand_id=brand.id, country_id=country.id),
+        Supplier(supplier_name='Supplier B', supplier_code='2222', brand_id=brand.id, country_id=country.id)
+    ]
+    db.session.add_all([bu] + suppliers)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    other_headers = {'Authorization': f'Bearer {create_access_token(identity=str(other.id))}'}
+    defaults = {
+        'country_id': str(country.id), 'brand_id': str(brand.id),
+        'business_unit_id': str(bu.id), 'supplier_id': str(suppliers[0].id)
+    }
+    supplier_b = suppliers[1].id
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+def wait_for(batch_id):
+    for _ in range(100):
+        batch = client.get(f'/api/invoices/batch/{batch_id}', headers=headers).get_json()
+        if batch['state'] == 'done':
+            return batch
+        time.sleep(0.1)
+    return batch
+
+# Zip: two folder-per-pair entries with repeated file names, two pairs by base name, one stray file
+archive = io.BytesIO()
+with zipfile.ZipFile(archive, 'w') as zf:
+    zf.writestr('shipment-1/invoice.pdf', PDF)
+    zf.writestr('shipment-1/lines.xlsx', sheet_bytes(3))
+    zf.writestr('shipment-2/invoice.pdf', PDF)
+    zf.writestr('shipment-2/lines.xlsx', sheet_bytes(4))
+    zf.writestr('INV-10.pdf', PDF)
+    zf.writestr('INV-10.xlsx', sheet_bytes(5))
+    zf.writestr('INV-11.PDF', PDF)
+    zf.writestr('inv-11.xlsx', sheet_bytes(6))
+    zf.writestr('notes.txt', b'not an invoice')
+archive.seek(0)
+
+data = dict(defaults)
+data['archive'] = (archive, 'batch.zip')
+data['items'] = json.dumps([{'name': 'INV-11', 'supplier_id': supplier_b}])
+response = client.post('/api/invoices/batch', data=data, headers=headers, content_type='multipart/form-data')
+body = response.get_json()
+check(response.status_code == 202 and body['batch']['total'] == 4 and body['batch']['skipped'] == ['notes.txt'],
+      f"Zip accepted: {response.status_code}, {body.get('batch', {}).get('total')} pairs, skipped {body.get('batch', {}).get('skipped')}")
+
+batch = wait_for(body['batch_id'])
+results = {item['name']: item for item in batch['items']}
+check(batch['counts']['done'] == 4 and sorted(results) == ['INV-10', 'INV-11', 'shipment-1', 'shipment-2'],
+      f"Zip batch finished: {batch['counts']}")
+check([results[n]['item_count'] for n in ('shipment-1', 'shipment-2', 'INV-10', 'INV-11')] == [3, 4, 5, 6],
+      "Each pair got its own supporting sheet's items")
+
+with app.app_context():
+    invoices = {inv.id: inv for inv in Invoice.query.all()}
+    paths = {invoices[item['invoice_id']].invoice_file_path for item in batch['items']}
+    check(len(paths) == 4 and all(os.path.exists(p) for p in paths), "Repeated file names are saved separately")
+    inv_11 = invoices[results['INV-11']['invoice_id']]
+    inv_10 = invoices[results['INV-10']['invoice_id']]
+    check(inv_11.supplier_id == supplier_b and inv_10.supplier_id == int(defaults['supplier_id'])
+          and len(inv_11.items) == 6 and inv_11.items[0].itemcode.startswith('0002222'),
+          "Per-item override applied by name, defaults elsewhere")
+
+# Paired file lists; the second pair points at an unknown supplier and fails on its own
+data = dict(defaults)
+data['invoice_files'] = [(io.BytesIO(PDF), 'a.pdf'), (io.BytesIO(PDF), 'b.pdf')]
+data['supporting_files'] = [(io.BytesIO(sheet_bytes(2)), 'a.xlsx'), (io.BytesIO(sheet_bytes(2)), 'b.xlsx')]
+data['items'] = json.dumps([{}, {'supplier_id': 9999}])
+response = client.post('/api/invoices/batch', data=data, headers=headers, content_type='multipart/form-data')
+batch = wait_for(response.get_json()['batch_id'])
+states = [(item['name'], item['state']) for item in batch['items']]
+check(states == [('a', 'done'), ('b', 'failed')] and batch['items'][1]['error'] == 'Supplier not found',
+      f"File lists: {states}")
+
+# Rejections
+data = dict(defaults, supplier_id='')
+data['invoice_files'] = [(io.BytesIO(PDF), 'a.pdf')]
+data['supporting_files'] = [(io.BytesIO(sheet_bytes(1)), 'a.xlsx')]
+response = client.post('/api/invoices/batch', data=data, headers=headers, content_type='multipart/form-data')
+check(response.status_code == 400, f"Missing shared supplier rejected: {response.get_json()['message']}")
+
+data = dict(defaults)
+data['invoice_files'] = [(io.BytesIO(PDF), 'a.pdf')]
+response = client.post('/api/invoices/batch', data=data, headers=headers, content_type='multipart/form-data')
+check(response.status_code == 400, "Unbalanced file lists rejected")
+
+response = client.get(f"/api/invoices/batch/{batch['batch_id']}", headers=other_headers)
+check(response.status_code == 403, "Other users cannot read the batch")
+
+# Finished jobs are pruned; running ones are kept
+from app.utils.job_registry import JobRegistry
+registry = JobRegistry(ttl=3600, max_entries=2)
+for key in ('a', 'b', 'c'):
+    registry.add(key, {'state': 'running'})
+check(len(registry) == 3, "Running jobs are never pruned")
+for key in ('a', 'b', 'c'):
+    registry.finish(key)
+check(len(registry) == 2 and 'a' not in registry, "Finished jobs beyond the cap are dropped oldest first")
+registry = JobRegistry(ttl=0, max_entries=100)
+registry.add('a', {})
+registry.finish('a')
+check('a' not in registry, "Finished jobs are dropped after the TTL")
+
+# Invoices left in processing by a previous run are re-queued once
+from app.services.ocr_queue import ocr_queue
+with app.app_context():
+    stuck = Invoice(user_id=1, country_id=int(defaults['country_id']), brand_id=int(defaults['brand_id']),
+                    supplier_id=int(defaults['supplier_id']), status='processing',
+                    invoice_file_path=os.path.join(workdir, 'missing.pdf'))
+    db.session.add(stuck)
+    db.session.commit()
+    stuck_id = stuck.id
+# The batch invoices above are still queued in this process and are not queued twice
+resumed = ocr_queue.resume_pending()
+check(resumed == 1 and ocr_queue.get_job(stuck_id) is not None, f"Re-queued {resumed} invoice(s) left in processing")
+for _ in range(600):
+    if ocr_queue.get_job(stuck_id)['state'] in ('done', 'failed'):
+        break
+    time.sleep(0.1)
+with app.app_context():
+    check(db.session.get(Invoice, stuck_id).status == 'error', "Re-queued OCR ran and recorded its outcome")
+
+# Direct create: the sheet is inserted in batches, merged by row with the manual barcodes
+from app.services.invoice_service import InvoiceService
+from app.models.invoice import InvoiceItem
+sheet_path = os.path.join(workdir, 'direct.xlsx')
+with open(sheet_path, 'wb') as f:
+    f.write(sheet_bytes(5))
+manual = json.dumps([{'decathlon_sku': '8000000', 'barcode': '111.0'}, {'decathlon_sku': '8000001', 'barcode': '222'}])
+with app.app_context():
+    InvoiceService.ITEM_INSERT_BATCH_SIZE = 2
+    try:
+        invoice, item_count, _ = InvoiceService.create_invoice(
+            user_id=1, invoice_path=None, supporting_path=sheet_path, decathlon_data=manual, **defaults
+        )
+        _, fallback_count, _ = InvoiceService.create_invoice(
+            user_id=1, invoice_path=None, supporting_path=os.path.join(workdir, 'missing.xlsx'), decathlon_data=manual, **defaults
+        )
+        db.session.commit()
+    finally:
+        InvoiceService.ITEM_INSERT_BATCH_SIZE = 1000
+    barcodes = [i.barcode for i in InvoiceItem.query.filter_by(invoice_id=invoice.id).order_by(InvoiceItem.id)]
+    check(item_count == 5 and barcodes == ['111', '222', '', '', ''], f"Sheet inserted in batches with manual barcodes by row: {barcodes}")
+    check(fallback_count == 2, "Unreadable sheet falls back to the manual items")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,131 @@
+"""
+Check that the dashboard rollup stays equal to aggregates over the invoices table
+through invoice creates, updates and deletes, and that a rebuild reproduces it.
+Run with: python test_dashboard_stats.py (uses a throwaway in-memory SQLite database)
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+sys.path.insert(0, '.')
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.models.dashboard_stats import InvoiceDailyStats
+from app.services.dashboard_stats import DashboardStatsService
+
+app = create_app()
+random.seed(7)
+
+def rollup_rows():
+    return sorted(
+        (s.day, s.country_id, s.brand_id, s.invoice_count, s.pending_count, round(s.total_amount, 2))
+        for s in InvoiceDailyStats.query.all()
+    )
+
+def expected_rows():
+    buckets = {}
+    for inv in Invoice.query.all():
+        key = (inv.created_at.date(), inv.country_id, inv.brand_id)
+        count, pending, amount = buckets.get(key, (0, 0, 0.0))
+        buckets[key] = (count + 1, pending + (inv.status == 'pending'), amount + (inv.total_amount or 0))
+    return sorted(key + (count, pending, round(amount, 2)) for key, (count, pending, amount) in buckets.items())
+
+failed = False
+
+def check(label):
+    global failed
+    if rollup_rows() == expected_rows():
+        print(f"✓ {label}: rollup matches invoices")
+    else:
+        failed = True
+        print(f"✗ {label}: rollup {rollup_rows()} != expected {expected_rows()}")
+
+with app.app_context():
+    user = User(email='stats@example.com', name='Stats Test')
+    user.set_password('password123')
+    countries = [Country(country_name='Qatar'), Country(country_name='UAE')]
+    brands = [Brand(brand_name='Decathlon', brand_code='54'), Brand(brand_name='Other', brand_code='55')]
+    db.session.add_all([user] + countries + brands)
+    db.session.flush()
+    supplier = Supplier(supplier_name='Supplier', supplier_code='0001', brand_id=brands[0].id, country_id=countries[0].id)
+    db.session.add(supplier)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    for i in range(60):
+        db.session.add(Invoice(
+            user_id=user.id, country_id=random.choice(countries).id, brand_id=random.choice(brands).id,
+            supplier_id=supplier.id, total_amount=random.choice([None, 100.0, 250.5]),
+            status=random.choice(['pending', 'processing', 'processed']),
+            created_at=now - timedelta(days=random.randint(0, 40))
+        ))
+        # Mix of single and multi-invoice flushes
+        if i % 7 == 0:
+            db.session.commit()
+    db.session.commit()
+    check("After creates")
+
+    invoices = Invoice.query.all()
+    for inv in random.sample(invoices, 25):
+        inv.status = random.choice(['pending', 'processed', 'error'])
+        inv.total_amount = random.choice([None, 75.0, 1000.0])
+        if random.random() < 0.3:
+            inv.country_id = random.choice(countries).id
+        if random.random() < 0.3:
+            inv.created_at = now - timedelta(days=random.randint(0, 40))
+    db.session.commit()
+    check("After updates")
+
+    # Unrelated field changes don't touch the rollup
+    Invoice.query.first().invoice_number = 'INV-RENAMED'
+    db.session.commit()
+
+    for inv in random.sample(Invoice.query.all(), 20):
+        db.session.delete(inv)
+    db.session.commit()
+    check("After deletes")
+
+    # Rolled back changes leave the rollup untouched
+    before = rollup_rows()
+    Invoice.query.first().total_amount = 99999.0
+    db.session.flush()
+    db.session.rollback()
+    if rollup_rows() != before:
+        failed = True
+        print("✗ Rollback: rollup changed")
+    else:
+        print("✓ Rollback: rollup unchanged")
+
+    before = rollup_rows()
+    DashboardStatsService.rebuild()
+    if rollup_rows() == before:
+        print("✓ Rebuild: same rows as the incrementally maintained rollup")
+    else:
+        failed = True
+        print(f"✗ Rebuild: {rollup_rows()} != {before}")
+
+    month_start = now.date().replace(day=1)
+    stats = DashboardStatsService.get_stats(month_start)
+    month = [inv for inv in Invoice.query.all() if inv.created_at.date() >= month_start]
+    expected = {
+        'total_invoices': Invoice.query.count(),
+        'invoices_pending': Invoice.query.filter_by(status='pending').count(),
+        'invoices_this_month': len(month),
+        'total_amount_month': round(sum(inv.total_amount or 0 for inv in month), 2)
+    }
+    stats['total_amount_month'] = round(stats['total_amount_month'], 2)
+    if stats == expected:
+        print(f"✓ Stats: {stats}")
+    else:
+        failed = True
+        print(f"✗ Stats: {stats} != {expected}")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,146 @@
+"""
+Check that two transactions changing the same dashboard bucket, or the same
+invoice, at the same time, each on its own connection, both end up in the rollup.
+Run with: python test_dashboard_stats_concurrency.py
+Set CONCURRENCY_TEST_DATABASE_URL=postgresql://.../scratch_db to run against
+Postgres, where the transactions truly overlap; the default throwaway SQLite
+file makes the second writer wait for the first.
+The target database is DROPPED and re-created - never point this at real data.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+sys.path.insert(0, '.')
+
+db_file = None
+if os.getenv('CONCURRENCY_TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['CONCURRENCY_TEST_DATABASE_URL']
+else:
+    db_file = os.path.join(tempfile.mkdtemp(), 'stats.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.models.dashboard_stats import InvoiceDailyStats
+
+app = create_app()
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+def overlap(first, second):
+    """
+    Run first and second in their own app contexts (so their own sessions and
+    connections): first flushes, second flushes before first commits
+    """
+    flushed = threading.Event()
+    started = threading.Event()
+    errors = []
+
+    def run_first():
+        with app.app_context():
+            try:
+                first()
+                db.session.flush()
+                flushed.set()
+                started.wait(10)
+                # Give the second writer time to reach its flush
+                time.sleep(0.5)
+                db.session.commit()
+            except Exception as e:
+                errors.append(e)
+                flushed.set()
+
+    def run_second():
+        flushed.wait(10)
+        with app.app_context():
+            try:
+                second()
+                started.set()
+                db.session.commit()
+            except Exception as e:
+                errors.append(e)
+                started.set()
+
+    threads = [threading.Thread(target=run_first), threading.Thread(target=run_second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def bucket():
+    db.session.remove()
+    row = InvoiceDailyStats.query.one_or_none()
+    return (row.invoice_count, row.pending_count, round(row.total_amount, 2)) if row else None
+
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    user = User(email='concurrency@example.com', name='Concurrency Test')
+    user.set_password('password123')
+    country = Country(country_name='Qatar')
+    brand = Brand(brand_name='Decathlon', brand_code='54')
+    db.session.add_all([user, country, brand])
+    db.session.flush()
+    supplier = Supplier(supplier_name='Supplier', supplier_code='0001', brand_id=brand.id, country_id=country.id)
+    db.session.add(supplier)
+    db.session.commit()
+    ids = {'user_id': user.id, 'country_id': country.id, 'brand_id': brand.id, 'supplier_id': supplier.id}
+    # Same day, country and brand: every invoice lands in one bucket
+    created_at = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def add(amount, status='pending'):
+        db.session.add(Invoice(total_amount=amount, status=status, created_at=created_at, **ids))
+
+    errors = overlap(lambda: add(100.0), lambda: add(250.0))
+    check(not errors and bucket() == (2, 2, 350.0), f"Two overlapping inserts both counted: {bucket()} {errors}")
+
+    first_id = Invoice.query.filter_by(total_amount=100.0).one().id
+
+    def process():
+        invoice = db.session.get(Invoice, first_id)
+        invoice.status = 'processed'
+        invoice.total_amount = 120.0
+
+    errors = overlap(process, lambda: add(50.0))
+    check(not errors and bucket() == (3, 2, 420.0), f"Overlapping update and insert both counted: {bucket()} {errors}")
+
+    errors = overlap(lambda: db.session.delete(db.session.get(Invoice, first_id)), lambda: add(30.0, 'processed'))
+    check(not errors and bucket() == (3, 2, 330.0), f"Overlapping delete and insert both counted: {bucket()} {errors}")
+
+    # Both transactions change the same invoice: the second must take out the first's values, not the old ones
+    second_id = Invoice.query.filter_by(total_amount=250.0).one().id
+
+    def set_amount(amount):
+        def change():
+            db.session.get(Invoice, second_id).total_amount = amount
+        return change
+
+    def set_processed():
+        db.session.get(Invoice, second_id).status = 'processed'
+
+    errors = overlap(set_amount(400.0), set_processed)
+    check(not errors and bucket() == (3, 1, 480.0), f"Overlapping updates of one invoice both counted: {bucket()} {errors}")
+
+    errors = overlap(set_amount(10.0), set_amount(20.0))
+    check(not errors and bucket() == (3, 1, 100.0), f"Overlapping amount changes end at the last one: {bucket()} {errors}")
+
+    db.session.remove()
+    db.drop_all()
+
+if db_file:
+    os.remove(db_file)
+
+sys.exit(1 if failed else 0)
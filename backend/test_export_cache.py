@@ -0,0 +1,76 @@
+"""
+Check ERP export caching: a repeat download of an unchanged invoice gets a 304
+for its ETag, while editing the invoice or importing master data changes the
+ETag and regenerates the workbook.
+Run with: python test_export_cache.py (uses a throwaway SQLite database and cache folder)
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+workdir = tempfile.mkdtemp(prefix='export_cache_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+os.environ['EXPORT_CACHE_DIR'] = os.path.join(workdir, 'export_cache')
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.services.master_data_cache import MasterDataCache
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+app = create_app()
+client = app.test_client()
+
+with app.app_context():
+    user = User(email='export@example.com', name='Export Test')
+    user.set_password('password123')
+    country, brand = Country(country_name='Qatar'), Brand(brand_name='Decathlon', brand_code='54')
+    db.session.add_all([user, country, brand])
+    db.session.flush()
+    bu = BusinessUnit(bu_code='QDC01', store_name='Store', brand_id=brand.id, country_id=country.id)
+    supplier = Supplier(supplier_name='ACME', supplier_code='0001', brand_id=brand.id, country_id=country.id)
+    db.session.add_all([bu, supplier])
+    db.session.flush()
+    invoice = Invoice(user_id=user.id, country_id=country.id, brand_id=brand.id, bu_id=bu.id,
+                      supplier_id=supplier.id, status='processed', invoice_number='INV-1', invoice_date='20260105')
+    db.session.add(invoice)
+    db.session.commit()
+    invoice_id, supplier_id = invoice.id, supplier.id
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+url = f'/api/invoices/{invoice_id}/download'
+first = client.get(url, headers=headers)
+etag = first.headers.get('ETag')
+check(first.status_code == 200 and etag, f"First download: {first.status_code}, ETag {etag}")
+repeat = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+check(repeat.status_code == 304, f"Unchanged invoice: {repeat.status_code}")
+
+# A master data import renames the supplier and bumps the version stamp
+with app.app_context():
+    db.session.get(Supplier, supplier_id).supplier_name = 'ACME Renamed'
+    MasterDataCache.bump_version()
+    db.session.commit()
+after_import = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+check(after_import.status_code == 200 and after_import.headers.get('ETag') != etag,
+      f"Master data import changes the ETag: {after_import.status_code}")
+cached = os.listdir(os.environ['EXPORT_CACHE_DIR'])
+check(len(cached) == 1 and cached[0].endswith('m1.xlsx'), f"Old workbook replaced by the regenerated one: {cached}")
+
+response = client.patch(f'/api/invoices/{invoice_id}', headers=headers, json={'invoice_number': 'INV-2'})
+after_edit = client.get(url, headers=dict(headers, **{'If-None-Match': after_import.headers.get('ETag')}))
+check(response.status_code == 200 and after_edit.status_code == 200, f"Invoice edit changes the ETag: {after_edit.status_code}")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,57 @@
+"""
+Check the on-disk OCR cache: entries round-trip, the cache directory is only
+walked to count it once or to evict, and eviction drops the least recently
+used entries below the size limit.
+Run with: python test_ocr_cache.py (uses a throwaway cache folder)
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '.')
+
+from app.utils import ocr_cache
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+folder = tempfile.mkdtemp(prefix='ocr_cache_test_')
+ocr_cache.CACHE_DIR = folder
+ocr_cache.CACHE_ENABLED = True
+ocr_cache.CACHE_MAX_BYTES = 20000
+
+scans = 0
+real_scan = ocr_cache._scan
+def counting_scan():
+    global scans
+    scans += 1
+    return real_scan()
+ocr_cache._scan = counting_scan
+
+try:
+    entry = {'text': 'x' * 900}
+    for i in range(15):
+        ocr_cache.store(f"{i:064x}", entry)
+    check(ocr_cache.get_cached(f"{3:064x}") == entry, "Entries round-trip")
+    check(scans == 1, f"15 writes under the limit walked the cache {scans} time(s)")
+
+    # Touch an old entry so it counts as recently used, then push the cache over the limit
+    time.sleep(0.01)
+    ocr_cache.get_cached(f"{0:064x}")
+    for i in range(15, 30):
+        ocr_cache.store(f"{i:064x}", entry)
+    _, total = real_scan()
+    check(total <= ocr_cache.CACHE_MAX_BYTES, f"Cache held under the limit: {total} bytes")
+    check(ocr_cache.get_cached(f"{0:064x}") == entry and ocr_cache.get_cached(f"{1:064x}") is None,
+          "Least recently used entries evicted first")
+    check(ocr_cache._total_bytes == total, "Running total matches the directory")
+    check(scans < 10, f"30 writes walked the cache {scans} time(s)")
+finally:
+    shutil.rmtree(folder)
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,74 @@
+"""
+Check the pooled tesserocr engine: its output has the same shape as
+pytesseract.image_to_data, engines are reused instead of re-created, and the
+pool never holds more engines than its size, even under concurrent callers.
+Run with: python test_ocr_engine.py (needs tesserocr and eng.traineddata for the engine checks)
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw
+import pytesseract
+from app.utils import ocr_engine
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+# TSV as tesseract writes it: pytesseract parses it with a header row, tesserocr returns the rows only
+TSV_ROWS = (
+    "1\t1\t0\t0\t0\t0\t0\t0\t1200\t240\t-1\t\n"
+    "4\t1\t1\t1\t1\t0\t40\t40\t420\t40\t-1\t\n"
+    "5\t1\t1\t1\t1\t1\t40\t40\t220\t40\t95.812\tINVOICE\n"
+    "5\t1\t1\t1\t1\t2\t280\t40\t180\t40\t91.5\t4521\n"
+    "5\t1\t1\t1\t2\t1\t40\t120\t160\t40\t88\tTOTAL\n"
+    "5\t1\t1\t1\t2\t2\t220\t120\t100\t40\t12.0\t"
+)
+HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+expected = pytesseract.pytesseract.file_to_dict(HEADER + TSV_ROWS, '\t', -1)
+check(ocr_engine._parse_tsv(TSV_ROWS) == expected, "TSV parsed to the same dict as pytesseract.image_to_data")
+check(ocr_engine._engine_options('--oem 1 --psm 6') == {'oem': 1, 'psm': 6}, "PSM and OEM read from the tesseract config")
+
+def page():
+    image = Image.new('L', (300, 60), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((10, 10), 'INVOICE NO 4521', fill=0)
+    draw.text((10, 30), 'TOTAL 1250.00', fill=0)
+    return image.resize((1200, 240), Image.Resampling.NEAREST)
+
+pool = None
+if ocr_engine.tesserocr is None:
+    print("tesserocr not installed: engine checks skipped")
+else:
+    pool = ocr_engine.TesseractEnginePool(2, ocr_engine.OCR_LANG, '--psm 6')
+    try:
+        data = pool.image_to_data(page())
+    except Exception as e:
+        print(f"tesserocr could not start ({e}): engine checks skipped")
+        pool = None
+
+if pool:
+    words = [w for w in data['text'] if w.strip()]
+    check({'INVOICE', '4521', 'TOTAL'} <= set(words), f"Words read from an in-memory image: {words}")
+    lines = {data['line_num'][i] for i, w in enumerate(data['text']) if w.strip()}
+    check(len(lines) == 2 and all(len(values) == len(data['text']) for values in data.values()),
+          "Layout columns line up with the words")
+
+    engine = pool._idle.get_nowait()
+    pool._idle.put(engine)
+    pool.image_to_data(page())
+    check(pool._created == 1 and pool._idle.get_nowait() is engine, "Sequential calls reuse the same engine")
+    pool._idle.put(engine)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda _: pool.image_to_data(page()), range(12)))
+    check(pool._created == 2 and pool._idle.qsize() == 2, f"Concurrent callers share at most 2 engines ({pool._created} created)")
+    check(all(r['text'] == data['text'] for r in results), "Pooled engines read every page the same way")
+    pool.close()
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,29 @@
+"""
+Check that field confidences come from the OCR words that make up the matched
+value, not from stray short tokens that happen to occur inside it.
+Run with: python test_ocr_helpers.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+from app.utils.ocr_helpers import match_confidence
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+words = [['Invoice', 96], ['No:', 91], ['INV-2026-0012', 88], ['1', 12], [':', 30], ['0', 15],
+         ['Total', 95], ['QAR', 93], ['1,250.00', 84], ['Date:', 90], ['12/01/2026,', 79]]
+
+check(match_confidence('INV-2026-0012', words) == 88, "Invoice number uses its own word, not stray '1' / '0' tokens")
+check(match_confidence('1,250.00', words) == 84, "Amount uses its own word")
+check(match_confidence('12/01/2026', words) == 79, "Trailing punctuation on the OCR word is ignored")
+check(match_confidence('QAR 1,250.00', words) == 84, "Multi-word match takes the lowest of its words")
+check(match_confidence('INV-9', [['No:INV-9', 70]]) == 70, "Label glued to the value still counts")
+check(match_confidence('INV-9', words) is None, "No matching word gives None")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,93 @@
+"""
+Check low-memory PDF rasterization: the DPI follows the text size of a page,
+blank pages keep the default, oversized pages are held to the memory ceiling,
+a fixed DPI skips the probe render, and pages come back one at a time in grayscale.
+Run with: python test_pdf_raster.py (needs poppler for the rasterization checks)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+sys.path.insert(0, '.')
+
+from PIL import Image, ImageDraw
+from app.utils import pdf_raster, image_preprocessing
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+A4_300 = (2480, 3508)
+
+def page(scale, gray=255):
+    """A4 page at 300 DPI whose text is scale times the size of Pillow's default font"""
+    base = Image.new('L', (A4_300[0] // scale, A4_300[1] // scale), gray)
+    draw = ImageDraw.Draw(base)
+    for i in range(30):
+        y = 40 + i * 18
+        if y > base.height - 20:
+            break
+        draw.text((30, y), f"Item {i:03d} Description gjpq  QTY {i * 3}  AMOUNT {i * 12.5:.2f}", fill=0)
+        draw.text((base.width // 2, y), f"Col two {i} jjyy", fill=0)
+    # A table rule must not count as a text line
+    draw.rectangle((20, 30, base.width - 20, 31), fill=0)
+    return base.resize(A4_300, Image.Resampling.NEAREST)
+
+def probe(image, dpi=300):
+    scale = pdf_raster.PROBE_DPI / dpi
+    return image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.BOX)
+
+small, normal, large = (pdf_raster.choose_dpi(probe(page(scale)))[0] for scale in (3, 4, 6))
+check(small > normal > large, f"Smaller text gets a higher DPI: {small}, {normal}, {large}")
+check(pdf_raster.MIN_DPI <= large and small <= pdf_raster.MAX_DPI and normal == pdf_raster.DEFAULT_DPI,
+      f"Body-size text keeps {pdf_raster.DEFAULT_DPI} DPI, all within {pdf_raster.MIN_DPI}-{pdf_raster.MAX_DPI}")
+
+dpi, info = pdf_raster.choose_dpi(probe(page(4, gray=225)))
+check(dpi == normal and info['line_height_pt'], f"Grey scanned paper measures the same: {info}")
+
+dpi, info = pdf_raster.choose_dpi(probe(Image.new('L', A4_300, 255)))
+check(dpi == pdf_raster.DEFAULT_DPI and info['line_height_pt'] is None, f"Blank page keeps the default DPI: {info}")
+
+# A0 drawing: 33.1 x 46.8 inches
+a0 = Image.new('L', (round(33.1 * pdf_raster.PROBE_DPI), round(46.8 * pdf_raster.PROBE_DPI)), 255)
+dpi, info = pdf_raster.choose_dpi(a0)
+peak_mb = (33.1 * dpi) * (46.8 * dpi) * image_preprocessing.peak_bytes_per_pixel() / 1024 / 1024
+check(info['capped'] and peak_mb <= pdf_raster.PAGE_MEMORY_MB,
+      f"A0 page capped at {dpi} DPI, about {peak_mb:.0f} MB of {pdf_raster.PAGE_MEMORY_MB} MB")
+check(pdf_raster.choose_dpi(a0, dpi=300)[0] == dpi, "A fixed DPI is held to the ceiling too")
+
+folder = tempfile.mkdtemp()
+try:
+    path = os.path.join(folder, 'drawing.pdf')
+    Image.new('RGB', (round(33.1 * 10), round(46.8 * 10)), 'white').save(path, resolution=10)
+    size = pdf_raster.page_size(path, 1)
+    check(size and abs(size[0] - 33.1) < 0.1 and abs(size[1] - 46.8) < 0.1, f"Page size read without rendering: {size}")
+    with mock.patch.object(pdf_raster, '_render', side_effect=lambda path, page_num, dpi: dpi):
+        rendered, info = pdf_raster.rasterize_page(path, 1, dpi=300)
+    check(rendered == dpi and info['capped'], f"Fixed DPI renders once, no probe, held to the ceiling: {rendered}")
+    check(pdf_raster.page_size(os.path.join(folder, 'missing.pdf'), 1) is None, "Unreadable PDF has no size")
+finally:
+    shutil.rmtree(folder)
+
+if not shutil.which('pdftoppm'):
+    print("poppler not installed: rasterization checks skipped")
+else:
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, 'statement.pdf')
+        pages = [page(3).convert('RGB'), page(6).convert('RGB')]
+        pages[0].save(path, resolution=300, save_all=True, append_images=pages[1:])
+        first, first_info = pdf_raster.rasterize_page(path, 1)
+        second, second_info = pdf_raster.rasterize_page(path, 2)
+        check(first.mode == 'L' and second.mode == 'L', "Pages are rasterized in grayscale")
+        check(first_info['dpi'] > second_info['dpi'], f"Per-page DPI: {first_info['dpi']}, {second_info['dpi']}")
+        check(abs(first.width - 8.27 * first_info['dpi']) < 3, f"Page 1 size matches its DPI: {first.size}")
+    finally:
+        shutil.rmtree(folder)
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,183 @@
+"""
+Check the region OCR helpers: label lines become page regions, overlapping
+regions merge, learned regions map back onto first/last pages, and supplier
+templates round-trip through the database and cache. The whole-page text of the
+locate pass is kept next to the region text, and the locate pass runs once per page.
+A template another worker created first is updated, and a failed template save
+keeps the invoice's OCR results.
+Run with: python test_region_ocr.py (uses a throwaway in-memory SQLite database)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+sys.path.insert(0, '.')
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+workdir = tempfile.mkdtemp(prefix='region_ocr_test_')
+os.environ['OCR_CACHE_DIR'] = os.path.join(workdir, 'ocr_cache')
+
+from PIL import Image
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.supplier import Supplier
+from app.models.supplier_template import SupplierTemplate
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.services.ocr_queue import ocr_queue
+from app.services import ocr_service
+from app.services.ocr_service import OCRService
+from app.services.supplier_template_service import SupplierTemplateService, template_cache
+from app.utils import region_ocr
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+def tesseract_data(lines):
+    """image_to_data-shaped dict; lines are (text, left, top, width, height) with one word box per word"""
+    data = {key: [] for key in ('text', 'page_num', 'block_num', 'par_num', 'line_num', 'left', 'top', 'width', 'height')}
+    for line_num, (text, left, top, width, height) in enumerate(lines, start=1):
+        words = text.split()
+        step = width // len(words)
+        for i, word in enumerate(words):
+            for key, value in (('text', word), ('page_num', 1), ('block_num', 1), ('par_num', 1), ('line_num', line_num),
+                               ('left', left + i * step), ('top', top), ('width', step - 4), ('height', height)):
+                data[key].append(value)
+    return data
+
+# 1000 x 1400 locate-pass page
+data = tesseract_data([
+    ('ACME TRADING LLC', 100, 50, 400, 20),
+    ('Invoice No: INV-2041', 600, 100, 300, 20),
+    ('Invoice Date: 12/01/2026', 600, 130, 300, 20),
+    ('Item Qty Price', 100, 300, 800, 20),
+    ('Sub Total 100.00', 600, 1200, 300, 20),
+    ('Grand Total 105.00', 600, 1240, 300, 20),
+])
+regions = region_ocr.find_label_regions(data, 1000, 1400)
+fields = [r['field'] for r in regions]
+check(fields.count('invoice_number') == 1 and 'invoice_date' in fields and fields.count('total_amount') == 2,
+      f"Labels found: {fields}")
+number = next(r for r in regions if r['field'] == 'invoice_number')
+check(0.55 < number['box'][0] < 0.6 and number['box'][2] == 1.0 and number['box'][1] < 100 / 1400 < number['box'][3],
+      f"Invoice number region starts at the label: {number['box']}")
+
+boxes = region_ocr.merge_boxes(regions)
+check(len(boxes) == 2 and boxes[0][1] < boxes[1][1], f"Overlapping regions merge into {len(boxes)} boxes, top to bottom")
+coverage = region_ocr.covered_fraction(boxes)
+check(coverage < 0.1, f"Regions cover {coverage:.1%} of the page")
+
+template = [
+    {'field': 'invoice_number', 'page': 'first', 'box': [0.5, 0.05, 1.0, 0.15]},
+    {'field': 'total_amount', 'page': 'last', 'box': [0.5, 0.8, 1.0, 0.95]},
+]
+pages = OCRService._template_pages(template, ocr_pages=[1, 2, 3, 4], page_count=4)
+check(sorted(pages) == [1, 4], f"Template regions map to pages {sorted(pages)} of 4")
+
+page_results = {
+    1: {'boxes': [{'box': [0.5, 0.05, 1.0, 0.15], 'text': 'Invoice No: INV-2041\nDate: 12/01/2026'}]},
+    2: {'boxes': [{'box': [0.5, 0.2, 1.0, 0.3], 'text': 'Total 5.00'}]},
+    3: {'boxes': [{'box': [0.5, 0.8, 1.0, 0.95], 'text': 'Grand Total 105.00'}]},
+}
+matches = {'invoice_number': {'match': 'INV-2041'}, 'invoice_date': {'match': '12/01/2026'}, 'total_amount': {'match': '105.00'}}
+learned = OCRService._learn_regions(page_results, matches, page_count=3)
+check([(r['field'], r['page']) for r in learned] == [('invoice_number', 'first'), ('invoice_date', 'first'), ('total_amount', 'last')],
+      f"Learned regions: {[(r['field'], r['page']) for r in learned]}")
+
+# Region OCR with a stand-in page worker: the template regions miss the total, the located ones read all fields
+REGION_TEXT = 'Invoice No: INV-2041\nDate: 12/01/2026\nTotal 105.00'
+page_calls = []
+
+def fake_page_regions(file_path, page_num, regions=None, overview=None):
+    page_calls.append((regions is None, overview is not None))
+    overview = overview or {'text': 'ACME Trading\n' + REGION_TEXT + '\nThank you', 'regions': [{'field': 'total_amount', 'box': [0, 0, 1, 1]}]}
+    text = REGION_TEXT if regions is None else 'Invoice No: INV-2041'
+    return {'text': text, 'words': [], 'regions': regions or overview['regions'], 'boxes': [{'box': [0, 0, 1, 1], 'text': text}],
+            'located': regions is None, 'coverage': 0.2, 'overview': overview}
+
+image_path = os.path.join(workdir, 'invoice.png')
+Image.new('L', (40, 40), 255).save(image_path)
+template_regions = [{'field': 'invoice_number', 'page': 'first', 'box': [0.5, 0.05, 1.0, 0.15]}]
+with mock.patch.object(ocr_service, '_ocr_page_regions', fake_page_regions):
+    data = OCRService.extract_by_regions(image_path, template_regions, parallel=False)
+check(data['region_source'] == 'located' and data['region_text'].strip() == REGION_TEXT
+      and data['raw_text'].startswith('ACME Trading') and 'Thank you' in data['raw_text'],
+      "Region text kept next to the whole-page text")
+check(page_calls == [(False, False), (True, True)], f"Located attempt reuses the template attempt's locate pass: {page_calls}")
+
+with mock.patch.object(ocr_service, 'REGION_MODE', True), \
+        mock.patch.object(ocr_service, '_ocr_page_regions', fake_page_regions):
+    first = OCRService.extract_invoice_data(image_path)
+    page_calls.clear()
+    cached = OCRService.extract_invoice_data(image_path)
+check(not page_calls and cached['raw_text'] == first['raw_text'] and cached['region_text'] == first['region_text']
+      and (cached['invoice_number'], cached['total_amount']) == ('INV-2041', 105.0),
+      "Cache keeps both texts and re-reads the fields from the regions")
+
+app = create_app()
+with app.app_context():
+    country, brand = Country(country_name='Qatar'), Brand(brand_name='Decathlon', brand_code='54')
+    db.session.add_all([country, brand])
+    db.session.flush()
+    supplier = Supplier(supplier_name='ACME', supplier_code='0001', brand_id=brand.id, country_id=country.id)
+    db.session.add(supplier)
+    db.session.commit()
+
+    check(SupplierTemplateService.get_template(supplier.id) is None, "No template before the first located invoice")
+    SupplierTemplateService.save_regions(supplier.id, learned)
+    SupplierTemplateService.record_region_hit(supplier.id)
+    db.session.commit()
+    template_cache.clear()
+    stored = SupplierTemplateService.get_template(supplier.id)
+    check(stored['regions'] == learned and stored['region_hits'] == 1, "Template stored with its hit count")
+
+    # Another worker inserts the template between this worker's lookup and its insert
+    other = Supplier(supplier_name='Other', supplier_code='0002', brand_id=brand.id, country_id=country.id)
+    db.session.add(other)
+    db.session.commit()
+    db.session.execute(SupplierTemplate.__table__.insert().values(supplier_id=other.id, region_hits=4, corrections=0))
+    db.session.commit()
+    country_id, brand_id, supplier_id, other_id = country.id, brand.id, supplier.id, other.id
+    query_class = type(SupplierTemplate.query)
+    real_get = query_class.get
+    lookups = []
+
+    def get(query, ident):
+        lookups.append(ident)
+        return None if len(lookups) == 1 else real_get(query, ident)
+
+    with mock.patch.object(query_class, 'get', get):
+        SupplierTemplateService.save_regions(other_id, learned)
+    db.session.expunge_all()
+    stored = SupplierTemplate.query.get(other_id)
+    check(stored.regions == learned and stored.region_hits == 4, "Template created concurrently is updated, not lost")
+
+    # A failing template save must not undo the invoice's OCR results
+    user = User(email='region@example.com', name='Region Test')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.flush()
+    invoice = Invoice(user_id=user.id, country_id=country_id, brand_id=brand_id, supplier_id=supplier_id, status='processing')
+    db.session.add(invoice)
+    db.session.commit()
+    invoice_id = invoice.id
+    ocr_data = {'invoice_number': 'INV-2041', 'total_amount': 105.0, 'raw_text': 'Invoice No: INV-2041', 'learned_regions': learned}
+    ocr_queue.jobs.add(invoice_id, {'invoice_id': invoice_id, 'state': 'queued'})
+    with mock.patch.object(OCRService, 'extract_invoice_data', return_value=ocr_data), \
+            mock.patch.object(SupplierTemplateService, 'save_regions', side_effect=RuntimeError('duplicate key')):
+        ocr_queue._run(invoice_id, 'invoice.pdf')
+    db.session.expunge_all()
+    invoice = Invoice.query.get(invoice_id)
+    check(invoice.status == 'processed' and invoice.invoice_number == 'INV-2041'
+          and invoice.ocr_result.raw_text == ocr_data['raw_text'] and ocr_queue.get_job(invoice_id)['state'] == 'done',
+          f"OCR results saved despite the template failure: {invoice.status}, {ocr_queue.get_job(invoice_id)}")
+
+shutil.rmtree(workdir)
+sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+"""
+Fire many parallel add-to-tracker calls and check serial numbers have no gaps or collisions.
+Run with: python test_serial_allocation.py
+Uses DATABASE_URL if TEST_DATABASE_URL is set, otherwise a throwaway SQLite file.
+"""
+
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+sys.path.insert(0, '.')
+
+db_file = None
+if os.getenv('TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+else:
+    db_file = os.path.join(tempfile.mkdtemp(), 'serials.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.models.lpo_tracker import LPOTracker
+from app.services.tracker_service import TrackerService
+
+ADDS_PER_BU = 40
+WORKERS = 16
+
+app = create_app()
+year = datetime.now().strftime('%y')
+
+def seed():
+    """Two BUs sharing the 'VIL' prefix, one with a tracker issued before counters existed"""
+    db.drop_all()
+    db.create_all()
+
+    user = User(email='serials@example.com', name='Serial Test')
+    user.set_password('password123')
+    brand = Brand(brand_name='Decathlon', brand_code='54')
+    country = Country(country_name='Qatar')
+    db.session.add_all([user, brand, country])
+    db.session.flush()
+
+    bus = [
+        BusinessUnit(bu_code='VIL01', store_name='Villaggio', brand_id=brand.id, country_id=country.id),
+        BusinessUnit(bu_code='VIL02', store_name='Villaggio 2', brand_id=brand.id, country_id=country.id),
+        BusinessUnit(bu_code='DOH01', store_name='Doha', brand_id=brand.id, country_id=country.id)
+    ]
+    supplier = Supplier(supplier_name='Supplier', supplier_code='0001', brand_id=brand.id, country_id=country.id)
+    db.session.add_all(bus + [supplier])
+    db.session.flush()
+
+    def make_invoice(bu, n):
+        invoice = Invoice(
+            user_id=user.id, invoice_number=f'{bu.bu_code}-{n}', country_id=country.id,
+            brand_id=brand.id, bu_id=bu.id, supplier_id=supplier.id
+        )
+        db.session.add(invoice)
+        return invoice
+
+    # Legacy serial with no counter row yet
+    legacy = make_invoice(bus[0], 'legacy')
+    db.session.flush()
+    db.session.add(LPOTracker(
+        invoice_id=legacy.id, country_id=country.id, bu_id=bus[0].id, serial_number=f'VIL-{year}-0001'
+    ))
+
+    invoices = [make_invoice(bu, n) for bu in bus for n in range(ADDS_PER_BU)]
+    db.session.commit()
+    return [invoice.id for invoice in invoices]
+
+def add(invoice_id):
+    with app.app_context():
+        try:
+            return TrackerService.add_to_tracker(invoice_id, {}).serial_number
+        except Exception as e:
+            return e
+        finally:
+            db.session.remove()
+
+with app.app_context():
+    invoice_ids = seed()
+    db.session.remove()
+
+with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+    results = list(pool.map(add, invoice_ids))
+
+errors = [r for r in results if isinstance(r, Exception)]
+failed = bool(errors)
+if errors:
+    print(f"✗ {len(errors)} of {len(results)} adds failed, first: {str(errors[0]).splitlines()[0]}")
+
+with app.app_context():
+    serials = [s for (s,) in db.session.query(LPOTracker.serial_number).all()]
+
+    for prefix, expected in (('VIL', 2 * ADDS_PER_BU + 1), ('DOH', ADDS_PER_BU)):
+        numbers = sorted(int(s.rsplit('-', 1)[-1]) for s in serials if s.startswith(f'{prefix}-{year}-'))
+        if numbers == list(range(1, expected + 1)):
+            print(f"✓ {prefix}: {expected} serials, no gaps or duplicates")
+        else:
+            failed = True
+            print(f"✗ {prefix}: expected 1..{expected}, got {numbers}")
+
+    if len(serials) != len(set(serials)):
+        failed = True
+        print("✗ Duplicate serial numbers")
+
+if db_file:
+    os.remove(db_file)
+
+sys.exit(1 if failed else 0)
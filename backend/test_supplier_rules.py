@@ -0,0 +1,169 @@
+"""
+Check that header corrections sent through PATCH /api/invoices/<id> teach the
+supplier's template once two corrections agree, and that the next invoice from
+that supplier is read with the template where the generic patterns get it wrong.
+Invoice numbers are anchored on their own label, and date samples that could be
+read day-first or month-first leave the format undecided. Empty header fields in
+a PATCH leave the values OCR filled in alone.
+Run with: python test_supplier_rules.py (uses a throwaway in-memory SQLite database)
+"""
+
+import os
+import sys
+sys.path.insert(0, '.')
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice
+from app.models.ocr_result import InvoiceOCRResult
+from app.models.supplier_template import SupplierTemplate
+from app.services.ocr_service import OCRService
+from app.services.supplier_template_service import SupplierTemplateService, template_cache
+from app.utils.supplier_rules import candidate_rules
+
+FIRST = """ACME TRADING W.L.L.
+Tax Invoice
+Inv. No.: QA/2026/0412      Page 1 of 2
+Invoice Date : 05 Jan 2026
+Due Date: 04/02/2026
+Item   Qty   Price
+Sub Total  QAR 1.234,50
+Grand Total  QAR 1.234,50
+Bank IBAN QA58 DOHB 0000 1234
+"""
+SECOND = FIRST.replace('QA/2026/0412', 'QA/2026/0999').replace('05 Jan 2026', '17 Feb 2026').replace('1.234,50', '98.765,25')
+THIRD = FIRST.replace('QA/2026/0412', 'QA/2026/1200').replace('05 Jan 2026', '09 Mar 2026').replace('1.234,50', '4.321,75')
+
+failed = False
+
+def check(ok, label):
+    global failed
+    print(f"{'✓' if ok else '✗'} {label}")
+    failed = failed or not ok
+
+app = create_app()
+client = app.test_client()
+
+with app.app_context():
+    user = User(email='rules@example.com', name='Rules Test')
+    user.set_password('password123')
+    country, brand = Country(country_name='Qatar'), Brand(brand_name='Decathlon', brand_code='54')
+    db.session.add_all([user, country, brand])
+    db.session.flush()
+    supplier = Supplier(supplier_name='ACME', supplier_code='0001', brand_id=brand.id, country_id=country.id)
+    db.session.add(supplier)
+    db.session.flush()
+
+    ids = {'user_id': user.id, 'country_id': country.id, 'brand_id': brand.id, 'supplier_id': supplier.id}
+    supplier_id = supplier.id
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+    def ocr_invoice(text):
+        """Invoice as the OCR job leaves it: generic pattern results and the stored text"""
+        generic = OCRService.extract_fields(text)
+        invoice = Invoice(status='processed', invoice_number=generic['invoice_number'], invoice_date=generic['invoice_date'],
+                          total_amount=generic['total_amount'], **ids)
+        db.session.add(invoice)
+        db.session.flush()
+        ocr_result = InvoiceOCRResult(invoice_id=invoice.id)
+        ocr_result.raw_text = text
+        db.session.add(ocr_result)
+        db.session.commit()
+        return invoice.id, generic
+
+    first_id, generic = ocr_invoice(FIRST)
+    second_id, _ = ocr_invoice(SECOND)
+
+print(f"  generic patterns on the first invoice: {generic['invoice_number']}, {generic['invoice_date']}, {generic['total_amount']}")
+
+def stored_template():
+    with app.app_context():
+        template_cache.clear()
+        return SupplierTemplateService.get_template(supplier_id) or {}
+
+response = client.patch(f'/api/invoices/{first_id}', headers=headers, json={
+    'invoice_number': 'QA/2026/0412', 'invoice_date': '20260105', 'total_amount': 1234.5
+})
+check(response.status_code == 200, f"PATCH with corrections: {response.status_code}")
+template = stored_template()
+check(not template.get('field_rules') and template.get('corrections') == 1, "One correction alone doesn't make a rule")
+
+response = client.patch(f'/api/invoices/{second_id}', headers=headers, json={
+    'invoice_number': 'QA/2026/0999', 'invoice_date': '20260217', 'total_amount': 98765.25
+})
+template = stored_template()
+rules = template.get('field_rules', {})
+# The invoice number was read correctly, so only the date and total were corrections
+check(sorted(rules) == ['invoice_date', 'total_amount'] and template['corrections'] == 2,
+      f"Rules learned once two corrections agree: {rules}")
+check(rules.get('invoice_date', {}).get('format') == '%d %b %Y' and rules.get('total_amount', {}).get('decimal') == ',',
+      "Date format and decimal comma captured")
+
+with app.app_context():
+    data = OCRService.extract_fields(THIRD, rules=rules)
+    check((data['invoice_number'], data['invoice_date'], data['total_amount']) == ('QA/2026/1200', '20260309', 4321.75),
+          f"Next invoice read with the template: {data['invoice_number']}, {data['invoice_date']}, {data['total_amount']}")
+    check(data['field_matches']['invoice_date']['pattern'] == 'template:Invoice Date'
+          and data['field_matches']['total_amount']['pattern'] == 'template:Total QAR'
+          and not data['field_matches']['invoice_number']['pattern'].startswith('template:'),
+          "Matches record the template anchor; the field without a rule used the generic patterns")
+
+    # A field the template can't read falls back to the generic patterns
+    partial = OCRService.extract_fields(THIRD.replace('Invoice Date : 09 Mar 2026', 'Date: 09/03/2026'), rules=rules)
+    check(partial['invoice_date'] == '20260309' and not partial['field_matches']['invoice_date']['pattern'].startswith('template:'),
+          "Missing anchor falls back to the generic date patterns")
+
+    # One disagreeing correction is only a candidate; the learned rule stays
+    odd_id, _ = ocr_invoice(THIRD.replace('Grand Total  QAR 4.321,75', 'Amount Due 4.321,75'))
+response = client.patch(f'/api/invoices/{odd_id}', headers=headers, json={'total_amount': 4321.75})
+check(stored_template()['field_rules'] == rules, "A single disagreeing correction doesn't replace a rule")
+
+# Unchanged values are not corrections
+before = stored_template()['corrections']
+response = client.patch(f'/api/invoices/{first_id}', headers=headers, json={'invoice_number': 'QA/2026/0412'})
+check(stored_template()['corrections'] == before, "Re-sending the same value learns nothing")
+
+# A copy saved before OCR finished sends empty header fields; they don't wipe what OCR filled in
+response = client.patch(f'/api/invoices/{first_id}', headers=headers, json={
+    'invoice_number': None, 'invoice_date': '', 'total_amount': None, 'currency': 'QAR'
+})
+data = response.get_json()
+check(response.status_code == 200 and data['invoice_number'] == 'QA/2026/0412' and data['invoice_date'] and data['total_amount'],
+      f"Empty OCR fields are ignored: {data['invoice_number']}, {data['invoice_date']}, {data['total_amount']}")
+
+# The invoice number anchor comes from its own label, not the first place the value appears
+text = "PO Ref: 4521\nDelivery to Doha\nInvoice No: 4521\nDate: 05/01/2026"
+check(candidate_rules('invoice_number', '4521', text) == [{'anchor': 'Invoice No', 'position': 'right'}],
+      f"Invoice number anchored on its label: {candidate_rules('invoice_number', '4521', text)}")
+check(candidate_rules('invoice_number', '4521', "PO Ref: 4521") == [{'anchor': 'PO Ref', 'position': 'right'}],
+      "Other labels are used when no invoice number label is next to the value")
+
+# Dates whose day could be the month leave the format undecided
+def formats(date, text):
+    return sorted(rule['format'] for rule in candidate_rules('invoice_date', date, text))
+
+check(formats('20260303', "Invoice Date: 03/03/2026") == ['%d/%m/%Y', '%m/%d/%Y'], "Day equal to month is ambiguous")
+check(formats('20260105', "Invoice Date: 05/01/2026") == ['%d/%m/%Y', '%m/%d/%Y'], "Day of 12 or less is ambiguous")
+check(formats('20260117', "Invoice Date: 17/01/2026") == ['%d/%m/%Y'], "Day over 12 decides the format")
+check(formats('20260105', "Invoice Date: 05 Jan 2026") == ['%d %b %Y'], "Month names are never ambiguous")
+
+with app.app_context():
+    other = Supplier(supplier_name='Other', supplier_code='0002', **{k: ids[k] for k in ('brand_id', 'country_id')})
+    db.session.add(other)
+    db.session.commit()
+    other_id = other.id
+    learn = lambda date, text: SupplierTemplateService.learn_from_correction(other_id, text, {'invoice_date': date})
+    learned = [learn('20260303', "Invoice Date: 03/03/2026"), learn('20260405', "Invoice Date: 05/04/2026")]
+    check(learned == [[], []] and not db.session.get(SupplierTemplate, other_id).field_rules,
+          "Ambiguous corrections alone never decide the date format")
+    learned = learn('20260517', "Invoice Date: 17/05/2026")
+    check(learned == ['invoice_date'] and db.session.get(SupplierTemplate, other_id).field_rules['invoice_date']['format'] == '%d/%m/%Y',
+          "An unambiguous correction that agrees decides it")
+
+sys.exit(1 if failed else 0)
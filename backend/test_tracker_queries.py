@@ -0,0 +1,133 @@
+"""
+Check that tracker and invoice listing endpoints run a constant number of SQL
+queries regardless of how many rows are returned.
+Run with: python test_tracker_queries.py (uses a throwaway in-memory SQLite database)
+"""
+
+import os
+import sys
+sys.path.insert(0, '.')
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.country import Country
+from app.models.brand import Brand
+from app.models.business_unit import BusinessUnit
+from app.models.supplier import Supplier
+from app.models.user import User
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.lpo_tracker import LPOTracker
+
+app = create_app()
+
+def seed(tracker_count):
+    """Reset the database and create tracker_count tracked invoices spread over 2 countries/BUs"""
+    db.drop_all()
+    db.create_all()
+
+    user = User(email='queries@example.com', name='Query Test')
+    user.set_password('password123')
+    brand = Brand(brand_name='Decathlon', brand_code='54')
+    countries = [Country(country_name='Qatar'), Country(country_name='UAE')]
+    db.session.add_all([user, brand] + countries)
+    db.session.flush()
+
+    bus = []
+    suppliers = []
+    for c in countries:
+        bus.append(BusinessUnit(bu_code=f'BU{c.id}', store_name=f'Store {c.id}', brand_id=brand.id, country_id=c.id))
+        suppliers.append(Supplier(supplier_name=f'Supplier {c.id}', supplier_code=f'{c.id:04d}', brand_id=brand.id, country_id=c.id))
+    db.session.add_all(bus + suppliers)
+    db.session.flush()
+
+    for i in range(tracker_count):
+        idx = i % 2
+        invoice = Invoice(
+            user_id=user.id, invoice_number=f'INV-{i}', country_id=countries[idx].id,
+            brand_id=brand.id, bu_id=bus[idx].id, supplier_id=suppliers[idx].id
+        )
+        invoice.items = [InvoiceItem(itemcode=f'{i}-{n}', quantity=n + 1) for n in range(3)]
+        db.session.add(invoice)
+        db.session.flush()
+        db.session.add(LPOTracker(
+            invoice_id=invoice.id, country_id=countries[idx].id, bu_id=bus[idx].id,
+            serial_number=f'BU{idx}-26-{i + 1:04d}'
+        ))
+    db.session.commit()
+
+    return create_access_token(identity=str(user.id)), countries[0].id
+
+def count_queries(client, url, token):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+failed = False
+with app.app_context():
+    client = app.test_client()
+
+    for url_template in ['/api/tracker/all', '/api/tracker/country/{country_id}']:
+        counts = {}
+        for tracker_count in (4, 40):
+            token, country_id = seed(tracker_count)
+            counts[tracker_count], body = count_queries(client, url_template.format(country_id=country_id), token)
+
+        # Quantities come from SQL: items have quantities 1 + 2 + 3
+        if url_template == '/api/tracker/all':
+            trackers = body['data'][0]['business_units'][0]['trackers']
+        else:
+            trackers = body['business_units'][0]['trackers']
+        quantities_ok = all(t['total_quantity_received'] == 6 for t in trackers)
+
+        if counts[4] == counts[40] and quantities_ok:
+            print(f"✓ {url_template}: {counts[4]} queries for 4 and 40 trackers")
+        else:
+            failed = True
+            print(f"✗ {url_template}: query counts {counts}, quantities ok: {quantities_ok}")
+
+    # Without a limit the listing still returns one page, and the cursor continues it
+    from app.services.tracker_service import TrackerService
+    page_size = TrackerService.DEFAULT_PAGE_SIZE
+    token, _ = seed(page_size + 20)
+    headers = {'Authorization': f'Bearer {token}'}
+    def tracker_ids(body):
+        return [t['id'] for c in body['data'] for bu in c['business_units'] for t in bu['trackers']]
+    first = client.get('/api/tracker/all', headers=headers).get_json()
+    rest = client.get(f"/api/tracker/all?cursor={first['next_cursor']}", headers=headers).get_json() if first['next_cursor'] else {'data': []}
+    ids = tracker_ids(first) + tracker_ids(rest)
+    if len(tracker_ids(first)) == page_size and len(set(ids)) == page_size + 20 and rest.get('next_cursor') is None:
+        print(f"✓ /api/tracker/all without limit: {page_size} rows, next page has the remaining 20")
+    else:
+        failed = True
+        print(f"✗ /api/tracker/all without limit: {len(tracker_ids(first))} then {len(tracker_ids(rest))} rows")
+
+    # Invoice listing returns summaries: no line items, counts from SQL
+    counts = {}
+    for per_page in (4, 40):
+        token, _ = seed(40)
+        counts[per_page], body = count_queries(client, f'/api/invoices/user?per_page={per_page}', token)
+    summaries_ok = all(
+        'items' not in inv and inv['item_count'] == 3 and inv['total_quantity'] == 6
+        for inv in body['invoices']
+    )
+    if counts[4] == counts[40] and summaries_ok:
+        print(f"✓ /api/invoices/user: {counts[4]} queries for 4 and 40 invoices per page")
+    else:
+        failed = True
+        print(f"✗ /api/invoices/user: query counts {counts}, summaries ok: {summaries_ok}")
+
+sys.exit(1 if failed else 0)
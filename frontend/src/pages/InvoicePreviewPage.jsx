@@ -5,6 +5,10 @@ import { AddToTrackerForm } from '../components/AddToTrackerForm';
 import { invoiceService, trackerService } from '../services/api';
 import { Download, ArrowLeft, Pencil, Save, X, Check, Building2, ZoomIn, ZoomOut, ArrowRightLeft, Plus } from 'lucide-react';
 
+// Header fields the OCR worker fills in after the upload has returned
+const OCR_FIELDS = ['invoice_number', 'invoice_date', 'total_amount'];
+const STATUS_POLL_MS = 2000;
+
 export const InvoicePreviewPage = () => {
   const { invoiceId } = useParams();
   const navigate = useNavigate();
@@ -19,6 +23,7 @@ export const InvoicePreviewPage = () => {
   const [tableView, setTableView] = useState('po'); // 'po' or 'im'
   const [isTrackerFormOpen, setIsTrackerFormOpen] = useState(false);
   const [isInTracker, setIsInTracker] = useState(false);
+  const [processing, setProcessing] = useState(false);
 
   // Editing states
   const [editState, setEditState] = useState({
@@ -45,6 +50,7 @@ export const InvoicePreviewPage = () => {
       const response = await invoiceService.getInvoice(invoiceId);
       setInvoice(response.data);
       setEditedData(JSON.parse(JSON.stringify(response.data))); // Deep copy for editing
+      setProcessing(response.data.status === 'processing');
 
       // Check if already in tracker
       try {
@@ -86,6 +92,36 @@ export const InvoicePreviewPage = () => {
     }
   };
 
+  // OCR runs in the background: poll its status until the job ends, then pick up the header it filled in
+  useEffect(() => {
+    if (!processing) return undefined;
+    const timer = setInterval(async () => {
+      try {
+        const statusRes = await invoiceService.getInvoiceStatus(invoiceId);
+        const jobState = statusRes.data.job?.state;
+        const finished = ['done', 'failed', 'cancelled'].includes(jobState) ||
+          (!statusRes.data.job && statusRes.data.status !== 'processing');
+        if (!finished) return;
+
+        clearInterval(timer);
+        // Header only: include= leaves the line items out
+        const response = await invoiceService.getInvoice(invoiceId, { include: '' });
+        const header = response.data;
+        setInvoice(prev => ({ ...prev, ...header }));
+        // Only the OCR fields and status, so item edits in progress are kept
+        setEditedData(prev => {
+          const next = { ...prev, status: header.status };
+          OCR_FIELDS.forEach(field => { next[field] = header[field]; });
+          return next;
+        });
+        setProcessing(false);
+      } catch (err) {
+        console.error('Failed to check OCR status:', err);
+      }
+    }, STATUS_POLL_MS);
+    return () => clearInterval(timer);
+  }, [invoiceId, processing]);
+
   const handleDownloadExcel = async () => {
     try {
       setDownloading(true);
@@ -168,9 +204,21 @@ export const InvoicePreviewPage = () => {
   };
 
   const handleSave = async (section) => {
+    // Send only the fields that changed, so stale copies can't overwrite values filled in meanwhile
+    const changes = {};
+    Object.keys(editedData).forEach(field => {
+      if (JSON.stringify(editedData[field]) !== JSON.stringify(invoice[field])) {
+        changes[field] = editedData[field];
+      }
+    });
+    if (Object.keys(changes).length === 0) {
+      setEditState(prev => ({ ...prev, [section]: false }));
+      return;
+    }
+
     try {
       setSaving(true);
-      const response = await invoiceService.updateInvoice(invoiceId, editedData);
+      const response = await invoiceService.updateInvoice(invoiceId, changes);
       setInvoice(response.data);
       setEditState(prev => ({ ...prev, [section]: false }));
     } catch (err) {
@@ -395,7 +443,12 @@ export const InvoicePreviewPage = () => {
                     <h4 className="font-bold text-gray-900 text-xs">Invoice Summary</h4>
                   </div>
                   {!editState.summary ? (
-                    <button onClick={() => toggleEdit('summary')} className="p-1 hover:bg-gray-100 rounded text-gray-400 opacity-0 group-hover:opacity-100 transition">
+                    <button
+                      onClick={() => toggleEdit('summary')}
+                      disabled={processing}
+                      title={processing ? 'Available once OCR has finished' : undefined}
+                      className="p-1 hover:bg-gray-100 rounded text-gray-400 opacity-0 group-hover:opacity-100 transition disabled:cursor-not-allowed"
+                    >
                       <Pencil size={12} />
                     </button>
                   ) : (
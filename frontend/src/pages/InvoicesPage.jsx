@@ -109,7 +109,7 @@ export const InvoicesPage = () => {
                       <td className="py-3 px-6">
                         {invoice.currency} {invoice.total_amount?.toFixed(2) || '0.00'}
                       </td>
-                      <td className="py-3 px-6">{invoice.items?.length || 0}</td>
+                      <td className="py-3 px-6">{invoice.item_count || 0}</td>
                       <td className="py-3 px-6">
                         <span
                           className={`inline-block px-3 py-1 rounded-full text-xs font-medium ${invoice.status === 'processed'
@@ -19,11 +19,37 @@ const parseYYYYMMDDDate = (dateString) => {
   }
 };
 
+// Append a page of country -> business unit -> trackers groups to the ones already loaded
+const mergeTrackerPages = (loaded, page) => {
+  const merged = loaded.map((countryData) => ({
+    ...countryData,
+    business_units: countryData.business_units.map((buData) => ({ ...buData, trackers: [...buData.trackers] })),
+  }));
+  page.forEach((countryData) => {
+    const country = merged.find((c) => c.country?.id === countryData.country?.id);
+    if (!country) {
+      merged.push(countryData);
+      return;
+    }
+    countryData.business_units.forEach((buData) => {
+      const bu = country.business_units.find((b) => b.bu?.id === buData.bu?.id);
+      if (bu) {
+        bu.trackers.push(...buData.trackers);
+      } else {
+        country.business_units.push(buData);
+      }
+    });
+  });
+  return merged;
+};
+
 export const TrackerPage = () => {
   const navigate = useNavigate();
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [data, setData] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [expandedCountry, setExpandedCountry] = useState(null);
   const [expandedBU, setExpandedBU] = useState({});
 
@@ -37,6 +63,7 @@ export const TrackerPage = () => {
       setError('');
       const response = await trackerService.getAllTrackers();
       setData(response.data.data || []);
+      setNextCursor(response.data.next_cursor || null);
     } catch (err) {
       console.error('Failed to load trackers:', err);
       setError('Failed to load tracker data. Please try again.');
@@ -45,6 +72,20 @@ export const TrackerPage = () => {
     }
   };
 
+  const fetchMoreTrackers = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await trackerService.getAllTrackers(nextCursor);
+      setData((loaded) => mergeTrackerPages(loaded, response.data.data || []));
+      setNextCursor(response.data.next_cursor || null);
+    } catch (err) {
+      console.error('Failed to load more trackers:', err);
+      setError('Failed to load tracker data. Please try again.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDownloadExcel = async (invoiceId) => {
     try {
       const response = await invoiceService.downloadExcel(invoiceId);
@@ -307,6 +348,18 @@ export const TrackerPage = () => {
                 )}
               </div>
             ))}
+            {nextCursor && (
+              <div className="text-center">
+                <button
+                  onClick={fetchMoreTrackers}
+                  disabled={loadingMore}
+                  className="px-6 py-2 bg-white border border-gray-300 rounded-lg shadow-sm text-gray-700 hover:bg-gray-50 disabled:opacity-50 inline-flex items-center gap-2"
+                >
+                  {loadingMore && <Loader size={16} className="animate-spin" />}
+                  Load more
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
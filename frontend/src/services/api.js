@@ -56,8 +56,10 @@ export const invoiceService = {
     api.post('/invoices', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     }),
-  getInvoice: (id) =>
-    api.get(`/invoices/${id}`),
+  getInvoice: (id, params) =>
+    api.get(`/invoices/${id}`, { params }),
+  getInvoiceStatus: (id) =>
+    api.get(`/invoices/${id}/status`),
   getInvoiceFile: (id) =>
     api.get(`/invoices/${id}/file`, { responseType: 'blob' }),
   downloadExcel: (id) =>
@@ -97,8 +99,8 @@ export const trackerService = {
     api.get(`/tracker/invoice/${invoiceId}`),
   getTrackersByCountry: (countryId) =>
     api.get(`/tracker/country/${countryId}`),
-  getAllTrackers: () =>
-    api.get('/tracker/all'),
+  getAllTrackers: (cursor) =>
+    api.get('/tracker/all', { params: cursor ? { cursor } : {} }),
   updateTracker: (trackerId, data) =>
     api.patch(`/tracker/${trackerId}`, data),
   deleteTracker: (trackerId) =>